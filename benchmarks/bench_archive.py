@@ -0,0 +1,121 @@
+# benchmarks/bench_archive.py
+import sys
+import os
+
+# Add the project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import shutil
+import tempfile
+import time
+from web3 import Web3
+from benchmarks.synthetic_chain import SyntheticChain, GENESIS_BLOCK
+from benchmarks.fake_rpc import FakeRPCServer
+from benchmarks.bench_fused import DECODED_TABLES, dump_decoded
+from benchmarks.bench_raw_layout import reset_schema, table_bytes, LAYOUT_TABLES
+
+"""
+Raw tables (compact layout) vs the local segment archive
+(db/segment_archive.py) as raw sink and decoder source, on the same
+fetched blocks: write time, bytes per block, a bare scan of the
+iter_*_fields readers and a full decode (decoder/main.py). decoded_* must
+come out identical from both sources. Runs in a scratch schema
+(bench_layout) of DATABASE_URL and a temporary archive directory.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_archive.py --blocks 100
+"""
+
+
+def scan(source, start, end):
+    """Read every projected row once, returns the row count"""
+    rows = 0
+    for reader in (source.iter_block_fields, source.iter_tx_fields, source.iter_log_fields):
+        for _ in reader(start, end):
+            rows += 1
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=100)
+    parser.add_argument("--txs-per-block", type=int, default=150)
+    parser.add_argument("--batch", type=int, default=20, help="blocks per write")
+    args = parser.parse_args()
+
+    dsn = os.getenv("DATABASE_URL")
+    if not dsn:
+        raise ValueError("DATABASE_URL missing in environment")
+    os.environ["PGOPTIONS"] = "-c search_path=bench_layout"
+
+    chain = SyntheticChain(txs_per_block=args.txs_per_block, head=GENESIS_BLOCK + args.blocks)
+    server = FakeRPCServer(chain).start()
+    w3 = Web3(Web3.HTTPProvider(server.url))
+
+    import db.raw_compact as raw_compact
+    from db.db_operations import Database_Operations
+    from db.segment_archive import SegmentArchive
+    from db.token_cache import token_cache
+    from decoder.main import run_decoder_for_range
+    from ingestion.raw_rows import build_raw_rows
+    from ingestion.receipts import fetch_block_receipts
+    raw_compact.RAW_LAYOUT = "compact"
+    db = Database_Operations()
+
+    start, end = GENESIS_BLOCK, GENESIS_BLOCK + args.blocks - 1
+    items = []
+    for bn in range(start, end + 1):
+        block = w3.eth.get_block(bn, full_transactions=True)
+        items.append(build_raw_rows(bn, block, fetch_block_receipts(w3, block)))
+    batches = [items[i:i + args.batch] for i in range(0, len(items), args.batch)]
+
+    def write_db():
+        for batch in batches:
+            db.insert_blocks_data([d["block"] for d in batch], method="copy")
+            db.insert_txs_data([r for d in batch for r in d["tx"]], method="copy")
+            db.insert_receipts_data([r for d in batch for r in d["receipt"]], method="copy")
+            db.insert_logs_data([r for d in batch for r in d["logs"]], method="copy")
+        return db, table_bytes(dsn, LAYOUT_TABLES["compact"])[0]
+
+    archive_dir = tempfile.mkdtemp(prefix="bench_archive_")
+
+    def write_archive():
+        archive = SegmentArchive(archive_dir, segment_bytes=64 << 20)
+        for batch in batches:
+            archive.append(batch)
+        # replay from a fresh instance, like a separate decode run
+        archive = SegmentArchive(archive_dir)
+        return archive, archive.get_stats()["bytes"]
+
+    print(f"{args.blocks} blocks x {args.txs_per_block} txs, {sum(len(d['logs']) for d in items)} logs")
+    print(f"{'source':>8} {'write s':>8} {'bytes/block':>12} {'scan s':>7} {'rows/s':>9} {'decode s':>9}")
+    expected = None
+    try:
+        for name, write in (("db", write_db), ("archive", write_archive)):
+            reset_schema(dsn)
+            token_cache.clear()
+            t0 = time.time()
+            source, size = write()
+            t_write = time.time() - t0
+
+            t0 = time.time()
+            rows = scan(source, start, end)
+            t_scan = time.time() - t0
+
+            t0 = time.time()
+            assert run_decoder_for_range(start, end, w3, source=source)
+            t_decode = time.time() - t0
+
+            decoded = dump_decoded(dsn)
+            expected = expected or decoded
+            for table in DECODED_TABLES:
+                assert decoded[table] == expected[table], f"{name}: {table} differs from the raw tables"
+            print(f"{name:>8} {t_write:>8.2f} {size / args.blocks:>12.0f} {t_scan:>7.2f} {rows / t_scan:>9.0f} "
+                  f"{t_decode:>9.2f}")
+    finally:
+        shutil.rmtree(archive_dir, ignore_errors=True)
+        server.stop()
+    print("decoded_* identical: " + ", ".join(f"{t} {len(expected[t])} rows" for t in DECODED_TABLES))
+
+
+if __name__ == "__main__":
+    main()
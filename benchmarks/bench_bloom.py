@@ -0,0 +1,82 @@
+# benchmarks/bench_bloom.py
+import sys
+import os
+
+# Add the project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import time
+from web3 import Web3
+from benchmarks.synthetic_chain import SyntheticChain, GENESIS_BLOCK, _addr
+from benchmarks.fake_rpc import FakeRPCServer
+
+"""
+RPC calls saved by the logsBloom pre-screen of handle_erc20_transfers
+on a given watchlist: runs the same blocks with the pre-screen off and on,
+checks both find the same wallet Transfers and prints skip / false positive rates.
+
+    python benchmarks/bench_bloom.py --blocks 200 --watch 20 --watch-ratio 0.0005
+"""
+
+
+class RecordingSession():
+    """Session stand-in recording the token_transfers inserts"""
+
+    def __init__(self):
+        self.rows = []
+
+    def execute(self, query, params=None):
+        self.rows.append(params)
+
+
+def run(w3, server, process_erc20, blocks, whale_set, prescreen):
+    process_erc20.BLOOM_PRESCREEN = prescreen
+    session = RecordingSession()
+    server.reset_stats()
+    t0 = time.time()
+    for bn in blocks:
+        block = w3.eth.get_block(bn, full_transactions=True)
+        process_erc20.handle_erc20_transfers(w3, block, session, whale_set)
+    return session.rows, time.time() - t0, server.calls["eth_getBlockReceipts"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=200)
+    parser.add_argument("--watch", type=int, default=20, help="tracked wallets")
+    parser.add_argument("--watch-ratio", type=float, default=0.0005, help="share of tx parties that are tracked")
+    parser.add_argument("--txs-per-block", type=int, default=180)
+    args = parser.parse_args()
+
+    watch = [_addr("watch", i) for i in range(args.watch)]
+    chain = SyntheticChain(head=GENESIS_BLOCK + args.blocks, txs_per_block=args.txs_per_block,
+                           watch_wallets=watch, watch_ratio=args.watch_ratio)
+    server = FakeRPCServer(chain).start()
+    w3 = Web3(Web3.HTTPProvider(server.url))
+
+    from db.token_cache import token_cache
+    from utils.wallet_index import WalletIndex
+    from ingestion import process_erc20
+    for i, token in enumerate(chain.tokens):
+        token_cache.set(token, f"TK{i}", 18)
+    whale_set = WalletIndex((w, f"watch_{i}", "whale") for i, w in enumerate(watch))
+
+    blocks = range(GENESIS_BLOCK, GENESIS_BLOCK + args.blocks)
+    for bn in blocks:
+        chain.get_block(bn)
+
+    rows_off, t_off, calls_off = run(w3, server, process_erc20, blocks, whale_set, False)
+    rows_on, t_on, calls_on = run(w3, server, process_erc20, blocks, whale_set, True)
+    server.stop()
+
+    assert rows_off == rows_on, "pre-screen changed the matched transfers"
+    stats = process_erc20.bloom_stats()
+    print(f"wallet transfers found: {len(rows_on)}")
+    print(f"no pre-screen : {calls_off} eth_getBlockReceipts  {t_off:.2f}s")
+    print(f"bloom screen  : {calls_on} eth_getBlockReceipts  {t_on:.2f}s")
+    print(f"block skip rate {stats['blocks_skip_rate']:.2%}  false positive rate {stats['blocks_false_positive_rate']:.2%}")
+    print(f"receipt skip rate {stats['receipts_skip_rate']:.2%}  false positive rate {stats['receipts_false_positive_rate']:.2%}")
+
+
+if __name__ == "__main__":
+    main()
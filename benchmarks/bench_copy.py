@@ -0,0 +1,93 @@
+# benchmarks/bench_copy.py
+import sys
+import os
+
+# Add the project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import time
+import psycopg2
+import db.connection as db_connection
+from db.db_operations import Database_Operations
+from benchmarks.synthetic_chain import SyntheticChain, GENESIS_BLOCK
+
+"""
+execute_values vs streaming COPY for the raw_* tables.
+Runs inside a scratch schema (bench_copy) of BENCH_DATABASE_URL
+(falls back to DATABASE_URL), every run starts from empty tables.
+
+    BENCH_DATABASE_URL=postgresql://... python benchmarks/bench_copy.py --batches 20 200 2000
+"""
+
+SCHEMA = "bench_copy"
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "db", "raw_table_schema.sql")
+
+
+def raw_rows(chain, start, count):
+    """Function to build raw_* rows straight from synthetic JSON-RPC payloads"""
+    blocks, txs, receipts, logs = [], [], [], []
+    for bn in range(start, start + count):
+        block = chain.get_block(bn)
+        blocks.append([bn, int(block["timestamp"], 16), block])
+        for tx, receipt in zip(block["transactions"], chain.get_block_receipts(bn)):
+            txs.append([tx["hash"], bn, tx])
+            receipts.append([tx["hash"], bn, receipt])
+            for lg in receipt["logs"]:
+                logs.append([tx["hash"], bn, int(lg["logIndex"], 16), lg])
+    return blocks, txs, receipts, logs
+
+
+def reset_schema(dsn):
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"SET search_path TO {SCHEMA}")
+    with open(SCHEMA_FILE, "r", encoding="utf-8") as f:
+        cur.execute(f.read())
+    conn.commit()
+    conn.close()
+
+
+def run(db, method, rows):
+    blocks, txs, receipts, logs = rows
+    t0 = time.time()
+    db.insert_blocks_data(iter(blocks) if method == "copy" else blocks, method=method)
+    db.insert_txs_data(iter(txs) if method == "copy" else txs, method=method)
+    db.insert_receipts_data(iter(receipts) if method == "copy" else receipts, method=method)
+    db.insert_logs_data(iter(logs) if method == "copy" else logs, method=method)
+    return time.time() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batches", type=int, nargs="+", default=[20, 200, 2000], help="blocks per batch")
+    parser.add_argument("--txs-per-block", type=int, default=150)
+    args = parser.parse_args()
+
+    dsn = os.getenv("BENCH_DATABASE_URL") or os.getenv("DATABASE_URL")
+    if not dsn:
+        raise ValueError("BENCH_DATABASE_URL / DATABASE_URL missing in environment")
+
+    db_connection._pool = db_connection.ConnectionPool(
+        dsn, connect=lambda d: psycopg2.connect(d, options=f"-c search_path={SCHEMA}"))
+    db = Database_Operations()
+
+    print(f"{'blocks':>7} {'rows':>9} {'values s':>9} {'copy s':>9} {'values rows/s':>14} {'copy rows/s':>12}")
+    for batch in args.batches:
+        # fresh chain per batch keeps memory to one batch of payloads
+        chain = SyntheticChain(txs_per_block=args.txs_per_block, head=GENESIS_BLOCK + batch)
+        rows = raw_rows(chain, GENESIS_BLOCK, batch)
+        n_rows = sum(len(r) for r in rows)
+
+        timings = {}
+        for method in ("values", "copy"):
+            reset_schema(dsn)
+            timings[method] = run(db, method, rows)
+
+        print(f"{batch:>7} {n_rows:>9} {timings['values']:>9.2f} {timings['copy']:>9.2f} "
+              f"{n_rows / timings['values']:>14.0f} {n_rows / timings['copy']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/bench_decode.py
+import sys
+import os
+
+# Add the project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import time
+from benchmarks.synthetic_chain import SyntheticChain, GENESIS_BLOCK
+from db.token_cache import token_cache
+from decoder.util import checksum_address
+from decoder.columnar import LogBatch
+from decoder.transform import _decode_log, _decode_log_batch
+
+"""
+Logs/sec of the per-log decoder (transform._decode_log) vs the columnar
+batch decoder (transform._decode_log_batch) on a synthetic log fixture,
+rows shaped like Database_Operations.iter_log_fields output.
+Token metadata is preloaded into the in-process cache, so no DB / RPC is hit.
+
+    python benchmarks/bench_decode.py --logs 100000
+"""
+
+
+def build_fixture(n_logs, strip_0x=False):
+    """Function to collect n_logs (tx_hash, block_number, log_index, address, topics, data) rows"""
+    chain = SyntheticChain(head=GENESIS_BLOCK + 100_000)
+    rows = []
+    bn = GENESIS_BLOCK
+    while len(rows) < n_logs:
+        for receipt in chain.get_block_receipts(bn):
+            for lg in receipt["logs"]:
+                topics = [t[2:] if strip_0x else t for t in lg["topics"]]
+                rows.append((receipt["transactionHash"], bn, int(lg["logIndex"], 16),
+                             lg["address"], topics, lg["data"]))
+        bn += 1
+    for i, token in enumerate(chain.tokens):
+        token_cache.set(token, f"TK{i}", 18)
+    return rows[:n_logs]
+
+
+def run_per_log(rows):
+    events, erc20 = [], []
+    for r in rows:
+        _decode_log(*r, None, events, erc20)
+    return events, erc20
+
+
+def run_batched(rows, batch_size):
+    events, erc20 = [], []
+    for i in range(0, len(rows), batch_size):
+        _decode_log_batch(LogBatch.from_rows(rows[i:i + batch_size]), None, events, erc20)
+    return events, erc20
+
+
+def timed(fn, *args):
+    checksum_address.cache_clear()
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logs", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--strip-0x", action="store_true", help="topics without 0x (web3 ingest path)")
+    args = parser.parse_args()
+
+    rows = build_fixture(args.logs, args.strip_0x)
+    print(f"fixture: {len(rows)} logs")
+
+    (ev_a, erc_a), t_a = timed(run_per_log, rows)
+    (ev_b, erc_b), t_b = timed(run_batched, rows, args.batch_size)
+
+    assert ev_a == ev_b, "decoded_events rows differ"
+    assert erc_a == erc_b, "decoded_erc20_transfers rows differ"
+
+    print(f"transfers decoded: {len(erc_a)}")
+    print(f"per-log : {t_a:.3f}s  {len(rows) / t_a:,.0f} logs/s")
+    print(f"batched : {t_b:.3f}s  {len(rows) / t_b:,.0f} logs/s  ({t_a / t_b:.2f}x)")
+    print(f"token cache: {token_cache.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
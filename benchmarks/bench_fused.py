@@ -0,0 +1,118 @@
+# benchmarks/bench_fused.py
+import sys
+import os
+
+# Add the project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import time
+import psycopg2
+from web3 import Web3
+from benchmarks.synthetic_chain import SyntheticChain, GENESIS_BLOCK
+from benchmarks.fake_rpc import FakeRPCServer
+
+"""
+Two-stage (raw_* insert, then decoder/main.run_decoder_for_range) vs fused
+(decoder/fused.write_fused, with and without the raw write) on the same
+fetched blocks. The decoded_* tables of every fused run must be identical
+to the two-stage ones. Runs in a scratch schema (bench_fused) of DATABASE_URL.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_fused.py --blocks 50
+"""
+
+SCHEMA = "bench_fused"
+DB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "db")
+SCHEMA_FILES = ("raw_table_schema.sql", "normalized_table_schema.sql")
+DECODED_TABLES = {
+    "decoded_blocks": "block_number",
+    "decoded_transactions": "tx_hash",
+    "decoded_events": "tx_hash, log_index",
+    "decoded_erc20_transfers": "tx_hash, log_index",
+}
+
+
+def reset_schema(dsn):
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    for name in SCHEMA_FILES:
+        with open(os.path.join(DB_DIR, name), "r", encoding="utf-8") as f:
+            cur.execute(f.read())
+    conn.commit()
+    conn.close()
+
+
+def dump_decoded(dsn):
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    out = {}
+    for table, order in DECODED_TABLES.items():
+        cur.execute(f"SELECT * FROM {table} ORDER BY {order}")
+        out[table] = cur.fetchall()
+    conn.close()
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=50)
+    parser.add_argument("--txs-per-block", type=int, default=150)
+    args = parser.parse_args()
+
+    dsn = os.getenv("DATABASE_URL")
+    if not dsn:
+        raise ValueError("DATABASE_URL missing in environment")
+    os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"
+
+    chain = SyntheticChain(txs_per_block=args.txs_per_block, head=GENESIS_BLOCK + args.blocks)
+    server = FakeRPCServer(chain).start()
+    w3 = Web3(Web3.HTTPProvider(server.url))
+
+    from db.db_operations import Database_Operations
+    from db.token_cache import token_cache
+    from decoder.main import run_decoder_for_range
+    from decoder.fused import write_fused
+    from ingestion.raw_rows import build_raw_rows
+    from ingestion.receipts import fetch_block_receipts
+    db = Database_Operations()
+
+    start, end = GENESIS_BLOCK, GENESIS_BLOCK + args.blocks - 1
+    items = []
+    for bn in range(start, end + 1):
+        block = w3.eth.get_block(bn, full_transactions=True)
+        items.append(build_raw_rows(bn, block, fetch_block_receipts(w3, block)))
+    n_logs = sum(len(d["logs"]) for d in items)
+    print(f"{args.blocks} blocks, {sum(len(d['tx']) for d in items)} txs, {n_logs} logs")
+
+    def two_stage():
+        db.insert_blocks_data([d["block"] for d in items])
+        db.insert_txs_data([r for d in items for r in d["tx"]])
+        db.insert_receipts_data([r for d in items for r in d["receipt"]])
+        db.insert_logs_data([r for d in items for r in d["logs"]])
+        assert run_decoder_for_range(start, end, w3)
+
+    runs = [
+        ("two-stage", two_stage),
+        ("fused + raw", lambda: write_fused(db, items, w3, write_raw=True)),
+        ("fused, no raw", lambda: write_fused(db, items, w3, write_raw=False)),
+    ]
+    expected = None
+    print(f"{'mode':>14} {'seconds':>8} {'blocks/s':>9} {'logs/s':>9}")
+    for name, run in runs:
+        reset_schema(dsn)
+        token_cache.clear()
+        t0 = time.time()
+        run()
+        seconds = time.time() - t0
+        decoded = dump_decoded(dsn)
+        expected = expected or decoded
+        for table in DECODED_TABLES:
+            assert decoded[table] == expected[table], f"{name}: {table} differs from the two-stage path"
+        print(f"{name:>14} {seconds:>8.2f} {args.blocks / seconds:>9.0f} {n_logs / seconds:>9.0f}")
+    print("decoded_* identical: " + ", ".join(f"{t} {len(expected[t])} rows" for t in DECODED_TABLES))
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
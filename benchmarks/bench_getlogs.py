@@ -0,0 +1,80 @@
+# benchmarks/bench_getlogs.py
+import sys
+import os
+
+# Add the project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import time
+from web3 import Web3
+from benchmarks.synthetic_chain import SyntheticChain, GENESIS_BLOCK, _addr
+from benchmarks.fake_rpc import FakeRPCServer
+from benchmarks.bench_bloom import RecordingSession
+
+"""
+RPC requests of the whale ERC-20 path: per-block receipts
+(handle_erc20_transfers) vs topic-filtered eth_getLogs windows
+(handle_erc20_transfers_by_logs). Both must save the same token_transfers rows.
+--max-logs makes the fake node refuse large queries so the window split kicks in.
+
+    python benchmarks/bench_getlogs.py --blocks 300 --watch 50 --max-logs 20
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=300)
+    parser.add_argument("--watch", type=int, default=50, help="tracked wallets")
+    parser.add_argument("--watch-ratio", type=float, default=0.002)
+    parser.add_argument("--window", type=int, default=100)
+    parser.add_argument("--chunk", type=int, default=20, help="wallets per filter")
+    parser.add_argument("--max-logs", type=int, default=10000)
+    parser.add_argument("--receipt-mode", default="batch", help="receipt fetch mode of the per-block path")
+    args = parser.parse_args()
+
+    watch = [_addr("watch", i) for i in range(args.watch)]
+    chain = SyntheticChain(head=GENESIS_BLOCK + args.blocks, watch_wallets=watch, watch_ratio=args.watch_ratio)
+    server = FakeRPCServer(chain, max_logs=args.max_logs).start()
+    w3 = Web3(Web3.HTTPProvider(server.url))
+
+    from db.token_cache import token_cache
+    from utils.wallet_index import WalletIndex
+    from ingestion import process_erc20, log_filter, receipts
+    for i, token in enumerate(chain.tokens):
+        token_cache.set(token, f"TK{i}", 18)
+    whale_set = WalletIndex((w, f"watch_{i}", "whale") for i, w in enumerate(watch))
+
+    start, end = GENESIS_BLOCK, GENESIS_BLOCK + args.blocks - 1
+    for bn in range(start, end + 1):
+        chain.get_block(bn)
+
+    # per block receipts (no bloom screen, so every block is fetched)
+    process_erc20.BLOOM_PRESCREEN = False
+    receipts.RECEIPT_FETCH_MODE = args.receipt_mode
+    session_a = RecordingSession()
+    server.reset_stats()
+    t0 = time.time()
+    for bn in range(start, end + 1):
+        block = w3.eth.get_block(bn, full_transactions=True)
+        process_erc20.handle_erc20_transfers(w3, block, session_a, whale_set)
+    t_a, calls_a = time.time() - t0, sum(server.calls.values())
+
+    # eth_getLogs windows
+    log_filter.LOGS_WINDOW_BLOCKS = args.window
+    log_filter.LOGS_ADDRESS_CHUNK = args.chunk
+    session_b = RecordingSession()
+    stats = {}
+    server.reset_stats()
+    t0 = time.time()
+    process_erc20.handle_erc20_transfers_by_logs(w3, start, end, session_b, whale_set, stats=stats)
+    t_b, calls_b = time.time() - t0, sum(server.calls.values())
+    server.stop()
+
+    assert session_a.rows == session_b.rows, "eth_getLogs path saved different rows"
+    print(f"wallet transfers: {len(session_b.rows)}")
+    print(f"receipts ({args.receipt_mode}) : {calls_a} RPC calls  {t_a:.2f}s")
+    print(f"eth_getLogs      : {calls_b} RPC calls  {t_b:.2f}s  {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# benchmarks/bench_http_session.py
+import sys
+import os
+
+# Add the project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from web3 import Web3, AsyncWeb3, AsyncHTTPProvider
+from benchmarks.synthetic_chain import SyntheticChain, GENESIS_BLOCK
+from benchmarks.fake_rpc import FakeRPCServer
+
+"""
+Request latency of the RPC clients before / after the shared keep-alive
+sessions (utils/http_session.py) against a local fake node that charges
+--handshake seconds for every new TCP connection (the TLS handshake of a
+remote provider) and gzips responses when asked to.
+
+1. sync: --runs decode runs (like decoder/main.run_decoder_for_range with
+   w3=None) on --threads threads, each getting its client and making
+   --calls block requests. "before" builds a new provider and probes
+   is_connected() every run (the old connect_to_rpc), "after" is
+   connect_to_rpc(); "after, no gzip" is the shared session asking for
+   identity responses.
+2. async: --requests concurrent block requests through web3's default
+   session (force_close, a connection per request) vs the pooled provider.
+
+Reports p50 / p95 request latency (the client setup of a run counts on
+its first request), TCP connections and response KB per request.
+
+    python benchmarks/bench_http_session.py --runs 40 --threads 4
+"""
+
+
+def _pct(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def report(name, server, latencies, seconds):
+    requests_made = server.http_requests
+    print(f"{name:>22} {seconds:>7.2f} {_pct(latencies, 0.5) * 1000:>8.1f} {_pct(latencies, 0.95) * 1000:>8.1f} "
+          f"{server.connections:>6} {requests_made:>6} {server.bytes_sent / max(requests_made, 1) / 1024:>8.1f}")
+
+
+def run_sync(server, get_client, runs, threads, calls, blocks):
+    """Decode-run style workload, returns (request latencies, seconds)"""
+    latencies, lock = [], threading.Lock()
+
+    def one_run(i):
+        t0 = time.perf_counter()
+        w3 = get_client()
+        local = []
+        for c in range(calls):
+            w3.eth.get_block(blocks[(i * calls + c) % len(blocks)], full_transactions=True)
+            t1 = time.perf_counter()
+            local.append(t1 - t0)
+            t0 = t1
+        with lock:
+            latencies.extend(local)
+
+    server.reset_stats()
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one_run, range(runs)))
+    return latencies, time.time() - t0
+
+
+def run_async(server, provider, count, concurrency, blocks):
+    """Concurrent block requests on one client, returns (request latencies, seconds)"""
+
+    async def main():
+        aw3 = AsyncWeb3(provider)
+        sem = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one(i):
+            async with sem:
+                t0 = time.perf_counter()
+                await aw3.eth.get_block(blocks[i % len(blocks)], full_transactions=True)
+                latencies.append(time.perf_counter() - t0)
+        try:
+            await asyncio.gather(*(one(i) for i in range(count)))
+        finally:
+            await aw3.provider.disconnect()
+        return latencies
+
+    server.reset_stats()
+    t0 = time.time()
+    latencies = asyncio.run(main())
+    return latencies, time.time() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=40)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--calls", type=int, default=10, help="block requests per run")
+    parser.add_argument("--requests", type=int, default=400, help="async requests")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--handshake", type=float, default=0.02, help="seconds per new connection")
+    parser.add_argument("--latency", type=float, default=0.002)
+    parser.add_argument("--txs-per-block", type=int, default=5)
+    args = parser.parse_args()
+
+    chain = SyntheticChain(txs_per_block=args.txs_per_block, head=GENESIS_BLOCK + 50)
+    blocks = list(range(GENESIS_BLOCK, GENESIS_BLOCK + 50))
+    for bn in blocks:
+        chain.get_block(bn)     # build the synthetic payloads up front, outside the timings
+    server = FakeRPCServer(chain, latency=args.latency, handshake_latency=args.handshake, gzip=True).start()
+
+    import utils.rate_limit as rate_limit
+    import utils.rpc_pool as rpc_pool
+    from utils.helpers import connect_to_rpc
+    from utils.rate_limit import RateLimitedHTTPProvider
+    rate_limit.RPC_CU_PER_SECOND = 0    # no CU limiter, only the HTTP layer is measured
+    rpc_pool.RPC_URLS = server.url      # connect_to_rpc() endpoint
+
+    def before():
+        # the old connect_to_rpc: new provider (web3's per-thread sessions) + a probe per run
+        w3 = Web3(RateLimitedHTTPProvider([server.url], session=None))
+        if not w3.is_connected():
+            raise ConnectionError(server.url)
+        return w3
+
+    identity = requests.Session()
+    identity.headers["Accept-Encoding"] = "identity"
+    no_gzip = Web3(RateLimitedHTTPProvider([server.url], session=identity))
+
+    print(f"handshake {args.handshake * 1000:.0f} ms, latency {args.latency * 1000:.0f} ms, "
+          f"{args.runs} runs x {args.calls} calls on {args.threads} threads")
+    print(f"{'client':>22} {'seconds':>7} {'p50 ms':>8} {'p95 ms':>8} {'conns':>6} {'reqs':>6} {'KB/req':>8}")
+    try:
+        for name, get_client in (("sync before", before),
+                                 ("sync after", lambda: connect_to_rpc(cache="off")),
+                                 ("sync after, no gzip", lambda: no_gzip)):
+            latencies, seconds = run_sync(server, get_client, args.runs, args.threads, args.calls, blocks)
+            report(name, server, latencies, seconds)
+
+        for name, make_provider in (("async web3 session", lambda: AsyncHTTPProvider(server.url)),
+                                    ("async after", lambda: rpc_pool.PooledAsyncHTTPProvider([server.url]))):
+            latencies, seconds = run_async(server, make_provider(), args.requests, args.concurrency, blocks)
+            report(name, server, latencies, seconds)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/bench_ingestion.py
+import sys
+import os
+
+# Add the project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import time
+from benchmarks.synthetic_chain import SyntheticChain, GENESIS_BLOCK
+from benchmarks.fake_rpc import FakeRPCServer
+
+"""
+Blocks/sec of the threaded process_batch path vs the asyncio engine,
+against the local fake RPC (with per request latency to mimic a remote
+provider) and a DB stand-in that only counts rows.
+
+    python benchmarks/bench_ingestion.py --blocks 100 --latency 0.03
+"""
+
+
+class CountingDB():
+    """DB stand-in exposing the Database_Operations insert_* writers"""
+
+    def __init__(self):
+        self.rows = 0
+
+    def _insert(self, rows):
+        self.rows += len(rows)
+
+    insert_blocks_data = insert_txs_data = insert_receipts_data = insert_logs_data = _insert
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.03, help="seconds per HTTP request")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--no-block-receipts", action="store_true")
+    args = parser.parse_args()
+
+    server = FakeRPCServer(SyntheticChain(), latency=args.latency,
+                           support_block_receipts=not args.no_block_receipts).start()
+    os.environ["ALCHEMY_RPC_URL"] = server.url
+
+    import insertion_main
+    from ingestion.async_engine import ingest_range
+
+    start, end = GENESIS_BLOCK, GENESIS_BLOCK + args.blocks - 1
+    # warm the synthetic chain so generation cost is not measured
+    for bn in range(start, end + 1):
+        server.chain.get_block(bn)
+
+    # current path: process_batch, one block at a time
+    db = CountingDB()
+    insertion_main.db_help = db
+    server.reset_stats()
+    t0 = time.time()
+    blk = start
+    while blk <= end:
+        batch_end = min(blk + args.batch_size - 1, end)
+        insertion_main.process_batch(blk, batch_end)
+        blk = batch_end + 1
+    sync_secs = time.time() - t0
+    sync_http = server.http_requests
+
+    # async engine
+    db = CountingDB()
+    server.reset_stats()
+    stats = ingest_range(start, end, db, rpc_url=server.url, block_concurrency=args.concurrency,
+                         batch_blocks=args.batch_size)
+    async_secs = stats["seconds"]
+
+    print(f"blocks={args.blocks} latency={args.latency}s rows={db.rows}")
+    print(f"process_batch : {args.blocks / sync_secs:8.2f} blocks/s  ({sync_http} HTTP requests)")
+    print(f"async engine  : {args.blocks / async_secs:8.2f} blocks/s  ({server.http_requests} HTTP requests)")
+    print(f"speedup       : {sync_secs / async_secs:8.2f}x")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# benchmarks/bench_listener.py
+import sys
+import os
+
+# Add the project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import asyncio
+import threading
+import time
+from benchmarks.synthetic_chain import SyntheticChain, GENESIS_BLOCK
+from benchmarks.fake_rpc import FakeRPCServer
+from ingestion.block_listener import BlockListener
+
+"""
+Real-time listener against the fake node: blocks are mined every
+--block-time seconds (pushed over newHeads, or polled with --poll),
+with a reorg of --reorg-depth blocks every --reorg-every blocks.
+At the end the rows held by the DB stand-in must be exactly the canonical
+chain; prints block timestamp -> DB latency.
+
+    python benchmarks/bench_listener.py --blocks 30 --block-time 0.5 --reorg-every 10 --reorg-depth 3
+"""
+
+
+class ChainDB():
+    """DB stand-in keeping block number -> hash, with delete_from_block for rollbacks"""
+
+    def __init__(self, delay=0.0):
+        self.blocks = {}
+        self.tx_rows = 0
+        self.delay = delay
+        self.written_at = {}
+
+    def insert_blocks_data(self, rows):
+        time.sleep(self.delay)
+        now = time.time()
+        for bn, _, block in rows:
+            self.blocks[bn] = block["hash"].hex()
+            self.written_at[bn] = now
+
+    def insert_txs_data(self, rows):
+        self.tx_rows += len(rows)
+
+    def insert_receipts_data(self, rows):
+        pass
+
+    def insert_logs_data(self, rows):
+        pass
+
+    def delete_from_block(self, block_number):
+        for bn in [bn for bn in self.blocks if bn >= block_number]:
+            del self.blocks[bn]
+
+
+def miner(server, blocks, block_time, reorg_every, reorg_depth, done):
+    """Mine blocks in the background, with a reorg every reorg_every blocks"""
+    for i in range(1, blocks + 1):
+        time.sleep(block_time)
+        if reorg_every and i % reorg_every == 0:
+            server.reorg(reorg_depth, extra=1)
+        else:
+            server.mine(1)
+    done.set()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=30)
+    parser.add_argument("--block-time", type=float, default=0.5)
+    parser.add_argument("--reorg-every", type=int, default=10)
+    parser.add_argument("--reorg-depth", type=int, default=3)
+    parser.add_argument("--txs-per-block", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds per HTTP request")
+    parser.add_argument("--db-delay", type=float, default=0.0, help="seconds per DB flush")
+    parser.add_argument("--poll", action="store_true", help="poll eth_blockNumber instead of newHeads")
+    args = parser.parse_args()
+
+    chain = SyntheticChain(head=GENESIS_BLOCK + 10, txs_per_block=args.txs_per_block)
+    server = FakeRPCServer(chain, latency=args.latency, ws=True).start()
+    db = ChainDB(args.db_delay)
+    start = chain.head
+    listener = BlockListener(db, rpc_url=server.url, ws_url="" if args.poll else server.ws_url,
+                             start_block=start, poll_interval=args.block_time / 2)
+
+    done = threading.Event()
+
+    async def run():
+        task = asyncio.create_task(listener.run())
+        await asyncio.sleep(0.5)     # let the subscription settle
+        threading.Thread(target=miner, daemon=True,
+                         args=(server, args.blocks, args.block_time, args.reorg_every, args.reorg_depth, done)).start()
+        while not done.is_set():
+            await asyncio.sleep(0.1)
+        # wait for the listener to catch up with the final head
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            if db.blocks.get(chain.head) == chain.block_hash(chain.head)[2:]:
+                break
+            await asyncio.sleep(0.05)
+        listener.stop()
+        return await task
+
+    stats = asyncio.run(run())
+    server.stop()
+
+    expected = {bn: chain.block_hash(bn)[2:] for bn in range(start, chain.head + 1)}
+    assert db.blocks == expected, "DB does not hold the canonical chain"
+
+    # re-mined blocks keep their first mining time, so they include the reorg detection delay
+    mined = sorted(db.written_at[bn] - chain.mined_at[bn] for bn in chain.mined_at if bn in db.written_at)
+    print(f"blocks {start} → {chain.head} canonical in DB, reorgs simulated: {chain.reorgs}")
+    print(f"listener: {stats}")
+    if mined:
+        print(f"mined -> written latency p50 {mined[len(mined) // 2]:.3f}s  max {mined[-1]:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
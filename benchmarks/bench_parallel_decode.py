@@ -0,0 +1,113 @@
+# benchmarks/bench_parallel_decode.py
+import sys
+import os
+
+# Add the project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import time
+import psycopg2
+from benchmarks.synthetic_chain import SyntheticChain, GENESIS_BLOCK
+from benchmarks.fake_rpc import FakeRPCServer
+from benchmarks.bench_copy import raw_rows
+
+"""
+decoder/main.run_parallel_decoder with 1..N worker processes over the same
+raw range. Raw rows of a synthetic chain are loaded once into a scratch
+schema (bench_decode) of DATABASE_URL; before every run the decoded tables,
+tokens and decode checkpoints are emptied. Token metadata comes from the fake node.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_parallel_decode.py --blocks 200 --workers 1 2 4
+"""
+
+SCHEMA = "bench_decode"
+DB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "db")
+SCHEMA_FILES = ("raw_table_schema.sql", "normalized_table_schema.sql", "checkpoint_schema.sql")
+
+
+def execute(dsn, *statements):
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    for sql in statements:
+        cur.execute(sql)
+    conn.commit()
+    conn.close()
+
+
+def decoded_counts(dsn):
+    conn = psycopg2.connect(dsn, options=f"-c search_path={SCHEMA}")
+    cur = conn.cursor()
+    counts = []
+    for table in ("decoded_blocks", "decoded_transactions", "decoded_events", "decoded_erc20_transfers"):
+        cur.execute(f"SELECT count(*) FROM {table}")
+        counts.append(cur.fetchone()[0])
+    conn.close()
+    return counts
+
+
+def reset_schema(dsn):
+    schema = []
+    for name in SCHEMA_FILES:
+        with open(os.path.join(DB_DIR, name), "r", encoding="utf-8") as f:
+            schema.append(f.read())
+    execute(dsn, f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE", f"CREATE SCHEMA {SCHEMA}", *schema)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=200)
+    parser.add_argument("--txs-per-block", type=int, default=150)
+    parser.add_argument("--shard", type=int, default=25, help="blocks per shard")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    dsn = os.getenv("DATABASE_URL")
+    if not dsn:
+        raise ValueError("DATABASE_URL missing in environment")
+    # every connection of this process and of the decoder workers lands in the scratch schema
+    os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"
+
+    chain = SyntheticChain(txs_per_block=args.txs_per_block, head=GENESIS_BLOCK + args.blocks)
+    server = FakeRPCServer(chain).start()
+    os.environ["ALCHEMY_RPC_URL"] = server.url
+
+    from db.db_operations import Database_Operations
+    from db.checkpoints import CheckpointStore
+    from db.token_cache import token_cache
+    from decoder.main import run_parallel_decoder
+
+    start, end = GENESIS_BLOCK, GENESIS_BLOCK + args.blocks - 1
+    reset_schema(dsn)
+    db = Database_Operations()
+    blocks, txs, receipts, logs = raw_rows(chain, start, args.blocks)
+    db.insert_blocks_data(iter(blocks), method="copy")
+    db.insert_txs_data(iter(txs), method="copy")
+    db.insert_receipts_data(iter(receipts), method="copy")
+    db.insert_logs_data(iter(logs), method="copy")
+    CheckpointStore().mark_done("ingest", start, end)
+    print(f"{args.blocks} blocks, {len(txs)} txs, {len(logs)} logs, cpus: {os.cpu_count()}")
+
+    print(f"{'workers':>7} {'seconds':>8} {'blocks/s':>9} {'logs/s':>9} {'speedup':>8}")
+    base, expected = None, None
+    for workers in args.workers:
+        execute(dsn, f"SET search_path TO {SCHEMA}",
+                "TRUNCATE decoded_blocks, decoded_transactions, decoded_events, decoded_erc20_transfers, tokens",
+                "DELETE FROM pipeline_checkpoints WHERE stage = 'decode'",
+                "DELETE FROM pipeline_retries WHERE stage = 'decode'")
+        token_cache.clear()
+
+        t0 = time.time()
+        stats = run_parallel_decoder(start, end, workers=workers, shard_blocks=args.shard, resume=True)
+        seconds = time.time() - t0
+        assert stats["failed"] == 0, f"{stats['failed']} shards failed"
+        counts = decoded_counts(dsn)
+        expected = expected or counts
+        assert counts == expected, f"decoded row counts differ: {counts} vs {expected}"
+        base = base or seconds
+        print(f"{workers:>7} {seconds:>8.2f} {args.blocks / seconds:>9.0f} {len(logs) / seconds:>9.0f} "
+              f"{base / seconds:>7.2f}x")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/bench_rate_limit.py
+import sys
+import os
+
+# Add the project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from web3 import Web3, AsyncWeb3
+from benchmarks.synthetic_chain import SyntheticChain, GENESIS_BLOCK
+from benchmarks.fake_rpc import FakeRPCServer
+from ingestion.receipts import fetch_block_receipts
+from ingestion.async_engine import ingest_range_async
+from utils.rate_limit import ComputeUnitLimiter, RateLimitedHTTPProvider, RateLimitedAsyncHTTPProvider, limiter_stats
+
+"""
+Block fetching against a fake node that throttles at --plan CU/s
+(HTTP 429 above it): web3's own retries vs the shared ComputeUnitLimiter
+(utils/rate_limit.py), with threads (get_block + block receipts, like
+insertion_main.get_block_data) and with the async engine. Reports blocks
+lost, 429s received and the CU/s actually served against the plan.
+
+    python benchmarks/bench_rate_limit.py --blocks 60 --plan 3000 --threads 8
+"""
+
+
+async def _discard(db, items):
+    return None
+
+
+def fetch_threads(w3, blocks, threads):
+    """Fetch blocks on a thread pool, returns the number of blocks lost"""
+    def fetch(bn):
+        try:
+            block = w3.eth.get_block(bn, full_transactions=True)
+            fetch_block_receipts(w3, block)
+            return True
+        except Exception:
+            return False    # get_block_data raises, the batch fails
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return sum(not ok for ok in pool.map(fetch, blocks))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=60)
+    parser.add_argument("--txs-per-block", type=int, default=50)
+    parser.add_argument("--plan", type=float, default=3000, help="CU/s the fake node allows")
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    chain = SyntheticChain(txs_per_block=args.txs_per_block, head=GENESIS_BLOCK + args.blocks)
+    server = FakeRPCServer(chain, throttle_cups=args.plan).start()
+    blocks = list(range(GENESIS_BLOCK, GENESIS_BLOCK + args.blocks))
+    for bn in blocks:
+        chain.get_block(bn)     # build the synthetic payloads up front, outside the timings
+
+    def threads_plain():
+        return fetch_threads(Web3(Web3.HTTPProvider(server.url)), blocks, args.threads), None
+
+    def threads_limited():
+        limiter = ComputeUnitLimiter(args.plan)
+        w3 = Web3(RateLimitedHTTPProvider(server.url, limiter=limiter))
+        return fetch_threads(w3, blocks, args.threads), limiter
+
+    def async_engine(limiter):
+        if limiter is None:
+            aw3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(server.url))
+        else:
+            aw3 = AsyncWeb3(RateLimitedAsyncHTTPProvider(server.url, limiter=limiter))
+
+        async def run():
+            try:
+                return await ingest_range_async(blocks[0], blocks[-1], None, aw3=aw3, writer=_discard)
+            finally:
+                await aw3.provider.disconnect()
+        return len(asyncio.run(run())["failed"]), limiter
+
+    runs = [
+        ("threads, web3 retries", threads_plain),
+        ("threads, limiter", threads_limited),
+        ("async, web3 retries", lambda: async_engine(None)),
+        ("async, limiter", lambda: async_engine(ComputeUnitLimiter(args.plan))),
+    ]
+    print(f"{args.blocks} blocks x {args.txs_per_block} txs, node plan {args.plan:.0f} CU/s")
+    print(f"{'run':>22} {'seconds':>8} {'lost':>5} {'429s':>6} {'CU/s':>7} {'of plan':>8}  limiter")
+    for name, run in runs:
+        time.sleep(1.5)     # let the node's bucket refill between runs
+        server.reset_stats()
+        t0 = time.time()
+        lost, limiter = run()
+        seconds = time.time() - t0
+        cups = server.cu_served / seconds
+        extra = limiter_stats(limiter) if limiter else ""
+        print(f"{name:>22} {seconds:>8.2f} {lost:>5} {server.throttled:>6} {cups:>7.0f} {cups / args.plan:>8.0%}  {extra}")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# benchmarks/bench_raw_layout.py
+import sys
+import os
+
+# Add the project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import time
+import psycopg2
+from web3 import Web3
+from benchmarks.synthetic_chain import SyntheticChain, GENESIS_BLOCK
+from benchmarks.fake_rpc import FakeRPCServer
+from benchmarks.bench_fused import DECODED_TABLES, dump_decoded
+
+"""
+JSON raw layout vs the compact one (db/raw_compact.py) on the same range:
+bytes per block on disk (heap + TOAST, and with indexes), end-to-end ingest
+time (fetch from the fake node, build rows, insert) and decode time.
+decoded_* must come out identical from both layouts.
+Runs in a scratch schema (bench_layout) of DATABASE_URL.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_raw_layout.py --blocks 100 --method copy
+"""
+
+SCHEMA = "bench_layout"
+DB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "db")
+SCHEMA_FILES = ("raw_table_schema.sql", "raw_compact_schema.sql", "normalized_table_schema.sql")
+LAYOUT_TABLES = {
+    "json": ("raw_blocks", "raw_transactions", "raw_receipts", "raw_logs"),
+    "compact": ("raw_block_headers", "raw_transactions_compact", "raw_receipts_compact", "raw_logs_compact"),
+}
+
+
+def reset_schema(dsn):
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    for name in SCHEMA_FILES:
+        with open(os.path.join(DB_DIR, name), "r", encoding="utf-8") as f:
+            cur.execute(f.read())
+    conn.commit()
+    conn.close()
+
+
+def table_bytes(dsn, tables):
+    """(heap + TOAST bytes, bytes incl. indexes) of the tables"""
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    heap = total = 0
+    for table in tables:
+        cur.execute("SELECT pg_table_size(%s), pg_total_relation_size(%s)", (table, table))
+        h, t = cur.fetchone()
+        heap, total = heap + h, total + t
+    conn.close()
+    return heap, total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=100)
+    parser.add_argument("--txs-per-block", type=int, default=150)
+    parser.add_argument("--batch", type=int, default=20, help="blocks per insert")
+    parser.add_argument("--method", default="values", help="values | copy")
+    args = parser.parse_args()
+
+    dsn = os.getenv("DATABASE_URL")
+    if not dsn:
+        raise ValueError("DATABASE_URL missing in environment")
+    os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"
+
+    chain = SyntheticChain(txs_per_block=args.txs_per_block, head=GENESIS_BLOCK + args.blocks)
+    server = FakeRPCServer(chain).start()
+    w3 = Web3(Web3.HTTPProvider(server.url))
+
+    import db.raw_compact as raw_compact
+    from db.db_operations import Database_Operations
+    from db.token_cache import token_cache
+    from decoder.main import run_decoder_for_range
+    from ingestion.raw_rows import build_raw_rows
+    from ingestion.receipts import fetch_block_receipts
+    db = Database_Operations()
+    start, end = GENESIS_BLOCK, GENESIS_BLOCK + args.blocks - 1
+    for bn in range(start, end + 1):
+        chain.get_block(bn)     # build the synthetic payloads up front, outside the timings
+
+    def ingest():
+        for batch_start in range(start, end + 1, args.batch):
+            items = []
+            for bn in range(batch_start, min(batch_start + args.batch, end + 1)):
+                block = w3.eth.get_block(bn, full_transactions=True)
+                items.append(build_raw_rows(bn, block, fetch_block_receipts(w3, block)))
+            db.insert_blocks_data([d["block"] for d in items], method=args.method)
+            db.insert_txs_data([r for d in items for r in d["tx"]], method=args.method)
+            db.insert_receipts_data([r for d in items for r in d["receipt"]], method=args.method)
+            db.insert_logs_data([r for d in items for r in d["logs"]], method=args.method)
+
+    print(f"{args.blocks} blocks x {args.txs_per_block} txs, insert method {args.method}")
+    print(f"{'layout':>8} {'ingest s':>9} {'decode s':>9} {'bytes/block':>12} {'incl. idx':>10}")
+    expected, sizes = None, {}
+    for layout in ("json", "compact"):
+        raw_compact.RAW_LAYOUT = layout
+        reset_schema(dsn)
+        token_cache.clear()
+
+        t0 = time.time()
+        ingest()
+        t_ingest = time.time() - t0
+        heap, total = table_bytes(dsn, LAYOUT_TABLES[layout])
+
+        t0 = time.time()
+        assert run_decoder_for_range(start, end, w3)
+        t_decode = time.time() - t0
+
+        decoded = dump_decoded(dsn)
+        expected = expected or decoded
+        for table in DECODED_TABLES:
+            assert decoded[table] == expected[table], f"{layout}: {table} differs from the JSON layout"
+        sizes[layout] = heap
+        print(f"{layout:>8} {t_ingest:>9.2f} {t_decode:>9.2f} {heap / args.blocks:>12.0f} {total / args.blocks:>10.0f}")
+
+    print(f"compact / json bytes per block: {sizes['compact'] / sizes['json']:.2f}, decoded_* identical")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# benchmarks/bench_rpc_pool.py
+import sys
+import os
+
+# Add the project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from web3 import Web3, AsyncWeb3
+from benchmarks.synthetic_chain import SyntheticChain, GENESIS_BLOCK
+from benchmarks.fake_rpc import FakeRPCServer
+from utils.rpc_pool import RPCPool, PooledHTTPProvider, PooledAsyncHTTPProvider
+
+"""
+RPC endpoint pool (utils/rpc_pool.py) against local fake nodes with
+injected latency:
+
+1. weighting / ejection: threads fetching blocks from one slow node vs
+   a pool of a fast node, the slow one and a dead one (connection refused)
+2. hedging: sequential block fetches (like the real-time listener) from
+   a pool of a node with tail latency (--spike-fraction of the requests
+   take --spike-latency more) and a steady one, without and with hedged
+   requests; reports p50 / p95 / p99 request latency
+
+Per-endpoint stats of every pool are printed.
+
+    python benchmarks/bench_rpc_pool.py --requests 300
+"""
+
+
+def _pct(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def print_stats(pool, names):
+    for url, s in pool.stats().items():
+        print(f"    {names[url]:>8}: {s['requests']:>4} req, {s['errors']:>3} err, {s['ejections']} ejections, "
+              f"mean {s['latency_ms']:>6.1f} ms, p95 {s['p95_ms']:>6.1f} ms, hedges {s['hedges']} "
+              f"(won {s['hedges_won']})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--slow-latency", type=float, default=0.05)
+    parser.add_argument("--spike-fraction", type=float, default=0.1)
+    parser.add_argument("--spike-latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    chain = SyntheticChain(txs_per_block=20, head=GENESIS_BLOCK + 50)
+    for bn in range(GENESIS_BLOCK, GENESIS_BLOCK + 50):
+        chain.get_block(bn)     # build the synthetic payloads up front, outside the timings
+    fast = FakeRPCServer(chain, latency=0.005).start()
+    slow = FakeRPCServer(chain, latency=args.slow_latency).start()
+    dead = FakeRPCServer(chain).start()
+    dead.stop()
+    spiky = FakeRPCServer(chain, latency=0.005, slow_fraction=args.spike_fraction,
+                          slow_latency=args.spike_latency).start()
+    steady = FakeRPCServer(chain, latency=0.02).start()
+    names = {fast.url: "fast", slow.url: "slow", dead.url: "dead", spiky.url: "spiky", steady.url: "steady"}
+    blocks = [GENESIS_BLOCK + i % 50 for i in range(args.requests)]
+
+    print(f"1. {args.requests} get_block calls on {args.threads} threads")
+    for label, urls in (("slow node only", [slow.url]), ("pool fast+slow+dead", [fast.url, slow.url, dead.url])):
+        pool = RPCPool(urls)
+        w3 = Web3(PooledHTTPProvider(pool=pool))
+        t0 = time.time()
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            list(executor.map(lambda bn: w3.eth.get_block(bn), blocks))
+        seconds = time.time() - t0
+        print(f"  {label:<22} {seconds:6.2f}s  {args.requests / seconds:7.0f} req/s")
+        print_stats(pool, names)
+
+    print(f"2. {args.requests} sequential get_block calls, {args.spike_fraction:.0%} of the spiky node's "
+          f"requests +{args.spike_latency}s")
+    for hedge in (False, True):
+        pool = RPCPool([spiky.url, steady.url])
+        aw3 = AsyncWeb3(PooledAsyncHTTPProvider(pool=pool, hedge=hedge))
+
+        async def run():
+            latencies = []
+            try:
+                for bn in blocks:
+                    t0 = time.monotonic()
+                    await aw3.eth.get_block(bn)
+                    latencies.append(time.monotonic() - t0)
+            finally:
+                await aw3.provider.disconnect()
+            return latencies
+        latencies = asyncio.run(run())
+        print(f"  hedge={str(hedge):<5} p50 {_pct(latencies, 0.5) * 1000:6.1f} ms  p95 {_pct(latencies, 0.95) * 1000:6.1f} ms"
+              f"  p99 {_pct(latencies, 0.99) * 1000:6.1f} ms  max {max(latencies) * 1000:6.1f} ms")
+        print_stats(pool, names)
+
+    for server in (fast, slow, spiky, steady):
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+# benchmarks/fake_rpc.py
+import asyncio
+import gzip
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from eth_abi import decode as abi_decode, encode as abi_encode
+from utils.rate_limit import method_cost
+
+"""
+Local fake Ethereum JSON-RPC node backed by SyntheticChain.
+Accepts single and batch payloads, counts calls per method and can
+pretend not to know eth_getBlockReceipts (like some providers).
+eth_getLogs filters the synthetic logs (and refuses more than max_logs results),
+eth_call answers ERC-20 name/symbol/decimals of the synthetic tokens and
+Multicall3 aggregate3 over them.
+With ws=True a WebSocket endpoint (server.ws_url) serves the same methods plus
+eth_subscribe("newHeads"); server.mine() / server.reorg() advance or re-mine
+the chain and push the new heads to subscribers.
+With throttle_cups=N the node bills requests in compute units
+(utils.rate_limit.CU_COSTS) against an N CU/s bucket and answers HTTP 429
+when it is empty, like a provider plan limit. latency adds a fixed delay
+to every HTTP request, slow_fraction of them get slow_latency more.
+handshake_latency is paid once per new TCP connection (the TLS handshake
+of a remote provider), server.connections counts them; with gzip=True
+responses are gzip encoded when the client accepts it, server.bytes_sent
+counts the body bytes put on the wire. server.fail_next(n, status, method)
+answers the next n requests (of that method) with a bare HTTP error, like
+a flaky load balancer.
+
+    server = FakeRPCServer(SyntheticChain()).start()
+    w3 = Web3(Web3.HTTPProvider(server.url))
+    ...
+    server.stop()
+"""
+
+
+MULTICALL3 = "0xca11bde05977b3631167028862be2a173976ca11"
+AGGREGATE3 = "82ad56cb"
+SELECTORS = {"06fdde03": 0, "95d89b41": 1, "313ce567": 2}   # name, symbol, decimals
+REVERT = {"code": 3, "message": "execution reverted"}
+
+
+def _parse_block_param(chain, param):
+    if param in ("latest", "safe", "finalized", "pending"):
+        return chain.head
+    if param == "earliest":
+        return 0
+    return int(param, 16)
+
+
+class FakeRPCServer():
+    """Class to serve a SyntheticChain over HTTP JSON-RPC"""
+
+    def __init__(self, chain, host="127.0.0.1", port=0, support_block_receipts=True, latency=0.0,
+                 support_multicall=True, max_logs=10000, ws=False, throttle_cups=None,
+                 slow_fraction=0.0, slow_latency=0.0, handshake_latency=0.0, gzip=False):
+        self.chain = chain
+        self.ws = ws
+        self._ws_server = None
+        self._ws_loop = None
+        self._subscribers = {}           # subscription id -> websocket
+        self.max_logs = max_logs         # eth_getLogs answers -32005 above this many results
+        self.support_block_receipts = support_block_receipts
+        self.support_multicall = support_multicall
+        self.latency = latency           # seconds added to every HTTP request
+        self.slow_fraction = slow_fraction   # share of requests getting slow_latency more (tail latency)
+        self.slow_latency = slow_latency
+        self.handshake_latency = handshake_latency  # seconds added to the first request of a connection
+        self.gzip = gzip
+        self.connections = 0             # TCP connections accepted
+        self.bytes_sent = 0              # response body bytes (after compression)
+        self.calls = Counter()           # method -> number of calls
+        self.http_requests = 0           # number of HTTP round trips
+        self.throttle_cups = throttle_cups  # CU/s plan limit, None -> never throttles
+        self.throttled = 0               # requests answered with 429
+        self.cu_served = 0               # compute units of the answered requests
+        self.failures = []               # [status, method or None] of the next requests to fail
+        self.failed = 0                  # requests answered with an injected HTTP error
+        self._cu_tokens = throttle_cups or 0
+        self._cu_updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def ws_url(self):
+        host, port = self._ws_server.sockets[0].getsockname()[:2]
+        return f"ws://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        if self.ws:
+            ready = threading.Event()
+            threading.Thread(target=self._run_ws, args=(ready,), daemon=True).start()
+            ready.wait()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._ws_loop:
+            self._ws_loop.call_soon_threadsafe(self._ws_server.close)
+
+    # ------------------------------------------------------------------
+    # WebSocket endpoint (newHeads subscriptions)
+    # ------------------------------------------------------------------
+    def _run_ws(self, ready):
+        from websockets.asyncio.server import serve
+
+        async def main():
+            host = self._httpd.server_address[0]
+            self._ws_server = await serve(self._ws_handler, host, 0)
+            ready.set()
+            await self._ws_server.wait_closed()
+
+        self._ws_loop = asyncio.new_event_loop()
+        self._ws_loop.run_until_complete(main())
+
+    async def _ws_handler(self, websocket):
+        try:
+            async for message in websocket:
+                payload = json.loads(message)
+                if payload.get("method") == "eth_subscribe":
+                    sub_id = hex(len(self._subscribers) + 1)
+                    self._subscribers[sub_id] = websocket
+                    body = {"jsonrpc": "2.0", "id": payload.get("id"), "result": sub_id}
+                elif payload.get("method") == "eth_unsubscribe":
+                    body = {"jsonrpc": "2.0", "id": payload.get("id"),
+                            "result": self._subscribers.pop(payload["params"][0], None) is not None}
+                elif isinstance(payload, list):
+                    body = [self._answer(p) for p in payload]
+                else:
+                    body = self._answer(payload)
+                await websocket.send(json.dumps(body))
+        except Exception:
+            pass
+        finally:
+            for sub_id, ws in list(self._subscribers.items()):
+                if ws is websocket:
+                    self._subscribers.pop(sub_id, None)
+
+    async def _broadcast(self, header):
+        for sub_id, websocket in list(self._subscribers.items()):
+            msg = {"jsonrpc": "2.0", "method": "eth_subscription",
+                   "params": {"subscription": sub_id, "result": header}}
+            try:
+                await websocket.send(json.dumps(msg))
+            except Exception:
+                self._subscribers.pop(sub_id, None)
+
+    def _notify_head(self):
+        if not self._ws_loop:
+            return
+        header = dict(self.chain.get_block(self.chain.head, False))
+        header.pop("transactions", None)
+        asyncio.run_coroutine_threadsafe(self._broadcast(header), self._ws_loop).result(timeout=5)
+
+    def mine(self, count=1):
+        """Function to add count blocks, one newHeads notification per block"""
+        for _ in range(count):
+            self.chain.mine(1)
+            self._notify_head()
+        return self.chain.head
+
+    def reorg(self, depth, extra=1):
+        """Function to re-mine the last depth blocks and add extra blocks on the new branch"""
+        fork = self.chain.reorg(depth)
+        self.mine(extra)
+        return fork
+
+    def fail_next(self, count=1, status=503, method=None):
+        """Function to answer the next count requests (calling method, any by default) with HTTP status"""
+        with self._lock:
+            self.failures.extend([status, method] for _ in range(count))
+
+    def _injected_failure(self, payload):
+        calls = payload if isinstance(payload, list) else [payload]
+        with self._lock:
+            for i, (status, method) in enumerate(self.failures):
+                if method is None or any(p.get("method") == method for p in calls):
+                    del self.failures[i]
+                    self.failed += 1
+                    return status
+        return None
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls.clear()
+            self.http_requests = 0
+            self.throttled = 0
+            self.cu_served = 0
+            self.connections = 0
+            self.bytes_sent = 0
+
+    def _bill(self, payload):
+        """Take the CU of a request from the plan bucket, False when the request is throttled"""
+        calls = payload if isinstance(payload, list) else [payload]
+        cost = sum(method_cost(p.get("method")) for p in calls)
+        with self._lock:
+            if self.throttle_cups:
+                now = time.monotonic()
+                self._cu_tokens = min(self.throttle_cups, self._cu_tokens + (now - self._cu_updated) * self.throttle_cups)
+                self._cu_updated = now
+                if self._cu_tokens < min(cost, self.throttle_cups):     # a request above the bucket size may overdraw it
+                    self.throttled += 1
+                    return False
+                self._cu_tokens -= cost
+            self.cu_served += cost
+        return True
+
+    # ------------------------------------------------------------------
+    def dispatch(self, method, params):
+        """Function to answer one JSON-RPC call -> (result, error)"""
+        chain = self.chain
+        if method == "web3_clientVersion":
+            return "FakeRPC/v1", None
+        if method == "eth_chainId":
+            return "0x1", None
+        if method == "net_version":
+            return "1", None
+        if method == "eth_blockNumber":
+            return hex(chain.head), None
+        if method == "eth_getBlockByNumber":
+            number = _parse_block_param(chain, params[0])
+            return chain.get_block(number, bool(params[1]) if len(params) > 1 else False), None
+        if method == "eth_getBlockReceipts":
+            if not self.support_block_receipts:
+                return None, {"code": -32601, "message": "the method eth_getBlockReceipts does not exist/is not available"}
+            return chain.get_block_receipts(_parse_block_param(chain, params[0])), None
+        if method == "eth_getTransactionReceipt":
+            return chain.get_receipt(params[0]), None
+        if method == "eth_getLogs":
+            return self._get_logs(params[0])
+        if method == "eth_call":
+            return self._eth_call(params[0]["to"].lower(), params[0].get("data") or params[0].get("input") or "0x")
+        return None, {"code": -32601, "message": f"the method {method} does not exist/is not available"}
+
+    def _get_logs(self, flt):
+        """Function to answer eth_getLogs (fromBlock / toBlock / address / topics filter)"""
+        chain = self.chain
+        start = _parse_block_param(chain, flt.get("fromBlock", "latest"))
+        end = _parse_block_param(chain, flt.get("toBlock", "latest"))
+        addresses = flt.get("address")
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        addresses = {a.lower() for a in addresses} if addresses else None
+        wanted = []
+        for t in flt.get("topics") or []:
+            if t is None:
+                wanted.append(None)
+            else:
+                wanted.append({x.lower() for x in ([t] if isinstance(t, str) else t)})
+
+        out = []
+        for bn in range(start, min(end, chain.head) + 1):
+            for receipt in chain.get_block_receipts(bn):
+                for lg in receipt["logs"]:
+                    if addresses and lg["address"].lower() not in addresses:
+                        continue
+                    topics = lg["topics"]
+                    if any(w is not None and (i >= len(topics) or topics[i].lower() not in w)
+                           for i, w in enumerate(wanted)):
+                        continue
+                    out.append(lg)
+                    if len(out) > self.max_logs:
+                        return None, {"code": -32005, "message": f"query returned more than {self.max_logs} results"}
+        return out, None
+
+    def _token_call(self, target, data):
+        """Function to run one token call -> (success, return bytes)"""
+        meta = self.chain.token_metadata(target)
+        field = SELECTORS.get(data[:4].hex())
+        if meta is None:
+            return True, b""                # no code: call succeeds, empty data
+        name, symbol, decimals, kind = meta
+        if kind == "revert" or field is None:
+            return False, b""
+        if field == 2:
+            return True, abi_encode(["uint8"], [decimals])
+        text = (name, symbol)[field]
+        if kind == "bytes32":
+            return True, text.encode().ljust(32, b"\x00")
+        return True, abi_encode(["string"], [text])
+
+    def _eth_call(self, to, data):
+        data = bytes.fromhex(data[2:])
+        if to == MULTICALL3:
+            if not self.support_multicall or data[:4].hex() != AGGREGATE3:
+                return "0x", None
+            calls = abi_decode(["(address,bool,bytes)[]"], data[4:])[0]
+            results = []
+            for target, allow_failure, calldata in calls:
+                ok, out = self._token_call(target, calldata)
+                if not ok and not allow_failure:
+                    return None, {"code": 3, "message": "execution reverted: Multicall3: call failed"}
+                results.append((ok, out))
+            return "0x" + abi_encode(["(bool,bytes)[]"], [results]).hex(), None
+        ok, out = self._token_call(to, data)
+        if not ok:
+            return None, REVERT
+        return "0x" + out.hex(), None
+
+    def _answer(self, payload):
+        method = payload.get("method")
+        with self._lock:
+            self.calls[method] += 1
+        try:
+            result, error = self.dispatch(method, payload.get("params") or [])
+        except Exception as e:
+            result, error = None, {"code": -32000, "message": str(e)}
+        out = {"jsonrpc": "2.0", "id": payload.get("id")}
+        if error:
+            out["error"] = error
+        else:
+            out["result"] = result
+        return out
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True      # avoid 40ms delayed-ACK stalls on keep-alive
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+                self.handshake_pending = bool(server.handshake_latency)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length))
+                with server._lock:
+                    server.http_requests += 1
+                if self.handshake_pending:
+                    self.handshake_pending = False
+                    time.sleep(server.handshake_latency)
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.slow_fraction and random.random() < server.slow_fraction:
+                    time.sleep(server.slow_latency)
+
+                status = server._injected_failure(payload)
+                if status:
+                    data = b"upstream unavailable"
+                    self.send_response(status)
+                    self.send_header("Content-Type", "text/plain")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+
+                if not server._bill(payload):
+                    data = json.dumps({"jsonrpc": "2.0", "id": None, "error": {
+                        "code": 429, "message": "Your app has exceeded its compute units per second capacity"}}).encode()
+                    self.send_response(429)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+
+                if isinstance(payload, list):
+                    body = [server._answer(p) for p in payload]
+                else:
+                    body = server._answer(payload)
+
+                data = json.dumps(body).encode()
+                encoded = server.gzip and "gzip" in self.headers.get("Accept-Encoding", "")
+                if encoded:
+                    data = gzip.compress(data, compresslevel=5)
+                with server._lock:
+                    server.bytes_sent += len(data)
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    if encoded:
+                        self.send_header("Content-Encoding", "gzip")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass    # client gave up (e.g. a hedged request that lost the race)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
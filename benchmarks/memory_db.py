@@ -0,0 +1,143 @@
+# benchmarks/memory_db.py
+import threading
+from psycopg2 import extensions
+
+"""
+In-process stand-in for Postgres, for benchmarks on a machine without a
+database. MemoryConnection / MemoryCursor implement the part of the
+psycopg2 API the pipeline uses (execute, mogrify -> execute_values,
+copy_expert, fetch*, commit / rollback, named cursors). Every statement is
+rendered client side like psycopg2 does (parameters adapted and quoted,
+COPY streams read to the end), so the Python cost of an insert is kept,
+only the server work and the round trip are gone. Queries return no rows:
+token lookups miss and go to the RPC node.
+
+    import db.connection as db_connection
+    db = MemoryDatabase()
+    db_connection._pool = db.pool()
+    ...
+    db.stats -> {"statements", "bytes", "copy_bytes", "commits"}
+"""
+
+
+def _quote(value):
+    adapted = extensions.adapt(value)
+    if hasattr(adapted, "encoding"):
+        adapted.encoding = "utf8"       # QuotedString defaults to latin-1 without a connection
+    return adapted.getquoted()
+
+
+def mogrify(query, params=None):
+    """Function to render a query with its parameters, like cursor.mogrify"""
+    if isinstance(query, str):
+        query = query.encode()
+    if params is None:
+        return query
+    if isinstance(params, dict):
+        return query % {k.encode() if isinstance(k, str) else k: _quote(v) for k, v in params.items()}
+    return query % tuple(_quote(v) for v in params)
+
+
+class MemoryCursor():
+    """Class to count the statements and bytes a psycopg2 cursor would send"""
+
+    def __init__(self, db, name=None):
+        self.db = db
+        self.name = name
+        self.connection = None
+        self.rowcount = 0
+        self.itersize = 2000
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return iter(())
+
+    def mogrify(self, query, params=None):
+        return mogrify(query, params)
+
+    def execute(self, query, params=None):
+        self.db.count(statements=1, bytes=len(mogrify(query, params)))
+        self.rowcount = 0
+
+    def executemany(self, query, seq):
+        for params in seq:
+            self.execute(query, params)
+
+    def copy_expert(self, sql, file, size=8192):
+        total = 0
+        while True:
+            chunk = file.read(size)
+            if not chunk:
+                break
+            total += len(chunk)
+        self.db.count(statements=1, copy_bytes=total)
+
+    def fetchone(self):
+        return None
+
+    def fetchmany(self, size=None):
+        return []
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class MemoryConnection():
+    """Class standing in for a psycopg2 connection"""
+
+    def __init__(self, db):
+        self.db = db
+        self.closed = 0
+        self.autocommit = False
+        self.encoding = "UTF8"      # execute_values joins the rendered pages with it
+
+    def cursor(self, name=None, **kwargs):
+        cur = MemoryCursor(self.db, name)
+        cur.connection = self
+        return cur
+
+    def commit(self):
+        self.db.count(commits=1)
+
+    def rollback(self):
+        pass
+
+    def get_transaction_status(self):
+        return extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class MemoryDatabase():
+    """Class to hand out MemoryConnections and sum up what they were sent"""
+
+    def __init__(self):
+        self.stats = {"statements": 0, "bytes": 0, "copy_bytes": 0, "commits": 0}
+        self._lock = threading.Lock()
+
+    def count(self, **counters):
+        with self._lock:
+            for name, value in counters.items():
+                self.stats[name] += value
+
+    def reset_stats(self):
+        with self._lock:
+            for name in self.stats:
+                self.stats[name] = 0
+
+    def connect(self, dsn=None):
+        return MemoryConnection(self)
+
+    def pool(self, maxconn=8):
+        """A db.connection.ConnectionPool opening MemoryConnections"""
+        from db.connection import ConnectionPool
+        return ConnectionPool(dsn=None, minconn=1, maxconn=maxconn, connect=self.connect)
@@ -0,0 +1,255 @@
+# benchmarks/run_suite.py
+import sys
+import os
+
+# Add the project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import datetime
+import json
+import platform
+import resource
+import statistics
+import subprocess
+import time
+import tracemalloc
+from pathlib import Path
+from benchmarks.synthetic_chain import SyntheticChain, GENESIS_BLOCK
+from benchmarks.fake_rpc import FakeRPCServer
+from benchmarks.memory_db import MemoryDatabase
+
+"""
+Benchmark suite of the ingestion / decode hot paths, with results written
+to a JSON file to compare between commits.
+
+Everything runs against the deterministic SyntheticChain (mainnet shaped
+blocks: --txs-per-block txs, ERC-20 transfer logs, real blooms) served by
+the local FakeRPCServer, and either a scratch schema (bench_suite) of
+DATABASE_URL or, with --db memory (the default without DATABASE_URL), the
+in-process stand-in of benchmarks/memory_db.py. The RPC cache and the CU
+limiter are off.
+
+- get_block_data: blocks/s of insertion_main.get_block_data (block +
+  receipts + raw rows)
+- process_batch: blocks/s of insertion_main.process_batch over --batch
+  block batches, and the traced peak memory (MB) of one batch
+- bulk_insert: rows/s of Database_Operations.bulk_insert, all raw rows
+- decode_logs: logs/s of decoder.transform.decode_logs, token cache cold
+
+Every stage runs --repeat times, the median is reported. Results go to
+.cache/bench/<commit>.json (--out), --compare prints the change against
+an earlier results file.
+
+    python benchmarks/run_suite.py --blocks 50 --compare .cache/bench/<commit>.json
+    DATABASE_URL=postgresql://... python benchmarks/run_suite.py --db postgres
+"""
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / ".cache" / "bench"
+SCHEMA = "bench_suite"
+SCHEMA_FILES = ("raw_table_schema.sql", "raw_compact_schema.sql", "normalized_table_schema.sql",
+                "checkpoint_schema.sql")
+RAW_TABLES = ("raw_blocks", "raw_transactions", "raw_receipts", "raw_logs")
+METRICS = {        # stage -> metric compared, higher is better unless listed in LOWER_IS_BETTER
+    "get_block_data": "blocks_per_s",
+    "process_batch": "blocks_per_s",
+    "bulk_insert": "rows_per_s",
+    "decode_logs": "logs_per_s",
+}
+LOWER_IS_BETTER = {"peak_mb"}
+
+
+def git_commit():
+    """(short commit, dirty) of the working tree, ("unknown", True) outside git"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", True
+
+
+def reset_schema(dsn):
+    import psycopg2
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"SET search_path TO {SCHEMA}")
+    for name in SCHEMA_FILES:
+        with open(ROOT / "db" / name, "r", encoding="utf-8") as f:
+            cur.execute(f.read())
+    conn.commit()
+    conn.close()
+
+
+def timed(repeat, prepare, run):
+    """Run prepare() untimed and run() timed `repeat` times, returns (median seconds, all seconds, last result)"""
+    seconds, result = [], None
+    for _ in range(repeat):
+        prepare()
+        t0 = time.perf_counter()
+        result = run()
+        seconds.append(time.perf_counter() - t0)
+    return statistics.median(seconds), seconds, result
+
+
+def traced_peak_mb(run):
+    """Peak Python heap (MB) allocated while run() executes"""
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def compare(results, baseline_path):
+    """Function to print every metric against an earlier results file"""
+    baseline = json.loads(Path(baseline_path).read_text())
+    print(f"\nvs {baseline['commit']}{' (dirty)' if baseline.get('dirty') else ''} ({baseline_path})")
+    def workload(report):
+        return report.get("db"), {k: v for k, v in report.get("params", {}).items() if k != "repeat"}
+    if workload(baseline) != workload(results):
+        print(f"warning: different workload {workload(baseline)} vs {workload(results)}, numbers are not comparable")
+    print(f"{'stage':>15} {'metric':>13} {'base':>11} {'now':>11} {'change':>8}")
+    for stage, values in results["results"].items():
+        for metric, now in values.items():
+            base = baseline["results"].get(stage, {}).get(metric)
+            if not isinstance(now, (int, float)) or not isinstance(base, (int, float)) or not base \
+                    or metric.startswith("runs") or metric in ("blocks", "rows", "logs"):
+                continue
+            change = (now / base - 1) * 100
+            better = change < 0 if metric in LOWER_IS_BETTER else change > 0
+            flag = "" if abs(change) < 5 else (" +" if better else " -")
+            print(f"{stage:>15} {metric:>13} {base:>11.1f} {now:>11.1f} {change:>7.1f}%{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=50)
+    parser.add_argument("--txs-per-block", type=int, default=150)
+    parser.add_argument("--batch", type=int, default=10, help="blocks per process_batch call")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--db", choices=("memory", "postgres"),
+                        default="postgres" if os.getenv("DATABASE_URL") else "memory")
+    parser.add_argument("--out", help="results file (default .cache/bench/<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    args = parser.parse_args()
+
+    dsn = os.getenv("DATABASE_URL")
+    if args.db == "postgres":
+        if not dsn:
+            raise ValueError("DATABASE_URL missing in environment")
+        os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"
+    os.environ["RPC_CACHE"] = "off"
+
+    chain = SyntheticChain(txs_per_block=args.txs_per_block, head=GENESIS_BLOCK + args.blocks)
+    for bn in range(GENESIS_BLOCK, GENESIS_BLOCK + args.blocks):
+        chain.get_block(bn)     # build the synthetic payloads up front, outside the timings
+    server = FakeRPCServer(chain).start()
+
+    import utils.rate_limit as rate_limit
+    import utils.rpc_pool as rpc_pool
+    import db.connection as db_connection
+    rate_limit.RPC_CU_PER_SECOND = 0
+    rpc_pool.RPC_URLS = server.url
+    memory_db = None
+    if args.db == "memory":
+        memory_db = MemoryDatabase()
+        db_connection._pool = memory_db.pool()
+
+    import insertion_main
+    from db.db_operations import Database_Operations, RAW_TABLE_COLUMNS
+    from db.token_cache import token_cache
+    from decoder.transform import decode_logs
+    from utils.helpers import normalize
+
+    db = Database_Operations()
+    w3 = insertion_main.w3
+    start, end = GENESIS_BLOCK, GENESIS_BLOCK + args.blocks - 1
+    blocks = end - start + 1
+
+    def prepare():
+        token_cache.clear()
+        if memory_db is not None:
+            memory_db.reset_stats()
+        else:
+            reset_schema(dsn)
+
+    results = {}
+    print(f"{blocks} blocks x {args.txs_per_block} txs, db {args.db}, median of {args.repeat}")
+    try:
+        # get_block_data
+        t, runs, items = timed(args.repeat, prepare,
+                               lambda: [insertion_main.get_block_data(bn) for bn in range(start, end + 1)])
+        assert all(items), "get_block_data failed"
+        results["get_block_data"] = {"blocks_per_s": blocks / t, "runs_s": runs, "blocks": blocks}
+
+        # process_batch
+        def ingest():
+            for s in range(start, end + 1, args.batch):
+                assert insertion_main.process_batch(s, min(s + args.batch - 1, end)), "process_batch failed"
+        t, runs, _ = timed(args.repeat, prepare, ingest)
+        prepare()
+        peak = traced_peak_mb(lambda: insertion_main.process_batch(start, min(start + args.batch - 1, end)))
+        results["process_batch"] = {"blocks_per_s": blocks / t, "peak_mb": peak, "runs_s": runs,
+                                    "blocks": blocks}
+
+        # bulk_insert, all raw rows through the execute_values path
+        raw = {"raw_blocks": [d["block"] for d in items],
+               "raw_transactions": [r for d in items for r in d["tx"]],
+               "raw_receipts": [r for d in items for r in d["receipt"]],
+               "raw_logs": [r for d in items for r in d["logs"]]}
+        rows = sum(len(v) for v in raw.values())
+
+        def insert_all():
+            for table in RAW_TABLES:
+                cols = ", ".join(RAW_TABLE_COLUMNS[table])
+                db.bulk_insert(f"INSERT INTO {table} ({cols}) VALUES %s ON CONFLICT DO NOTHING;", raw[table])
+        t, runs, _ = timed(args.repeat, prepare, insert_all)
+        results["bulk_insert"] = {"rows_per_s": rows / t, "runs_s": runs, "rows": rows}
+
+        # decode_logs, raw_json as stored in raw_logs (normalized JSON text)
+        log_rows = [{"tx_hash": r[0], "block_number": r[1], "log_index": r[2], "raw_json": json.dumps(normalize(r[3]))}
+                    for r in raw["raw_logs"]]
+        t, runs, count = timed(args.repeat, prepare, lambda: decode_logs(log_rows, w3))
+        assert count == len(log_rows), "decode_logs failed"
+        results["decode_logs"] = {"logs_per_s": len(log_rows) / t, "runs_s": runs, "logs": len(log_rows)}
+    finally:
+        server.stop()
+
+    commit, dirty = git_commit()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "db": args.db,
+        "params": {"blocks": blocks, "txs_per_block": args.txs_per_block, "batch": args.batch,
+                   "repeat": args.repeat},
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "results": results,
+    }
+    if memory_db is not None:
+        report["memory_db"] = dict(memory_db.stats)
+
+    print(f"{'stage':>15} {'metric':>13} {'value':>11}")
+    for stage, metric in METRICS.items():
+        print(f"{stage:>15} {metric:>13} {results[stage][metric]:>11.1f}")
+    print(f"{'process_batch':>15} {'peak_mb':>13} {results['process_batch']['peak_mb']:>11.1f}")
+    print(f"{'':>15} {'max_rss_mb':>13} {report['max_rss_mb']:>11.1f}")
+
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{commit}{'-dirty' if dirty else ''}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(f"results -> {out}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
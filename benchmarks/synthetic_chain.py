@@ -0,0 +1,286 @@
+# benchmarks/synthetic_chain.py
+import hashlib
+import random
+import time
+from functools import lru_cache
+from utils.bloom import bloom_mask
+
+"""
+Deterministic synthetic chain used by the fake JSON-RPC server.
+Every block / tx / receipt / log is derived from (seed, block_number) so
+two runs with the same settings see byte-identical data.
+All payloads are in raw JSON-RPC form (hex quantities, 0x strings),
+receipts and blocks carry real logsBloom values.
+"""
+
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+GENESIS_BLOCK = 23700000
+GENESIS_TS = 1761955200     # 2025-11-01 00:00:00 UTC
+BLOCK_TIME = 12
+
+
+def _h(*parts):
+    """Function to build a deterministic 32 byte hex hash"""
+    data = "|".join(str(p) for p in parts).encode()
+    return "0x" + hashlib.sha256(data).hexdigest()
+
+
+def _addr(*parts):
+    """Function to build a deterministic 20 byte address"""
+    return "0x" + hashlib.sha256("|".join(str(p) for p in parts).encode()).hexdigest()[:40]
+
+
+@lru_cache(maxsize=None)
+def _item_bloom(hex_item):
+    """Function to return the bloom bits of an address / topic (memoized, values repeat a lot)"""
+    return bloom_mask(bytes.fromhex(hex_item[2:]))
+
+
+def _logs_bloom(logs):
+    bloom = 0
+    for lg in logs:
+        bloom |= _item_bloom(lg["address"])
+        for topic in lg["topics"]:
+            bloom |= _item_bloom(topic)
+    return bloom
+
+
+def _bloom_hex(bloom):
+    return "0x" + format(bloom, "0512x")
+
+
+def _topic_for(address):
+    """Function to left pad an address into a 32 byte topic"""
+    return "0x" + "0" * 24 + address[2:]
+
+
+class SyntheticChain():
+    """Class to generate mainnet shaped blocks, receipts and logs"""
+
+    def __init__(self, seed=1, head=GENESIS_BLOCK + 1000, txs_per_block=180,
+                 transfer_ratio=0.45, tokens=400, wallets=5000, watch_wallets=None, watch_ratio=0.02):
+        self.seed = seed
+        self.head = head
+        self.txs_per_block = txs_per_block
+        self.transfer_ratio = transfer_ratio
+        self.tokens = [_addr(seed, "token", i) for i in range(tokens)]
+        self._token_index = {t: i for i, t in enumerate(self.tokens)}
+        self.wallets = [_addr(seed, "wallet", i) for i in range(wallets)]
+        # tracked wallets show up in a small share of transfers
+        self.watch_wallets = [w.lower() for w in (watch_wallets or [])]
+        self.watch_ratio = watch_ratio
+        self._blocks = {}
+        self._tx_index = {}
+        self._branches = {}     # block number -> branch id of re-mined blocks (reorgs)
+        self.mined_at = {}      # block number -> wall clock time of blocks added by mine()
+        self.reorgs = 0
+
+    # ------------------------------------------------------------------
+    def _salt(self, number):
+        """Extra hash input of re-mined blocks (nothing for the original branch)"""
+        branch = self._branches.get(number, 0)
+        return ("branch", branch) if branch else ()
+
+    def block_hash(self, number):
+        return _h(self.seed, "block", number, *self._salt(number))
+
+    def mine(self, count=1):
+        """Function to advance the head by count blocks (timestamped with the wall clock)"""
+        for _ in range(count):
+            self.head += 1
+            self.mined_at[self.head] = time.time()
+        return self.head
+
+    def reorg(self, depth):
+        """
+        Function to replace the last depth blocks (up to head) by a new branch:
+        new hashes, txs and logs for those numbers, parentHash links follow.
+        """
+        self.reorgs += 1
+        for number in range(self.head - depth + 1, self.head + 1):
+            cached = self._blocks.pop(number, None)
+            if cached:
+                for r in cached[1]:
+                    self._tx_index.pop(r["transactionHash"], None)
+            self._branches[number] = self.reorgs
+        return self.head - depth + 1
+
+    def timestamp(self, number):
+        if number in self.mined_at:
+            return int(self.mined_at[number])
+        return GENESIS_TS + (number - GENESIS_BLOCK) * BLOCK_TIME
+
+    def _pick_wallet(self, rnd):
+        if self.watch_wallets and rnd.random() < self.watch_ratio:
+            return rnd.choice(self.watch_wallets)
+        return rnd.choice(self.wallets)
+
+    def _build(self, number):
+        """Function to generate the block, its txs and receipts"""
+        salt = self._salt(number)
+        rnd = random.Random(self.seed * 1_000_003 + number + 7919 * self._branches.get(number, 0))
+        n_txs = max(0, int(rnd.gauss(self.txs_per_block, self.txs_per_block * 0.25)))
+        block_hash = self.block_hash(number)
+        base_fee = 10 ** 9 + rnd.randint(0, 20 * 10 ** 9)
+
+        txs, receipts = [], []
+        cumulative_gas = 0
+        log_index = 0
+        block_bloom = 0
+        for i in range(n_txs):
+            tx_hash = _h(self.seed, "tx", number, i, *salt)
+            sender = self._pick_wallet(rnd)
+            is_transfer = rnd.random() < self.transfer_ratio
+            token = rnd.choice(self.tokens)
+            to = token if is_transfer else self._pick_wallet(rnd)
+            value = 0 if is_transfer else rnd.randint(0, 5 * 10 ** 18)
+            gas_used = rnd.randint(21000, 300000)
+            cumulative_gas += gas_used
+            if is_transfer:
+                data_input = ("0xa9059cbb" + _topic_for(self._pick_wallet(rnd))[2:]
+                              + format(rnd.randint(1, 10 ** 24), "064x"))
+            else:
+                data_input = "0x"
+
+            tx = {
+                "blockHash": block_hash,
+                "blockNumber": hex(number),
+                "from": sender,
+                "gas": hex(gas_used + 10000),
+                "gasPrice": hex(base_fee + rnd.randint(0, 2 * 10 ** 9)),
+                "maxFeePerGas": hex(base_fee * 2),
+                "maxPriorityFeePerGas": hex(rnd.randint(0, 2 * 10 ** 9)),
+                "hash": tx_hash,
+                "input": data_input,
+                "nonce": hex(rnd.randint(0, 5000)),
+                "to": to,
+                "transactionIndex": hex(i),
+                "value": hex(value),
+                "type": "0x2",
+                "accessList": [],
+                "chainId": "0x1",
+                "v": "0x1",
+                "r": _h(self.seed, "r", number, i),
+                "s": _h(self.seed, "s", number, i),
+                "yParity": "0x1",
+            }
+
+            logs = []
+            n_logs = 0
+            if is_transfer:
+                n_logs = 1 + (rnd.random() < 0.3) * rnd.randint(1, 4)
+            elif rnd.random() < 0.1:
+                n_logs = rnd.randint(1, 3)
+            for _ in range(n_logs):
+                if is_transfer:
+                    topics = [
+                        TRANSFER_TOPIC,
+                        _topic_for(self._pick_wallet(rnd)),
+                        _topic_for(self._pick_wallet(rnd)),
+                    ]
+                    data = "0x" + format(rnd.randint(1, 10 ** 24), "064x")
+                    address = token
+                else:
+                    topics = [_h(self.seed, "event", rnd.randint(0, 50))]
+                    data = "0x" + format(rnd.getrandbits(256), "064x") * 2
+                    address = rnd.choice(self.tokens)
+                logs.append({
+                    "address": address,
+                    "topics": topics,
+                    "data": data,
+                    "blockNumber": hex(number),
+                    "transactionHash": tx_hash,
+                    "transactionIndex": hex(i),
+                    "blockHash": block_hash,
+                    "logIndex": hex(log_index),
+                    "removed": False,
+                })
+                log_index += 1
+
+            receipt_bloom = _logs_bloom(logs)
+            block_bloom |= receipt_bloom
+            receipts.append({
+                "blockHash": block_hash,
+                "blockNumber": hex(number),
+                "contractAddress": None,
+                "cumulativeGasUsed": hex(cumulative_gas),
+                "effectiveGasPrice": tx["gasPrice"],
+                "from": sender,
+                "gasUsed": hex(gas_used),
+                "logs": logs,
+                "logsBloom": _bloom_hex(receipt_bloom),
+                "status": "0x1",
+                "to": to,
+                "transactionHash": tx_hash,
+                "transactionIndex": hex(i),
+                "type": "0x2",
+            })
+            txs.append(tx)
+
+        block = {
+            "baseFeePerGas": hex(base_fee),
+            "difficulty": "0x0",
+            "extraData": "0x",
+            "gasLimit": hex(30_000_000),
+            "gasUsed": hex(cumulative_gas),
+            "hash": block_hash,
+            "logsBloom": _bloom_hex(block_bloom),
+            "miner": _addr(self.seed, "miner", number % 17),
+            "mixHash": _h(self.seed, "mix", number),
+            "nonce": "0x0000000000000000",
+            "number": hex(number),
+            "parentHash": self.block_hash(number - 1),
+            "receiptsRoot": _h(self.seed, "receipts", number),
+            "sha3Uncles": _h(self.seed, "uncles"),
+            "size": hex(1000 + 500 * n_txs),
+            "stateRoot": _h(self.seed, "state", number),
+            "timestamp": hex(self.timestamp(number)),
+            "totalDifficulty": "0x0",
+            "transactions": txs,
+            "transactionsRoot": _h(self.seed, "txroot", number),
+            "uncles": [],
+            "withdrawals": [],
+            "withdrawalsRoot": _h(self.seed, "wroot", number),
+        }
+        return block, receipts
+
+    def _get(self, number):
+        if number not in self._blocks:
+            block, receipts = self._build(number)
+            self._blocks[number] = (block, receipts)
+            for r in receipts:
+                self._tx_index[r["transactionHash"]] = r
+        return self._blocks[number]
+
+    # ------------------------------------------------------------------
+    def get_block(self, number, full_transactions=True):
+        """Function to return block in JSON-RPC form (None past head)"""
+        if number > self.head or number < 0:
+            return None
+        block, _ = self._get(number)
+        if full_transactions:
+            return block
+        out = dict(block)
+        out["transactions"] = [tx["hash"] for tx in block["transactions"]]
+        return out
+
+    def get_block_receipts(self, number):
+        if number > self.head or number < 0:
+            return None
+        return self._get(number)[1]
+
+    def get_receipt(self, tx_hash):
+        return self._tx_index.get(tx_hash.lower())
+
+    def token_metadata(self, address):
+        """
+        Function to return (name, symbol, decimals, kind) of a synthetic token,
+        kind is "string" (normal ERC-20), "bytes32" (MKR style) or "revert"
+        (not an ERC-20). None for unknown addresses.
+        """
+        address = address.lower()
+        if address not in self._token_index:
+            return None
+        i = self._token_index[address]
+        kind = "revert" if i % 25 == 7 else ("bytes32" if i % 10 == 3 else "string")
+        return f"Token {i}", f"TK{i}", (6, 8, 18)[i % 3], kind
@@ -0,0 +1,24 @@
+-- completed block ranges per pipeline stage ("ingest", "decode")
+CREATE TABLE IF NOT EXISTS pipeline_checkpoints (
+    stage         TEXT,
+    start_block   BIGINT,
+    end_block     BIGINT,
+    start_hash    TEXT,     -- raw_blocks hash of start_block when the range completed
+    end_hash      TEXT,     -- raw_blocks hash of end_block when the range completed
+    completed_at  TIMESTAMPTZ DEFAULT now(),
+    PRIMARY KEY (stage, start_block, end_block)
+);
+
+-- failed batches waiting for another attempt
+CREATE TABLE IF NOT EXISTS pipeline_retries (
+    stage            TEXT,
+    start_block      BIGINT,
+    end_block        BIGINT,
+    attempts         INT DEFAULT 0,
+    next_attempt_at  TIMESTAMPTZ,     -- NULL once attempts hit the limit
+    last_error       TEXT,
+    updated_at       TIMESTAMPTZ DEFAULT now(),
+    PRIMARY KEY (stage, start_block, end_block)
+);
+
+CREATE INDEX IF NOT EXISTS idx_checkpoints_end ON pipeline_checkpoints (stage, end_block);
@@ -0,0 +1,383 @@
+# db/checkpoints.py
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from db.connection import connection
+import db.raw_compact as raw_compact
+from utils.logger import logger
+
+"""
+Durable progress of the ingestion / decoding stages.
+
+- every batch that completes is recorded in pipeline_checkpoints together
+  with the raw_blocks hash of its first and last block (or the hashes of
+  another hash_source, e.g. the segment archive the decoder replays)
+- missing_ranges() merges the checkpoints of a stage and returns the gaps
+  of a block range; a checkpoint whose hashes no longer match the source
+  (rolled back / re-ingested after a reorg) does not count as done
+- failed batches go to pipeline_retries with an exponential backoff
+  (RETRY_BASE_DELAY * 2^attempts, jittered) until RETRY_MAX_ATTEMPTS
+- run_stage() ties it together: resume from the gaps, run the batches,
+  retry the failed ones when they are due
+"""
+
+CHECKPOINT_SCHEMA = Path(__file__).resolve().parent / "checkpoint_schema.sql"
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 5))          # seconds before the first retry
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 300))          # backoff cap
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", 5))        # then the batch is left for the next run
+
+# table which must hold one row per block before a stage's batch counts as done
+# ("raw" -> raw block table of the active RAW_LAYOUT)
+STAGE_TABLES = {
+    "ingest": "raw",
+    "decode": "decoded_blocks",
+}
+
+
+def _norm_hash(value):
+    """raw_blocks keeps hashes with (raw mode) or without (web3 mode) 0x"""
+    if not value:
+        return None
+    value = value.lower()
+    return value[2:] if value.startswith("0x") else value
+
+
+def merge_ranges(ranges):
+    """Function to merge overlapping / adjacent (start, end) ranges"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_ranges(start_block, end_block, done):
+    """Function to return the parts of [start_block, end_block] not covered by done"""
+    gaps = []
+    cursor = start_block
+    for start, end in merge_ranges(done):
+        if end < cursor:
+            continue
+        if start > end_block:
+            break
+        if start > cursor:
+            gaps.append((cursor, start - 1))
+        cursor = max(cursor, end + 1)
+    if cursor <= end_block:
+        gaps.append((cursor, end_block))
+    return gaps
+
+
+def intersect_ranges(a, b):
+    """Function to return the block ranges present in both a and b"""
+    out = []
+    for s1, e1 in merge_ranges(a):
+        for s2, e2 in merge_ranges(b):
+            start, end = max(s1, s2), min(e1, e2)
+            if start <= end:
+                out.append((start, end))
+    return merge_ranges(out)
+
+
+def split_ranges(ranges, batch_size):
+    """Function to cut ranges into batches of at most batch_size blocks"""
+    batches = []
+    for start, end in ranges:
+        while start <= end:
+            batches.append((start, min(start + batch_size - 1, end)))
+            start += batch_size
+    return batches
+
+
+class CheckpointStore():
+    """
+    Class to read / write pipeline_checkpoints and pipeline_retries.
+    hash_source: object with block_hashes(block_numbers) (SegmentArchive)
+    giving the checkpoint boundary hashes, the raw block table otherwise
+    """
+
+    def __init__(self, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY,
+                 max_attempts=RETRY_MAX_ATTEMPTS, hash_source=None):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.hash_source = hash_source
+        self._schema_ready = False
+
+    def ensure_schema(self):
+        """Function to create the checkpoint tables if they are missing"""
+        if self._schema_ready:
+            return
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute(CHECKPOINT_SCHEMA.read_text())
+            conn.commit()
+        self._schema_ready = True
+
+    # ------------------------------------------------------------------
+    # checkpoints
+    # ------------------------------------------------------------------
+    def _block_hashes(self, cur, block_numbers):
+        """Function to return {block_number: normalized hash} of the blocks the source holds"""
+        if self.hash_source is not None:
+            hashes = self.hash_source.block_hashes(block_numbers)
+        else:
+            raw_table, hash_sql = raw_compact.block_table()
+            cur.execute(f"SELECT block_number, {hash_sql} FROM {raw_table} WHERE block_number = ANY(%s)",
+                        (list(set(block_numbers)),))
+            hashes = dict(cur.fetchall())
+        return {bn: _norm_hash(h) for bn, h in hashes.items()}
+
+    def mark_done(self, stage, start_block, end_block):
+        """
+        Function to record a completed batch. The stage table must hold every
+        block of the range, otherwise nothing is recorded and False is returned
+        (a guard against partial batches: the writers raise on DB errors).
+        """
+        self.ensure_schema()
+        table = STAGE_TABLES[stage]
+        table = raw_compact.block_table()[0] if table == "raw" else table
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT count(*) FROM {table} WHERE block_number BETWEEN %s AND %s",
+                        (start_block, end_block))
+            count = cur.fetchone()[0]
+            if count != end_block - start_block + 1:
+                logger.warning("[CHECKPOINT] %s %s → %s has %s of %s blocks in %s, not marked done",
+                               stage, start_block, end_block, count, end_block - start_block + 1, table)
+                return False
+
+            hashes = self._block_hashes(cur, (start_block, end_block))
+
+            cur.execute("""
+                INSERT INTO pipeline_checkpoints (stage, start_block, end_block, start_hash, end_hash)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (stage, start_block, end_block) DO UPDATE
+                SET start_hash = EXCLUDED.start_hash, end_hash = EXCLUDED.end_hash, completed_at = now()
+            """, (stage, start_block, end_block, hashes.get(start_block), hashes.get(end_block)))
+            # the range is done, drop the retries it covers
+            cur.execute("""
+                DELETE FROM pipeline_retries
+                WHERE stage = %s AND start_block >= %s AND end_block <= %s
+            """, (stage, start_block, end_block))
+            conn.commit()
+        return True
+
+    def completed_ranges(self, stage, start_block, end_block):
+        """
+        Function to return the merged done ranges of a stage overlapping
+        [start_block, end_block]. Checkpoints whose boundary hashes differ
+        from the hash source now (or whose blocks it no longer holds) are
+        stale and left out.
+        """
+        self.ensure_schema()
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT start_block, end_block, start_hash, end_hash FROM pipeline_checkpoints
+                WHERE stage = %s AND end_block >= %s AND start_block <= %s
+            """, (stage, start_block, end_block))
+            rows = cur.fetchall()
+            current = self._block_hashes(cur, [bn for start, end, _, _ in rows for bn in (start, end)])
+
+        done, stale = [], 0
+        for start, end, start_hash, end_hash in rows:
+            raw_start, raw_end = current.get(start), current.get(end)
+            # a block missing from the source has no hash: never a match
+            if None in (raw_start, raw_end) or start_hash != raw_start or end_hash != raw_end:
+                stale += 1
+                continue
+            done.append((start, end))
+        if stale:
+            logger.warning("[CHECKPOINT] %s: %s stale checkpoints (hash changed) ignored", stage, stale)
+        return merge_ranges(done)
+
+    def missing_ranges(self, stage, start_block, end_block):
+        """Function to return the gaps of [start_block, end_block] without a valid checkpoint"""
+        return subtract_ranges(start_block, end_block, self.completed_ranges(stage, start_block, end_block))
+
+    # ------------------------------------------------------------------
+    # retry queue
+    # ------------------------------------------------------------------
+    def backoff(self, attempts):
+        """Seconds to wait before attempt number attempts + 1"""
+        delay = min(self.max_delay, self.base_delay * 2 ** max(0, attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def enqueue_retry(self, stage, start_block, end_block, error=None):
+        """
+        Function to queue a failed batch. Returns the attempt count, after
+        max_attempts the batch is parked (next_attempt_at NULL) for the next run.
+        """
+        self.ensure_schema()
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT attempts FROM pipeline_retries
+                WHERE stage = %s AND start_block = %s AND end_block = %s
+            """, (stage, start_block, end_block))
+            row = cur.fetchone()
+            attempts = (row[0] if row else 0) + 1
+            delay = self.backoff(attempts) if attempts < self.max_attempts else None
+
+            cur.execute("""
+                INSERT INTO pipeline_retries
+                    (stage, start_block, end_block, attempts, next_attempt_at, last_error, updated_at)
+                VALUES (%s, %s, %s, %s, now() + make_interval(secs => %s), %s, now())
+                ON CONFLICT (stage, start_block, end_block) DO UPDATE
+                SET attempts = EXCLUDED.attempts, next_attempt_at = EXCLUDED.next_attempt_at,
+                    last_error = EXCLUDED.last_error, updated_at = now()
+            """, (stage, start_block, end_block, attempts, delay, str(error)[:1000] if error else None))
+            conn.commit()
+
+        if delay is None:
+            logger.error("[CHECKPOINT] %s %s → %s failed %s times, parked until the next run",
+                         stage, start_block, end_block, attempts)
+        else:
+            logger.warning("[CHECKPOINT] %s %s → %s failed (attempt %s), retry in %.1fs",
+                           stage, start_block, end_block, attempts, delay)
+        return attempts
+
+    def due_retries(self, stage, start_block, end_block):
+        """Function to return queued batches of the range whose backoff has expired"""
+        self.ensure_schema()
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT start_block, end_block FROM pipeline_retries
+                WHERE stage = %s AND start_block >= %s AND end_block <= %s
+                  AND next_attempt_at <= now()
+                ORDER BY start_block
+            """, (stage, start_block, end_block))
+            return cur.fetchall()
+
+    def next_retry_in(self, stage, start_block, end_block):
+        """Seconds until the next queued batch of the range is due (None when nothing waits)"""
+        self.ensure_schema()
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT EXTRACT(EPOCH FROM min(next_attempt_at) - now()) FROM pipeline_retries
+                WHERE stage = %s AND start_block >= %s AND end_block <= %s
+                  AND next_attempt_at IS NOT NULL
+            """, (stage, start_block, end_block))
+            seconds = cur.fetchone()[0]
+            return None if seconds is None else max(0.0, float(seconds))
+
+    def reset_retries(self, stage, start_block, end_block, done=()):
+        """
+        Function to prepare the queue of the range for a new run: batches
+        covered by the done ranges are dropped, parked ones get a fresh set
+        of attempts. Returns the still queued (start, end) batches.
+        """
+        self.ensure_schema()
+        done = merge_ranges(done)
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT start_block, end_block FROM pipeline_retries
+                WHERE stage = %s AND start_block >= %s AND end_block <= %s
+            """, (stage, start_block, end_block))
+            queued, covered = [], []
+            for start, end in cur.fetchall():
+                if any(s <= start and end <= e for s, e in done):
+                    covered.append((start, end))
+                else:
+                    queued.append((start, end))
+            for start, end in covered:
+                cur.execute("""
+                    DELETE FROM pipeline_retries WHERE stage = %s AND start_block = %s AND end_block = %s
+                """, (stage, start, end))
+            cur.execute("""
+                UPDATE pipeline_retries SET attempts = 0, next_attempt_at = now()
+                WHERE stage = %s AND start_block >= %s AND end_block <= %s
+                  AND next_attempt_at IS NULL
+            """, (stage, start_block, end_block))
+            conn.commit()
+        return queued
+
+
+def run_stage(stage, start_block, end_block, process, batch_size, store=None, workers=1,
+              resume=True, within=None):
+    """Function to run process(start, end) over the missing batches of a block range
+
+    Args:
+        stage (str): checkpoint stage, a key of STAGE_TABLES
+        process (callable): process(start, end) -> bool, exceptions count as failure
+        batch_size (int): blocks per batch (and per checkpoint)
+        workers (int): batches run at the same time
+        resume (bool): skip ranges with a valid checkpoint (else run the whole range)
+        within (str): only run blocks already done by this stage (e.g. decode within "ingest")
+
+    Returns:
+        dict: {"batches", "done", "failed", "retried", "skipped_blocks", "seconds"}
+    """
+    store = store or CheckpointStore()
+    t0 = time.time()
+    if resume:
+        done = store.completed_ranges(stage, start_block, end_block)
+        ranges = subtract_ranges(start_block, end_block, done)
+        # a new run gives batches parked by an earlier run another chance
+        store.reset_retries(stage, start_block, end_block, done)
+    else:
+        ranges = [(start_block, end_block)]
+    if within:
+        available = intersect_ranges(ranges, store.completed_ranges(within, start_block, end_block))
+        pending = sum(e - s + 1 for s, e in ranges) - sum(e - s + 1 for s, e in available)
+        if pending:
+            logger.warning("[CHECKPOINT] %s: %s blocks not done by %s yet, left for later", stage, pending, within)
+        ranges = available
+
+    total = end_block - start_block + 1
+    todo = sum(e - s + 1 for s, e in ranges)
+    stats = {"batches": 0, "done": 0, "failed": 0, "retried": 0, "skipped_blocks": total - todo}
+    logger.info("[CHECKPOINT] %s %s → %s: %s blocks to run in %s ranges (%s already done)",
+                stage, start_block, end_block, todo, len(ranges), stats["skipped_blocks"])
+    failed = set()
+
+    def attempt(start, end):
+        try:
+            ok = process(start, end)
+            error = None if ok else "batch reported failure"
+        except Exception as e:
+            ok, error = False, e
+        if ok and store.mark_done(stage, start, end):
+            return True
+        store.enqueue_retry(stage, start, end, error or "incomplete batch")
+        return False
+
+    def run_batches(batches):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(attempt, s, e): (s, e) for s, e in batches}
+            for f in as_completed(futures):
+                if f.result():
+                    stats["done"] += 1
+                    failed.discard(futures[f])
+                else:
+                    failed.add(futures[f])
+
+    batches = split_ranges(ranges, batch_size)
+    stats["batches"] = len(batches)
+    run_batches(batches)
+
+    # failed batches come back when their backoff expires
+    while True:
+        due = store.due_retries(stage, start_block, end_block)
+        if due:
+            stats["retried"] += len(due)
+            run_batches(due)
+            continue
+        wait = store.next_retry_in(stage, start_block, end_block)
+        if wait is None:
+            break
+        time.sleep(wait)
+
+    stats["failed"] = len(failed)
+    stats["seconds"] = time.time() - t0
+    logger.info("[CHECKPOINT] %s %s → %s finished: %s", stage, start_block, end_block, stats)
+    return stats
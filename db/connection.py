@@ -1,17 +1,233 @@
 # db/connection.py
 
-import psycopg2
 import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import extensions
 from dotenv import load_dotenv
+from utils.logger import logger
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 8))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))        # seconds to wait for a free conn
+DB_CONN_MAX_USES = int(os.getenv("DB_CONN_MAX_USES", 1000))      # recycle after N checkouts
+DB_CONN_MAX_AGE = float(os.getenv("DB_CONN_MAX_AGE", 1800))      # recycle after N seconds
+DB_CONN_CHECK_IDLE = float(os.getenv("DB_CONN_CHECK_IDLE", 30))  # ping conns idle longer than this
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became free within the timeout"""
+
+
+class ConnectionPool():
+    """Thread-safe psycopg2 connection pool with liveness checks and recycling"""
+
+    def __init__(self, dsn=DATABASE_URL, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX,
+                 max_uses=DB_CONN_MAX_USES, max_age=DB_CONN_MAX_AGE, check_idle=DB_CONN_CHECK_IDLE,
+                 timeout=DB_POOL_TIMEOUT, connect=psycopg2.connect):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.check_idle = check_idle
+        self.timeout = timeout
+        self._connect = connect
+        self._idle = deque()        # connections ready for checkout
+        self._meta = {}             # id(conn) -> {"created", "uses", "last_used"}
+        self._size = 0              # open connections (idle + checked out)
+        self._cond = threading.Condition()
+        self.stats = {
+            "checkouts": 0,     # successful get_conn calls
+            "waits": 0,         # checkouts which had to wait for a free conn
+            "wait_seconds": 0.0,
+            "created": 0,       # new physical connections
+            "reconnects": 0,    # dead connections replaced
+            "recycled": 0,      # closed because of max_uses / max_age
+        }
+        for _ in range(minconn):
+            self._size += 1
+            self._idle.append(self._new_conn())
+
+    # ------------------------------------------------------------------
+    def _new_conn(self):
+        """Function to connect for a slot already reserved (_size += 1), gives the slot back on failure"""
+        try:
+            conn = self._connect(self.dsn)
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        now = time.time()
+        with self._cond:
+            self._meta[id(conn)] = {"created": now, "uses": 0, "last_used": now}
+            self.stats["created"] += 1
+        return conn
+
+    def _close(self, conn):
+        self._meta.pop(id(conn), None)
+        self._size -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_alive(self, conn):
+        """Function to check that a connection still answers"""
+        if conn.closed:
+            return False
+        meta = self._meta[id(conn)]
+        if time.time() - meta["last_used"] < self.check_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _expired(self, conn):
+        meta = self._meta[id(conn)]
+        return meta["uses"] >= self.max_uses or time.time() - meta["created"] >= self.max_age
+
+    # ------------------------------------------------------------------
+    def get_conn(self, timeout=None):
+        """Function to check out a live connection
+
+        Only the bookkeeping runs under the lock (pop an idle conn or
+        reserve a slot); connecting and the liveness ping happen outside
+        it, so a slow server never blocks the other threads' checkouts.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.time() + timeout
+        waited = False
+        t0 = time.time()
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1     # reserved, connected below
+                    conn = None
+                    break
+                waited = True
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise PoolTimeout(f"no free DB connection after {timeout}s (max {self.maxconn})")
+                self._cond.wait(remaining)
+
+        if conn is not None and not self._is_alive(conn):
+            with self._cond:
+                self._meta.pop(id(conn), None)      # its slot is kept for the replacement
+                self.stats["reconnects"] += 1
+            try:
+                conn.close()
+            except Exception:
+                pass
+            conn = None
+        if conn is None:
+            conn = self._new_conn()
+
+        with self._cond:
+            meta = self._meta[id(conn)]
+            meta["uses"] += 1
+            self.stats["checkouts"] += 1
+            if waited:
+                self.stats["waits"] += 1
+                self.stats["wait_seconds"] += time.time() - t0
+        return conn
+
+    def release_conn(self, conn, discard=False):
+        """Function to give a connection back to the pool"""
+        if not discard and not conn.closed:
+            try:
+                # never hand out a conn with an open / failed transaction (outside the lock, a round trip)
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            if id(conn) not in self._meta:
+                return
+            if discard or conn.closed:
+                self._close(conn)
+            elif self._expired(conn):
+                self._close(conn)
+                self.stats["recycled"] += 1
+            else:
+                self._meta[id(conn)]["last_used"] = time.time()
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager: `with pool.connection() as conn:`"""
+        conn = self.get_conn(timeout)
+        try:
+            yield conn
+        except BaseException:
+            # also GeneratorExit when a streaming reader is closed early
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            # a broken conn is closed / fails rollback, release drops it
+            self.release_conn(conn)
+
+    def close_all(self):
+        """Function to close every idle connection"""
+        with self._cond:
+            while self._idle:
+                self._close(self._idle.pop())
+
+    def get_stats(self):
+        with self._cond:
+            return dict(self.stats, size=self._size, idle=len(self._idle))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide connection pool (created on first use)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+                logger.info("DB pool created (min=%s, max=%s)", DB_POOL_MIN, DB_POOL_MAX)
+    return _pool
+
 
 def get_conn():
-    """Return raw psycopg2 connection for fast bulk inserts."""
-    return psycopg2.connect(DATABASE_URL)
+    """Return a pooled psycopg2 connection for fast bulk inserts."""
+    return get_pool().get_conn()
+
 
 def release_conn(conn):
-    """Close psycopg2 connection."""
-    conn.close()
+    """Give psycopg2 connection back to the pool."""
+    get_pool().release_conn(conn)
+
+
+def connection():
+    """Context manager around get_conn/release_conn."""
+    return get_pool().connection()
+
+
+def pool_stats():
+    """Counters for sizing the pool: waits, checkouts, reconnects, ..."""
+    return get_pool().get_stats()
@@ -0,0 +1,85 @@
+# db/copy_loader.py
+import io
+from utils.helpers import safe_json
+
+"""
+Streaming COPY loader.
+
+Rows are turned into COPY text lines only when psycopg2 asks for the
+next chunk, so the batch never has to exist as one list in memory. Rows
+land in a temp staging table first, then INSERT ... SELECT ...
+ON CONFLICT DO NOTHING moves them to the target, so re-loading the same
+blocks stays idempotent (COPY itself has no ON CONFLICT).
+"""
+
+COPY_CHUNK_SIZE = 1 << 16     # bytes handed to psycopg2 per read()
+
+_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_value(value):
+    """Function to format one column in COPY text format"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        # bytea hex input, backslash escaped for COPY text
+        return "\\\\x" + bytes(value).hex()
+    return str(value).translate(_ESCAPES)
+
+
+class CopyRowStream(io.TextIOBase):
+    """File-like object producing COPY text lines from a row iterator"""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = ""
+        self.rows = 0
+
+    def readable(self):
+        return True
+
+    def _next_line(self):
+        row = next(self._rows, None)
+        if row is None:
+            return None
+        self.rows += 1
+        # dict columns -> JSON text, same conversion as bulk_insert
+        return "\t".join(_copy_value(col) for col in safe_json(row)) + "\n"
+
+    def read(self, size=-1):
+        size = COPY_CHUNK_SIZE if size is None or size < 0 else size
+        parts, length = [self._buffer], len(self._buffer)
+        while length < size:
+            line = self._next_line()
+            if line is None:
+                break
+            parts.append(line)
+            length += len(line)
+        data = "".join(parts)
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def copy_rows(cur, table, columns, rows):
+    """Function to stream rows into `table` through a temp staging table
+
+    Args:
+        cur: psycopg2 cursor (caller commits)
+        table (str): target table, e.g. "raw_logs"
+        columns (tuple): column names in row order
+        rows (iterable): rows (lists / tuples), may be a generator
+
+    Returns:
+        int: number of rows streamed
+    """
+    stage = f"_stage_{table}"
+    cols = ", ".join(columns)
+    cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {stage} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS")
+    cur.execute(f"TRUNCATE {stage}")
+
+    stream = CopyRowStream(rows)
+    cur.copy_expert(f"COPY {stage} ({cols}) FROM STDIN", stream, size=COPY_CHUNK_SIZE)
+    cur.execute(f"INSERT INTO {table} ({cols}) SELECT {cols} FROM {stage} ON CONFLICT DO NOTHING")
+    return stream.rows
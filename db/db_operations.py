@@ -1,10 +1,26 @@
 import json
+import os
 from psycopg2.extras import execute_values
 from utils.helpers import safe_json
-from db.connection import get_conn, release_conn
+from db.connection import connection
+from db.copy_loader import copy_rows
+import db.raw_compact as raw_compact
 from utils.logger import logger
 from decoder.util import normalize_value
 
+# "values" -> execute_values INSERT, "copy" -> streaming COPY via staging table
+RAW_INSERT_METHOD = os.getenv("RAW_INSERT_METHOD", "values")
+
+# rows per round trip for the streaming iter_raw_* readers
+FETCH_ITERSIZE = int(os.getenv("FETCH_ITERSIZE", 2000))
+
+RAW_TABLE_COLUMNS = {
+    "raw_blocks": ("block_number", "block_timestamp", "raw_json"),
+    "raw_transactions": ("tx_hash", "block_number", "raw_json"),
+    "raw_receipts": ("tx_hash", "block_number", "raw_json"),
+    "raw_logs": ("tx_hash", "block_number", "log_index", "raw_json"),
+}
+
 
 class Database_Operations():
     """Class to handle all the DB related operations"""
@@ -16,59 +32,94 @@ class Database_Operations():
         logger.info("DB instance exited")
 
     def bulk_insert(self, query, rows):
-        """Function for bulk insertion"""
+        """Function for bulk insertion, a failed insert is logged and raised
+        (the batch must fail instead of being checkpointed without its rows)"""
         try:
             if not rows:
                 return
 
-            conn = get_conn()
-            cur = conn.cursor()
-            # Convert all rows to JSON-safe form
-            safe_rows = [safe_json(r) for r in rows]
+            with connection() as conn:
+                cur = conn.cursor()
+                # Convert all rows to JSON-safe form
+                safe_rows = [safe_json(r) for r in rows]
 
-            execute_values(cur, query, safe_rows)
-            conn.commit()
-            release_conn(conn)
+                execute_values(cur, query, safe_rows)
+                conn.commit()
         except Exception as e:
             logger.error("Error happened while bulk insertion-> %s", e)
+            raise
 
-    def insert_blocks_data(self, rows):
-        """Function to insert block data into DB"""
-        self.bulk_insert("""
-            INSERT INTO raw_blocks (block_number, block_timestamp, raw_json)
+    def copy_insert(self, table, rows, columns=None):
+        """Function to stream rows (any iterable) into a raw_* table with COPY, errors are logged and raised"""
+        try:
+            with connection() as conn:
+                cur = conn.cursor()
+                count = copy_rows(cur, table, columns or RAW_TABLE_COLUMNS[table], rows)
+                conn.commit()
+                return count
+        except Exception as e:
+            logger.error("Error happened while COPY into %s -> %s", table, e)
+            raise
+
+    def _insert_raw(self, table, rows, method):
+        method = method or RAW_INSERT_METHOD
+        columns = RAW_TABLE_COLUMNS[table]
+        if raw_compact.is_compact():
+            # same rows, converted to the bytea / compressed layout
+            convert = raw_compact.COMPACT_ROW[table]
+            table, columns = raw_compact.COMPACT_TABLES[table]
+            rows = (convert(r) for r in rows) if method == "copy" else [convert(r) for r in rows]
+        if method == "copy":
+            return self.copy_insert(table, rows, columns)
+        cols = ", ".join(columns)
+        self.bulk_insert(f"""
+            INSERT INTO {table} ({cols})
             VALUES %s ON CONFLICT DO NOTHING;
         """, rows)
 
-    def insert_txs_data(self, rows):
-        """Function to insert transaction data in DB"""
+    def insert_blocks_data(self, rows, method=None):
+        """Function to insert block data into DB"""
+        self._insert_raw("raw_blocks", rows, method)
 
-        self.bulk_insert("""
-            INSERT INTO raw_transactions (tx_hash, block_number, raw_json)
-            VALUES %s ON CONFLICT DO NOTHING;
-        """, rows)
+    def insert_txs_data(self, rows, method=None):
+        """Function to insert transaction data in DB"""
+        self._insert_raw("raw_transactions", rows, method)
 
-    def insert_receipts_data(self, rows):
+    def insert_receipts_data(self, rows, method=None):
         """Function to insert receipts data in DB"""
+        self._insert_raw("raw_receipts", rows, method)
 
-        self.bulk_insert("""
-            INSERT INTO raw_receipts (tx_hash, block_number, raw_json)
-            VALUES %s ON CONFLICT DO NOTHING;
-        """, rows)
-
-    def insert_logs_data(self, rows):
+    def insert_logs_data(self, rows, method=None):
         """Function to insert logs data in DB"""
-        
-        self.bulk_insert("""
-            INSERT INTO raw_logs (tx_hash, block_number, log_index, raw_json)
-            VALUES %s ON CONFLICT DO NOTHING;
-        """, rows)
+        self._insert_raw("raw_logs", rows, method)
+
+    def delete_from_block(self, block_number):
+        """
+        Function to delete every raw / decoded row of block_number and later
+        (reorg rollback). Returns number of rows deleted.
+        """
+        tables = list(RAW_TABLE_COLUMNS) if not raw_compact.is_compact() else [
+            t for t, _ in raw_compact.COMPACT_TABLES.values()]
+        tables += [
+            "decoded_blocks", "decoded_transactions", "decoded_events", "decoded_erc20_transfers",
+        ]
+        deleted = 0
+        with connection() as conn:
+            cur = conn.cursor()
+            for table in tables:
+                cur.execute(f"DELETE FROM {table} WHERE block_number >= %s", (block_number,))
+                deleted += cur.rowcount
+            conn.commit()
+        logger.info("Rolled back %s rows from block %s", deleted, block_number)
+        return deleted
 
 
     def fetch_raw_block_rows(self, start_block, end_block):
         """Function to fetch raw block data from DB"""
-        conn = get_conn()
-        cur = conn.cursor()
-        try:
+        if raw_compact.is_compact():
+            return list(self.iter_raw_block_rows(start_block, end_block))
+        with connection() as conn:
+            cur = conn.cursor()
             query = """
                 SELECT block_number, raw_json 
                 FROM raw_blocks 
@@ -78,8 +129,6 @@ class Database_Operations():
             cur.execute(query, (start_block, end_block))
             rows = [{"block_number": r[0], "raw_json": r[1]} for r in cur.fetchall()]
             return rows
-        finally:
-            release_conn(conn)
 
     
     
@@ -91,10 +140,11 @@ class Database_Operations():
         'receipt': {...}
         }
         """
+        if raw_compact.is_compact():
+            return list(self.iter_raw_tx_receipt_pairs(start_block, end_block))
         results = []
-        conn = get_conn()
-        cur = conn.cursor()
-        try:
+        with connection() as conn:
+            cur = conn.cursor()
             query = """
                 SELECT tranx.tx_hash, tranx.block_number, tranx.raw_json, receipt.raw_json
                 FROM raw_transactions tranx
@@ -118,15 +168,14 @@ class Database_Operations():
                     }
                 })
             return results
-        finally:
-            release_conn(conn)
 
 
     def fetch_raw_logs(self, start_block, end_block):
         """Fcuntion to redturn the logs data from DB"""
-        conn = get_conn()
-        cur = conn.cursor()
-        try:
+        if raw_compact.is_compact():
+            return list(self.iter_raw_logs(start_block, end_block))
+        with connection() as conn:
+            cur = conn.cursor()
             query = """
                 SELECT tx_hash, block_number, log_index, raw_json
                 FROM raw_logs
@@ -141,17 +190,146 @@ class Database_Operations():
                 "raw_json": r[3
             ]} for r in cur.fetchall()]
             return rows
-        finally:
-            release_conn(conn)
 
-    
+
+    def _stream(self, name, query, params, itersize):
+        """Yield rows of query through a named (server-side) cursor, itersize rows per round trip"""
+        with connection() as conn:
+            cur = conn.cursor(name=name)
+            cur.itersize = itersize
+            try:
+                cur.execute(query, params)
+                for row in cur:
+                    yield row
+            finally:
+                cur.close()
+
+    def _stream_compact(self, name, query, params, itersize, mapper):
+        """_stream over the compact layout, rows turned back into JSON layout shapes"""
+        for r in self._stream(name, query, params, itersize):
+            yield mapper(r)
+
+    def iter_raw_block_rows(self, start_block, end_block, itersize=FETCH_ITERSIZE):
+        """Streaming version of fetch_raw_block_rows"""
+        if raw_compact.is_compact():
+            yield from self._stream_compact("raw_blocks_stream", raw_compact.RAW_BLOCKS_SQL,
+                                            (start_block, end_block), itersize, raw_compact.expand_block)
+            return
+        query = """
+            SELECT block_number, raw_json
+            FROM raw_blocks
+            WHERE block_number BETWEEN %s AND %s
+            ORDER BY block_number
+        """
+        for r in self._stream("raw_blocks_stream", query, (start_block, end_block), itersize):
+            yield {"block_number": r[0], "raw_json": r[1]}
+
+    def iter_raw_tx_receipt_pairs(self, start_block, end_block, itersize=FETCH_ITERSIZE):
+        """Streaming version of fetch_raw_tx_receipt_pairs"""
+        if raw_compact.is_compact():
+            yield from self._stream_compact("raw_tx_receipt_stream", raw_compact.RAW_TX_RECEIPT_SQL,
+                                            (start_block, end_block), itersize, raw_compact.expand_tx_receipt)
+            return
+        query = """
+            SELECT tranx.tx_hash, tranx.block_number, tranx.raw_json, receipt.raw_json
+            FROM raw_transactions tranx
+            JOIN raw_receipts receipt
+            ON tranx.tx_hash = receipt.tx_hash
+            WHERE tranx.block_number BETWEEN %s AND %s
+            ORDER BY tranx.block_number
+        """
+        for tx_hash, block_number, tx_raw, receipt_raw in self._stream(
+                "raw_tx_receipt_stream", query, (start_block, end_block), itersize):
+            yield {
+                "tx": {"tx_hash": tx_hash, "block_number": block_number, "raw_json": tx_raw},
+                "receipt": {"tx_hash": tx_hash, "block_number": block_number, "raw_json": receipt_raw},
+            }
+
+    def iter_raw_logs(self, start_block, end_block, itersize=FETCH_ITERSIZE):
+        """Streaming version of fetch_raw_logs"""
+        if raw_compact.is_compact():
+            yield from self._stream_compact("raw_logs_stream", raw_compact.RAW_LOGS_SQL,
+                                            (start_block, end_block), itersize, raw_compact.expand_log)
+            return
+        query = """
+            SELECT tx_hash, block_number, log_index, raw_json
+            FROM raw_logs
+            WHERE block_number BETWEEN %s AND %s
+            ORDER BY block_number, log_index
+        """
+        for r in self._stream("raw_logs_stream", query, (start_block, end_block), itersize):
+            yield {"tx_hash": r[0], "block_number": r[1], "log_index": r[2], "raw_json": r[3]}
+
+
+    # -----------------------------------------------------------------
+    # Projected streams: only the JSON fields decoder/transform.py uses,
+    # pulled out server-side so raw documents never leave Postgres
+    # -----------------------------------------------------------------
+    def iter_block_fields(self, start_block, end_block, itersize=FETCH_ITERSIZE):
+        """Yield (block_number, timestamp, miner, gas_used, gas_limit, base_fee) tuples"""
+        if raw_compact.is_compact():
+            yield from self._stream_compact("block_fields_stream", raw_compact.BLOCK_FIELDS_SQL,
+                                            (start_block, end_block), itersize, raw_compact.block_fields)
+            return
+        query = """
+            SELECT block_number,
+                   (raw_json->>'timestamp')::bigint,
+                   raw_json->>'miner',
+                   (raw_json->>'gasUsed')::bigint,
+                   (raw_json->>'gasLimit')::bigint,
+                   (raw_json->>'baseFeePerGas')::numeric
+            FROM raw_blocks
+            WHERE block_number BETWEEN %s AND %s
+            ORDER BY block_number
+        """
+        yield from self._stream("block_fields_stream", query, (start_block, end_block), itersize)
+
+    def iter_tx_fields(self, start_block, end_block, itersize=FETCH_ITERSIZE):
+        """Yield (tx_hash, block_number, from, to, value, gas_price, receipt_gas_used, input) tuples"""
+        if raw_compact.is_compact():
+            yield from self._stream_compact("tx_fields_stream", raw_compact.TX_FIELDS_SQL,
+                                            (start_block, end_block), itersize, raw_compact.tx_fields)
+            return
+        query = """
+            SELECT tranx.tx_hash, tranx.block_number,
+                   tranx.raw_json->>'from',
+                   tranx.raw_json->>'to',
+                   (tranx.raw_json->>'value')::numeric,
+                   (tranx.raw_json->>'gasPrice')::numeric,
+                   (receipt.raw_json->>'gasUsed')::bigint,
+                   tranx.raw_json->>'input'
+            FROM raw_transactions tranx
+            JOIN raw_receipts receipt
+            ON tranx.tx_hash = receipt.tx_hash
+            WHERE tranx.block_number BETWEEN %s AND %s
+            ORDER BY tranx.block_number
+        """
+        yield from self._stream("tx_fields_stream", query, (start_block, end_block), itersize)
+
+    def iter_log_fields(self, start_block, end_block, itersize=FETCH_ITERSIZE):
+        """Yield (tx_hash, block_number, log_index, address, topics, data) tuples"""
+        if raw_compact.is_compact():
+            yield from self._stream_compact("log_fields_stream", raw_compact.LOG_FIELDS_SQL,
+                                            (start_block, end_block), itersize, raw_compact.log_fields)
+            return
+        query = """
+            SELECT tx_hash, block_number, log_index,
+                   raw_json->>'address',
+                   raw_json->'topics',
+                   raw_json->>'data'
+            FROM raw_logs
+            WHERE block_number BETWEEN %s AND %s
+            ORDER BY block_number, log_index
+        """
+        yield from self._stream("log_fields_stream", query, (start_block, end_block), itersize)
+
+
     def decoder_bulk_insertion(self, query, rows):
         """Function to insert transformed data in DB"""
         if not rows:
             return
-        conn = get_conn()
-        cur = conn.cursor()
-        try:
+        with connection() as conn:
+            cur = conn.cursor()
             # normalize JSON fields if present inside rows 
             safe_rows = []
             for r in rows:
@@ -166,9 +344,4 @@ class Database_Operations():
 
             execute_values(cur, query, safe_rows)
             conn.commit()
-        finally:
-            try:
-                cur.close()
-            except:
-                pass
-            release_conn(conn)
\ No newline at end of file
+            cur.close()
\ No newline at end of file
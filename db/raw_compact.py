@@ -0,0 +1,285 @@
+# db/raw_compact.py
+import json
+import os
+import zlib
+from hexbytes import HexBytes
+from decoder.util import checksum_address, ERC20_TRANSFER_TOPIC
+from utils.helpers import normalize
+
+"""
+Compact raw layout (RAW_LAYOUT=compact, schema in raw_compact_schema.sql).
+
+The JSON layout keeps every transaction twice (inside raw_blocks.raw_json,
+fetched with full_transactions=True, and in raw_transactions), every log
+twice (receipt + raw_logs) and all hashes / addresses as hex text. Here:
+
+- raw_block_headers holds the header without its transactions
+- hashes, addresses, topics, input and data are bytea columns
+- blockHash / blockNumber / transactionHash copies inside txs, receipts
+  and logs are dropped, receipts are stored without their logs
+- whatever is left of each document is zlib-compressed JSON (payload)
+
+Database_Operations writes build_raw_rows rows (web3 objects or raw
+JSON-RPC payloads) through the compact_*_row converters and reads the
+layout back with the queries / row mappers below: the projected readers
+return the same tuples as the JSON layout of a web3-mode ingest (hex
+without 0x, checksummed addresses), the full readers rebuild raw_json
+dicts without the fields that live in another table.
+"""
+
+RAW_LAYOUT = os.getenv("RAW_LAYOUT", "json")        # "json" -> raw_* JSONB tables, "compact" -> this module
+PAYLOAD_COMPRESS_LEVEL = int(os.getenv("PAYLOAD_COMPRESS_LEVEL", 6))
+
+# JSON layout table -> (compact table, columns)
+COMPACT_TABLES = {
+    "raw_blocks": ("raw_block_headers", (
+        "block_number", "block_timestamp", "block_hash", "parent_hash", "miner",
+        "gas_used", "gas_limit", "base_fee", "logs_bloom", "payload")),
+    "raw_transactions": ("raw_transactions_compact", (
+        "tx_hash", "block_number", "tx_index", "from_address", "to_address",
+        "value", "gas_price", "input", "payload")),
+    "raw_receipts": ("raw_receipts_compact", (
+        "tx_hash", "block_number", "gas_used", "status", "payload")),
+    "raw_logs": ("raw_logs_compact", (
+        "tx_hash", "block_number", "log_index", "address", "topics", "data", "payload")),
+}
+
+_BLOCK_COLUMNS = {"number", "timestamp", "hash", "parentHash", "miner", "gasUsed", "gasLimit",
+                  "baseFeePerGas", "logsBloom", "transactions"}
+_TX_COLUMNS = {"hash", "blockHash", "blockNumber", "transactionIndex", "from", "to", "value", "gasPrice", "input"}
+_RECEIPT_COLUMNS = {"transactionHash", "blockHash", "blockNumber", "from", "to", "gasUsed", "status", "logs"}
+_LOG_COLUMNS = {"transactionHash", "blockHash", "blockNumber", "logIndex", "address", "topics", "data"}
+
+
+def is_compact():
+    return RAW_LAYOUT == "compact"
+
+
+# ---------------------------------------------------------------------
+# write side
+# ---------------------------------------------------------------------
+def _doc(value):
+    """raw_json column: web3 AttributeDict / dict, or a JSON string (raw passthrough)"""
+    return json.loads(value) if isinstance(value, (str, bytes)) else value
+
+
+def _bytes(value):
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    return bytes(HexBytes(value))
+
+
+def _int(value):
+    if value is None or isinstance(value, int):
+        return value
+    return int(value, 16) if isinstance(value, str) and value.startswith("0x") else int(value)
+
+
+def _pack(doc, skip):
+    rest = {k: v for k, v in doc.items() if k not in skip}
+    if not rest:
+        return None
+    text = json.dumps(normalize(rest), separators=(",", ":"))
+    return zlib.compress(text.encode(), PAYLOAD_COMPRESS_LEVEL)
+
+
+def compact_block_row(row):
+    block_number, timestamp, block = row[0], row[1], _doc(row[2])
+    return (
+        block_number, _int(timestamp), _bytes(block.get("hash")), _bytes(block.get("parentHash")),
+        _bytes(block.get("miner")), _int(block.get("gasUsed")), _int(block.get("gasLimit")),
+        _int(block.get("baseFeePerGas")), _bytes(block.get("logsBloom")), _pack(block, _BLOCK_COLUMNS),
+    )
+
+
+def compact_tx_row(row):
+    tx_hash, block_number, tx = row[0], row[1], _doc(row[2])
+    return (
+        _bytes(tx_hash), block_number, _int(tx.get("transactionIndex")), _bytes(tx.get("from")),
+        _bytes(tx.get("to")), _int(tx.get("value")), _int(tx.get("gasPrice")), _bytes(tx.get("input")),
+        _pack(tx, _TX_COLUMNS),
+    )
+
+
+def compact_receipt_row(row):
+    tx_hash, block_number, receipt = row[0], row[1], _doc(row[2])
+    return (
+        _bytes(tx_hash), block_number, _int(receipt.get("gasUsed")), _int(receipt.get("status")),
+        _pack(receipt, _RECEIPT_COLUMNS),
+    )
+
+
+def compact_log_row(row):
+    tx_hash, block_number, log_index, lg = row[0], row[1], row[2], _doc(row[3])
+    return (
+        _bytes(tx_hash), block_number, _int(log_index), _bytes(lg.get("address")),
+        b"".join(_bytes(t) for t in lg.get("topics") or []), _bytes(lg.get("data")),
+        _pack(lg, _LOG_COLUMNS),
+    )
+
+
+COMPACT_ROW = {
+    "raw_blocks": compact_block_row,
+    "raw_transactions": compact_tx_row,
+    "raw_receipts": compact_receipt_row,
+    "raw_logs": compact_log_row,
+}
+
+
+# ---------------------------------------------------------------------
+# read side
+# ---------------------------------------------------------------------
+def _hex(value):
+    """bytea -> hex without 0x, like HexBytes.hex() in the JSON layout"""
+    return None if value is None else value.hex()
+
+
+def _address(value):
+    return None if value is None else checksum_address("0x" + value.hex())
+
+
+def _topics(value):
+    value = bytes(value or b"")
+    return [value[i:i + 32].hex() for i in range(0, len(value), 32)]
+
+
+def _unpack(payload):
+    return json.loads(zlib.decompress(payload)) if payload else {}
+
+
+# same tuples as Database_Operations.iter_block_fields / iter_tx_fields / iter_log_fields
+BLOCK_FIELDS_SQL = """
+    SELECT block_number, block_timestamp, miner, gas_used, gas_limit, base_fee
+    FROM raw_block_headers
+    WHERE block_number BETWEEN %s AND %s
+    ORDER BY block_number
+"""
+TX_FIELDS_SQL = """
+    SELECT tranx.tx_hash, tranx.block_number, tranx.from_address, tranx.to_address,
+           tranx.value, tranx.gas_price, receipt.gas_used, tranx.input
+    FROM raw_transactions_compact tranx
+    JOIN raw_receipts_compact receipt
+    ON tranx.tx_hash = receipt.tx_hash
+    WHERE tranx.block_number BETWEEN %s AND %s
+    ORDER BY tranx.block_number
+"""
+LOG_FIELDS_SQL = """
+    SELECT tx_hash, block_number, log_index, address, topics, data
+    FROM raw_logs_compact
+    WHERE block_number BETWEEN %s AND %s
+    ORDER BY block_number, log_index
+"""
+
+
+def block_fields(r):
+    return (r[0], r[1], _address(r[2]), r[3], r[4], r[5])
+
+
+def tx_fields(r):
+    return (_hex(r[0]), r[1], _address(r[2]), _address(r[3]), r[4], r[5], r[6], _hex(r[7]))
+
+
+def log_fields(r):
+    return (_hex(r[0]), r[1], r[2], _address(r[3]), _topics(r[4]), _hex(r[5]))
+
+
+# full documents (iter_raw_* / fetch_raw_*)
+RAW_BLOCKS_SQL = """
+    SELECT block_number, block_timestamp, block_hash, parent_hash, miner,
+           gas_used, gas_limit, base_fee, logs_bloom, payload
+    FROM raw_block_headers
+    WHERE block_number BETWEEN %s AND %s
+    ORDER BY block_number
+"""
+RAW_TX_RECEIPT_SQL = """
+    SELECT tranx.tx_hash, tranx.block_number, tranx.tx_index, tranx.from_address, tranx.to_address,
+           tranx.value, tranx.gas_price, tranx.input, tranx.payload,
+           receipt.gas_used, receipt.status, receipt.payload
+    FROM raw_transactions_compact tranx
+    JOIN raw_receipts_compact receipt
+    ON tranx.tx_hash = receipt.tx_hash
+    WHERE tranx.block_number BETWEEN %s AND %s
+    ORDER BY tranx.block_number
+"""
+RAW_LOGS_SQL = """
+    SELECT tx_hash, block_number, log_index, address, topics, data, payload
+    FROM raw_logs_compact
+    WHERE block_number BETWEEN %s AND %s
+    ORDER BY block_number, log_index
+"""
+
+
+def _int_or_none(value):
+    return None if value is None else int(value)
+
+
+def expand_block(r):
+    """Block header document (no transactions)"""
+    doc = _unpack(r[9])
+    doc.update(number=r[0], timestamp=r[1], hash=_hex(r[2]), parentHash=_hex(r[3]), miner=_address(r[4]),
+               gasUsed=r[5], gasLimit=r[6], baseFeePerGas=_int_or_none(r[7]), logsBloom=_hex(r[8]))
+    return {"block_number": r[0], "raw_json": doc}
+
+
+def expand_tx_receipt(r):
+    """Transaction + receipt documents (receipt without its logs)"""
+    tx_hash, block_number = _hex(r[0]), r[1]
+    tx = _unpack(r[8])
+    tx.update({"hash": tx_hash, "blockNumber": block_number, "transactionIndex": r[2],
+               "from": _address(r[3]), "to": _address(r[4]), "value": _int_or_none(r[5]),
+               "gasPrice": _int_or_none(r[6]), "input": _hex(r[7])})
+    receipt = _unpack(r[11])
+    receipt.update({"transactionHash": tx_hash, "blockNumber": block_number, "from": tx["from"],
+                    "to": tx["to"], "gasUsed": r[9], "status": r[10]})
+    return {
+        "tx": {"tx_hash": tx_hash, "block_number": block_number, "raw_json": tx},
+        "receipt": {"tx_hash": tx_hash, "block_number": block_number, "raw_json": receipt},
+    }
+
+
+def expand_log(r):
+    tx_hash = _hex(r[0])
+    doc = _unpack(r[6])
+    doc.update(transactionHash=tx_hash, blockNumber=r[1], logIndex=r[2], address=_address(r[3]),
+               topics=_topics(r[4]), data=_hex(r[5]))
+    return {"tx_hash": tx_hash, "block_number": r[1], "log_index": r[2], "raw_json": doc}
+
+
+# ---------------------------------------------------------------------
+# block table used by checkpoints / token prefetch
+# ---------------------------------------------------------------------
+def block_table(alias=None):
+    """(table, block hash as hex text SQL) of the active layout, columns prefixed with alias"""
+    prefix = f"{alias}." if alias else ""
+    if is_compact():
+        return "raw_block_headers", f"encode({prefix}block_hash, 'hex')"
+    return "raw_blocks", f"{prefix}raw_json->>'hash'"
+
+
+def log_addresses_query(transfers_only=False):
+    """
+    (sql, params) selecting the distinct lower-case 0x addresses emitting
+    logs in a block range: run with (start_block, end_block) + params,
+    transfers_only keeps ERC-20 Transfer logs only
+    """
+    topic = ERC20_TRANSFER_TOPIC[2:]
+    if is_compact():
+        sql = """
+            SELECT DISTINCT '0x' || encode(address, 'hex')
+            FROM raw_logs_compact
+            WHERE block_number BETWEEN %s AND %s
+        """
+        if transfers_only:
+            return sql + " AND substring(topics from 1 for 32) = decode(%s, 'hex')", (topic,)
+        return sql, ()
+    sql = """
+        SELECT DISTINCT lower(raw_json->>'address')
+        FROM raw_logs
+        WHERE block_number BETWEEN %s AND %s
+    """
+    if transfers_only:
+        # topics are stored with or without 0x depending on the ingest path
+        return sql + " AND raw_json->'topics'->>0 IN (%s, %s)", ("0x" + topic, topic)
+    return sql, ()
@@ -0,0 +1,54 @@
+-- compact raw layout (RAW_LAYOUT=compact, see db/raw_compact.py):
+-- fixed-width fields as bytea, everything else zlib-compressed JSON in payload
+
+-- block headers (transactions live in raw_transactions_compact only)
+CREATE TABLE IF NOT EXISTS raw_block_headers (
+    block_number     BIGINT PRIMARY KEY,
+    block_timestamp  BIGINT,
+    block_hash       BYTEA,
+    parent_hash      BYTEA,
+    miner            BYTEA,
+    gas_used         BIGINT,
+    gas_limit        BIGINT,
+    base_fee         NUMERIC,
+    logs_bloom       BYTEA,
+    payload          BYTEA
+);
+
+-- transactions
+CREATE TABLE IF NOT EXISTS raw_transactions_compact (
+    tx_hash        BYTEA PRIMARY KEY,
+    block_number   BIGINT,
+    tx_index       INT,
+    from_address   BYTEA,
+    to_address     BYTEA,
+    value          NUMERIC,
+    gas_price      NUMERIC,
+    input          BYTEA,
+    payload        BYTEA
+);
+
+-- receipts (logs live in raw_logs_compact only)
+CREATE TABLE IF NOT EXISTS raw_receipts_compact (
+    tx_hash        BYTEA PRIMARY KEY,
+    block_number   BIGINT,
+    gas_used       BIGINT,
+    status         SMALLINT,
+    payload        BYTEA
+);
+
+-- logs, topics = the 32-byte topics concatenated
+CREATE TABLE IF NOT EXISTS raw_logs_compact (
+    tx_hash      BYTEA,
+    block_number BIGINT,
+    log_index    INT,
+    address      BYTEA,
+    topics       BYTEA,
+    data         BYTEA,
+    payload      BYTEA,
+    PRIMARY KEY (tx_hash, log_index)
+);
+
+CREATE INDEX IF NOT EXISTS idx_raw_txs_compact_block ON raw_transactions_compact (block_number);
+CREATE INDEX IF NOT EXISTS idx_raw_receipts_compact_block ON raw_receipts_compact (block_number);
+CREATE INDEX IF NOT EXISTS idx_raw_logs_compact_block ON raw_logs_compact (block_number, log_index);
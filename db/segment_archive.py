@@ -0,0 +1,393 @@
+# db/segment_archive.py
+import asyncio
+import bisect
+import mmap
+import os
+import struct
+import threading
+from array import array
+from decimal import Decimal
+from pathlib import Path
+import db.raw_compact as raw_compact
+from decoder.util import ERC20_TRANSFER_TOPIC
+from utils.logger import logger
+
+"""
+Local append-only archive of raw blocks, an alternative to the raw_*
+tables as ingestion sink and decoder source.
+
+    <ARCHIVE_DIR>/seg-000000.dat ...   block records, appended
+    <ARCHIVE_DIR>/blocks.idx           (block_number, segment, offset, length) records
+
+A block record holds the block header, its transactions, receipts and
+logs as the db/raw_compact.py rows (bytea-style fields as raw bytes, the
+rest zlib-compressed JSON) in four sections, each one the int32 lengths of
+all its fields followed by the field bytes; the record header has the
+section offsets, so a reader only decodes the section it needs. A new
+segment starts after ARCHIVE_SEGMENT_BYTES. The index is appended after
+the record is written, so a torn write is never indexed (and the segment
+tail it left is cut off on the next open).
+
+Reads go through read-only mmaps: fields are decoded with
+struct.unpack_from and bytes fields are memoryview slices of the map, so
+nothing is copied until a value is turned into hex. The iter_*_fields /
+iter_raw_* readers return the same rows as Database_Operations, so the
+decoder can replay from here with no raw tables at all.
+"""
+
+ARCHIVE_DIR = os.getenv(
+    "ARCHIVE_DIR",
+    str(Path(__file__).resolve().parent.parent / ".cache" / "archive"),
+)
+ARCHIVE_SEGMENT_BYTES = int(os.getenv("ARCHIVE_SEGMENT_BYTES", 256 << 20))
+
+_MAGIC = b"BLK2"
+# magic, block_number, txs, receipts, logs, offsets of the tx / receipt / log sections
+_RECORD = struct.Struct("<4sQIIIIII")
+_INDEX = struct.Struct("<QIQI")         # block_number, segment, offset, length
+
+# raw_compact row fields stored as integers (the others are bytes)
+_INT_FIELDS = {
+    "raw_blocks": (0, 1, 5, 6, 7),
+    "raw_transactions": (1, 2, 5, 6),
+    "raw_receipts": (1, 2, 3),
+    "raw_logs": (1, 2),
+}
+_FIELDS = {table: len(columns) for table, (_, columns) in raw_compact.COMPACT_TABLES.items()}
+_TRANSFER_TOPIC = bytes.fromhex(ERC20_TRANSFER_TOPIC[2:])
+
+
+# ---------------------------------------------------------------------
+# record encoding
+# ---------------------------------------------------------------------
+def _encode_section(rows):
+    """rows -> int32 length of every field (-1 for NULL) followed by the field bytes"""
+    lengths, data = [], []
+    for row in rows:
+        for value in row:
+            if value is None:
+                lengths.append(-1)
+                continue
+            if isinstance(value, int):
+                value = value.to_bytes((value.bit_length() + 8) // 8, "big", signed=True)
+            lengths.append(len(value))
+            data.append(value)
+    return struct.pack(f"<{len(lengths)}i", *lengths) + b"".join(data)
+
+
+def encode_block(item):
+    """build_raw_rows dict -> one archive record (bytes)"""
+    sections = [
+        _encode_section([raw_compact.compact_block_row(item["block"])]),
+        _encode_section([raw_compact.compact_tx_row(r) for r in item["tx"]]),
+        _encode_section([raw_compact.compact_receipt_row(r) for r in item["receipt"]]),
+        _encode_section([raw_compact.compact_log_row(r) for r in item["logs"]]),
+    ]
+    offsets, pos = [], _RECORD.size
+    for section in sections[:-1]:
+        pos += len(section)
+        offsets.append(pos)
+    header = _RECORD.pack(_MAGIC, item["block"][0], len(item["tx"]), len(item["receipt"]), len(item["logs"]),
+                          *offsets)
+    return header + b"".join(sections)
+
+
+def _decode_section(view, pos, rows, table):
+    """Section at pos -> list of rows, bytes fields stay memoryview slices of view"""
+    fields = _FIELDS[table]
+    lengths = struct.unpack_from(f"<{rows * fields}i", view, pos)
+    pos += 4 * len(lengths)
+    values = []
+    for n in lengths:
+        if n < 0:
+            values.append(None)
+        else:
+            values.append(view[pos:pos + n])
+            pos += n
+    out = []
+    ints = _INT_FIELDS[table]
+    for i in range(0, len(values), fields):
+        row = values[i:i + fields]
+        for f in ints:
+            if row[f] is not None:
+                row[f] = int.from_bytes(row[f], "big", signed=True)
+        out.append(tuple(row))
+    return out
+
+
+def _header(view):
+    header = _RECORD.unpack_from(view, 0)
+    if header[0] != _MAGIC:
+        raise ValueError("not an archive block record")
+    return header
+
+
+def decode_block_row(view):
+    return _decode_section(view, _RECORD.size, 1, "raw_blocks")[0]
+
+
+def decode_tx_rows(view):
+    """(tx rows, receipt rows) of a record"""
+    _, _, n_txs, n_receipts, _, tx_pos, receipt_pos, _ = _header(view)
+    return (_decode_section(view, tx_pos, n_txs, "raw_transactions"),
+            _decode_section(view, receipt_pos, n_receipts, "raw_receipts"))
+
+
+def decode_log_rows(view):
+    _, _, _, _, n_logs, _, _, log_pos = _header(view)
+    return _decode_section(view, log_pos, n_logs, "raw_logs")
+
+
+def decode_block(view):
+    """Archive record -> (block_row, tx_rows, receipt_rows, log_rows) in raw_compact row shapes"""
+    _header(view)
+    return (decode_block_row(view),) + decode_tx_rows(view) + (decode_log_rows(view),)
+
+
+def _numeric(value):
+    """NUMERIC columns come back from Postgres as Decimal"""
+    return None if value is None else Decimal(value)
+
+
+class SegmentArchive():
+    """Class to append raw blocks to segment files and replay them through mmaps"""
+
+    def __init__(self, path=ARCHIVE_DIR, segment_bytes=ARCHIVE_SEGMENT_BYTES, fsync=False):
+        self.path = Path(path)
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.path / "blocks.idx"
+        # sorted block numbers + where their record is
+        self.blocks = array("Q")
+        self.segments = array("I")
+        self.offsets = array("Q")
+        self.lengths = array("I")
+        self._maps = {}         # segment -> (mmap, memoryview)
+        self._lock = threading.Lock()
+        self.load()
+
+    def _segment_path(self, segment):
+        return self.path / f"seg-{segment:06d}.dat"
+
+    # ------------------------------------------------------------------
+    # index
+    # ------------------------------------------------------------------
+    def _put(self, block_number, segment, offset, length):
+        i = bisect.bisect_left(self.blocks, block_number)
+        if i < len(self.blocks) and self.blocks[i] == block_number:
+            # re-archived block (e.g. after a reorg): the newest record wins
+            self.segments[i], self.offsets[i], self.lengths[i] = segment, offset, length
+            return
+        self.blocks.insert(i, block_number)
+        self.segments.insert(i, segment)
+        self.offsets.insert(i, offset)
+        self.lengths.insert(i, length)
+
+    def load(self):
+        """Function to read the block index, dropping entries past the end of their segment"""
+        if not self.index_path.exists():
+            return
+        data = self.index_path.read_bytes()
+        valid = len(data) - len(data) % _INDEX.size
+        sizes, ends = {}, {}
+        for block_number, segment, offset, length in _INDEX.iter_unpack(data[:valid]):
+            if segment not in sizes:
+                seg_path = self._segment_path(segment)
+                sizes[segment] = seg_path.stat().st_size if seg_path.exists() else 0
+            if offset + length > sizes[segment]:
+                logger.warning("[ARCHIVE] index entry of block %s points past segment %s, ignored",
+                               block_number, segment)
+                continue
+            self._put(block_number, segment, offset, length)
+            ends[segment] = max(ends.get(segment, 0), offset + length)
+        if valid != len(data):
+            with open(self.index_path, "r+b") as f:
+                f.truncate(valid)
+        # cut unindexed tails (writes interrupted before their index entry)
+        for segment, size in sizes.items():
+            if size > ends.get(segment, 0) and segment == max(sizes):
+                with open(self._segment_path(segment), "r+b") as f:
+                    f.truncate(ends.get(segment, 0))
+        logger.info("[ARCHIVE] %s blocks indexed in %s", len(self.blocks), self.path)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __contains__(self, block_number):
+        i = bisect.bisect_left(self.blocks, block_number)
+        return i < len(self.blocks) and self.blocks[i] == block_number
+
+    def _span(self, start_block, end_block):
+        return bisect.bisect_left(self.blocks, start_block), bisect.bisect_right(self.blocks, end_block)
+
+    def count(self, start_block, end_block):
+        lo, hi = self._span(start_block, end_block)
+        return hi - lo
+
+    def has_blocks(self, start_block, end_block):
+        """True when every block of the range is archived"""
+        return self.count(start_block, end_block) == end_block - start_block + 1
+
+    def missing_ranges(self, start_block, end_block):
+        """Function to return the (start, end) ranges of the range not archived yet"""
+        gaps, cursor = [], start_block
+        lo, hi = self._span(start_block, end_block)
+        for i in range(lo, hi):
+            if self.blocks[i] > cursor:
+                gaps.append((cursor, self.blocks[i] - 1))
+            cursor = self.blocks[i] + 1
+        if cursor <= end_block:
+            gaps.append((cursor, end_block))
+        return gaps
+
+    def archived_ranges(self, start_block, end_block):
+        """Function to return the (start, end) ranges of the range already archived"""
+        ranges = []
+        lo, hi = self._span(start_block, end_block)
+        for i in range(lo, hi):
+            if ranges and ranges[-1][1] == self.blocks[i] - 1:
+                ranges[-1][1] = self.blocks[i]
+            else:
+                ranges.append([self.blocks[i], self.blocks[i]])
+        return [tuple(r) for r in ranges]
+
+    def block_hashes(self, block_numbers):
+        """Function to return {block_number: hash hex without 0x} of the archived blocks among block_numbers"""
+        out = {}
+        for block_number in set(block_numbers):
+            for view in self.iter_views(block_number, block_number):
+                out[block_number] = bytes(decode_block_row(view)[2]).hex()
+        return out
+
+    # ------------------------------------------------------------------
+    # write
+    # ------------------------------------------------------------------
+    def append(self, items):
+        """Function to archive build_raw_rows dicts, returns bytes written"""
+        records = [(item["block"][0], encode_block(item)) for item in items if item]
+        if not records:
+            return 0
+        with self._lock:
+            segment = max(self.segments) if self.segments else 0
+            seg_path = self._segment_path(segment)
+            offset = seg_path.stat().st_size if seg_path.exists() else 0
+            if offset and offset + sum(len(r) for _, r in records) > self.segment_bytes:
+                segment, offset = segment + 1, 0
+
+            entries, chunks = [], []
+            for block_number, record in records:
+                entries.append((block_number, segment, offset, len(record)))
+                chunks.append(record)
+                offset += len(record)
+            with open(self._segment_path(segment), "ab") as f:
+                f.write(b"".join(chunks))
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            with open(self.index_path, "ab") as f:
+                f.write(b"".join(_INDEX.pack(*e) for e in entries))
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            for entry in entries:
+                self._put(*entry)
+        return offset
+
+    # ------------------------------------------------------------------
+    # read
+    # ------------------------------------------------------------------
+    def _view(self, segment, end):
+        """memoryview over the segment mmap, remapped when the segment grew past `end`"""
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped[1]) < end:
+            with open(self._segment_path(segment), "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # the superseded map is not closed: views of it handed out earlier may still be
+            # alive (a reader replaying a segment an ingest run is appending to), it is
+            # unmapped by GC with the last of them
+            mapped = self._maps[segment] = (mm, memoryview(mm))
+        return mapped[1]
+
+    def iter_views(self, start_block, end_block):
+        """Yield memoryviews of the archived block records of the range, in block order"""
+        lo, hi = self._span(start_block, end_block)
+        for i in range(lo, hi):
+            offset, length = self.offsets[i], self.lengths[i]
+            view = self._view(self.segments[i], offset + length)
+            yield view[offset:offset + length]
+
+    def iter_records(self, start_block, end_block):
+        """Yield (block_row, tx_rows, receipt_rows, log_rows) of archived blocks in block order"""
+        for view in self.iter_views(start_block, end_block):
+            yield decode_block(view)
+
+    def close(self):
+        """Function to release the mmaps (views handed out must be dropped first)"""
+        for mm, view in self._maps.values():
+            view.release()
+            mm.close()
+        self._maps.clear()
+
+    # same rows as Database_Operations.iter_block_fields / iter_tx_fields / iter_log_fields
+    def iter_block_fields(self, start_block, end_block, itersize=None):
+        for view in self.iter_views(start_block, end_block):
+            block = decode_block_row(view)
+            yield raw_compact.block_fields((block[0], block[1], block[4], block[5], block[6], _numeric(block[7])))
+
+    def iter_tx_fields(self, start_block, end_block, itersize=None):
+        for view in self.iter_views(start_block, end_block):
+            txs, receipts = decode_tx_rows(view)
+            gas_used = {bytes(r[0]): r[2] for r in receipts}
+            for tx in txs:
+                key = bytes(tx[0])
+                if key in gas_used:
+                    yield raw_compact.tx_fields((tx[0], tx[1], tx[3], tx[4], _numeric(tx[5]), _numeric(tx[6]),
+                                                 gas_used[key], tx[7]))
+
+    def iter_log_fields(self, start_block, end_block, itersize=None):
+        for view in self.iter_views(start_block, end_block):
+            for lg in decode_log_rows(view):
+                yield raw_compact.log_fields(lg[:6])
+
+    # same rows as Database_Operations.iter_raw_*
+    def iter_raw_block_rows(self, start_block, end_block, itersize=None):
+        for view in self.iter_views(start_block, end_block):
+            yield raw_compact.expand_block(decode_block_row(view))
+
+    def iter_raw_tx_receipt_pairs(self, start_block, end_block, itersize=None):
+        for view in self.iter_views(start_block, end_block):
+            txs, receipts = decode_tx_rows(view)
+            by_hash = {bytes(r[0]): r for r in receipts}
+            for tx in txs:
+                receipt = by_hash.get(bytes(tx[0]))
+                if receipt is not None:
+                    yield raw_compact.expand_tx_receipt(tx + (receipt[2], receipt[3], receipt[4]))
+
+    def iter_raw_logs(self, start_block, end_block, itersize=None):
+        for view in self.iter_views(start_block, end_block):
+            for lg in decode_log_rows(view):
+                yield raw_compact.expand_log(lg)
+
+    def transfer_token_addresses(self, start_block, end_block):
+        """Lower-case addresses of contracts emitting Transfer logs in the range"""
+        addresses = set()
+        for view in self.iter_views(start_block, end_block):
+            for lg in decode_log_rows(view):
+                if lg[4] is not None and lg[4][:32] == _TRANSFER_TOPIC:
+                    addresses.add("0x" + lg[3].hex())
+        return addresses
+
+    def get_stats(self):
+        sizes = [p.stat().st_size for p in self.path.glob("seg-*.dat")]
+        return {"blocks": len(self.blocks), "segments": len(sizes), "bytes": sum(sizes),
+                "bytes_per_block": sum(sizes) / len(self.blocks) if self.blocks else 0}
+
+
+def archive_writer(archive, then=None):
+    """writer(db, items) coroutine for the async engine: archive the batch, then run `then` (e.g. the raw insert)"""
+    async def write(db, items):
+        await asyncio.to_thread(archive.append, items)
+        if then is not None:
+            await then(db, items)
+    return write
@@ -1,12 +1,116 @@
-# avoiding repeated RPC calls by token_cache dict
-token_cache = {}
+# db/token_cache.py
+import os
+import threading
+import time
+from collections import OrderedDict
+
+"""
+In-process token metadata cache (first tier in front of the `tokens` table
+and the on-chain metadata calls, see decoder/token_utils.py).
+
+- bounded LRU of address -> (symbol, decimals)
+- negative entries for contracts whose metadata calls revert, so they are
+  not re-queried on every Transfer log (expire after TOKEN_NEGATIVE_TTL)
+- hit / miss counters
+"""
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 50_000))
+TOKEN_NEGATIVE_TTL = float(os.getenv("TOKEN_NEGATIVE_TTL", 3600))   # seconds
+
+
+class TokenCache():
+    """Class for a thread-safe LRU of token metadata with negative caching"""
+
+    def __init__(self, max_size=TOKEN_CACHE_SIZE, negative_ttl=TOKEN_NEGATIVE_TTL):
+        self.max_size = max_size
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()   # address -> (symbol, decimals)
+        self._negative = {}             # address -> expiry timestamp
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "negative_hits": 0,
+            "evictions": 0,
+            "prefetched": 0,
+            "db_hits": 0,       # misses answered by the tokens table
+            "rpc_lookups": 0,   # misses which needed on-chain metadata calls
+        }
+
+    def get(self, address):
+        """Function to return (symbol, decimals) or None on a miss"""
+        key = address.lower()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, address, symbol, decimals):
+        """Function to map address with symbol & decimal value"""
+        key = address.lower()
+        with self._lock:
+            self._negative.pop(key, None)
+            self._entries[key] = (symbol, decimals)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def set_many(self, rows):
+        """Function to load [(address, symbol, decimals), ...] (prefetch)"""
+        for address, symbol, decimals in rows:
+            self.set(address, symbol, decimals)
+        with self._lock:
+            self.stats["prefetched"] += len(rows)
+
+    def set_negative(self, address):
+        """Remember that metadata calls for address failed"""
+        with self._lock:
+            self._negative[address.lower()] = time.time() + self.negative_ttl
+
+    def is_negative(self, address):
+        key = address.lower()
+        with self._lock:
+            expiry = self._negative.get(key)
+            if expiry is None:
+                return False
+            if expiry < time.time():
+                del self._negative[key]
+                return False
+            self.stats["negative_hits"] += 1
+            return True
+
+    def count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def __contains__(self, address):
+        with self._lock:
+            return address.lower() in self._entries
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, size=len(self._entries), negative=len(self._negative))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._negative.clear()
+
+
+# avoiding repeated RPC calls by the shared token_cache
+token_cache = TokenCache()
 
 def get_token(address):
-    """function to return address in lower case"""
-    
-    return token_cache.get(address.lower())
+    """function to return cached {symbol, decimals} for address"""
+    entry = token_cache.get(address)
+    return {"symbol": entry[0], "decimals": entry[1]} if entry else None
 
 def set_token(address, symbol, decimals):
     """function to map address with symbol & decimal value"""
 
-    token_cache[address.lower()] = {"symbol": symbol, "decimals": decimals}
\ No newline at end of file
+    token_cache.set(address, symbol, decimals)
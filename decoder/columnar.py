@@ -0,0 +1,83 @@
+# decoder/columnar.py
+from decoder.util import ERC20_TRANSFER_TOPIC, checksum_address
+
+"""
+Columnar ERC-20 Transfer decoding.
+A LogBatch keeps a range of logs as parallel lists (one per field) and
+decode_transfers works on whole columns:
+- topic0 filter in one pass (both 0x / non 0x forms, as stored by the two ingest paths)
+- from / to are fixed-width slices of the 32 byte topics
+- checksum conversion is memoized per distinct address (decoder.util.checksum_address)
+Output matches the per-log path in decoder/transform._decode_log.
+"""
+
+_TRANSFER_TOPICS = frozenset((ERC20_TRANSFER_TOPIC, ERC20_TRANSFER_TOPIC[2:]))
+
+
+def _hex_str(value):
+    """Topic as hex string (topics may come as str or bytes / HexBytes)"""
+    if value is None or isinstance(value, str):
+        return value
+    return value.hex() if hasattr(value, "hex") else str(value)
+
+
+class LogBatch():
+    """Class holding a batch of logs as columns"""
+
+    __slots__ = ("tx_hash", "block_number", "log_index", "address", "topics", "data")
+
+    def __init__(self, tx_hash, block_number, log_index, address, topics, data):
+        self.tx_hash = tx_hash
+        self.block_number = block_number
+        self.log_index = log_index
+        self.address = address
+        self.topics = topics
+        self.data = data
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Function to build a batch from (tx_hash, block_number, log_index, address, topics, data) rows"""
+        rows = list(rows)
+        if not rows:
+            return cls([], [], [], [], [], [])
+        columns = [list(c) for c in zip(*rows)]
+        columns[4] = [t or [] for t in columns[4]]
+        return cls(*columns)
+
+    def __len__(self):
+        return len(self.tx_hash)
+
+
+def transfer_indices(batch):
+    """Function to return row indices of ERC-20 Transfer logs (topic0 match, 3 topics)"""
+    matches = _TRANSFER_TOPICS
+    out = []
+    for i, topics in enumerate(batch.topics):
+        if len(topics) == 3:
+            t0 = _hex_str(topics[0])
+            if t0 in matches or (t0 is not None and t0.lower() in matches):
+                out.append(i)
+    return out
+
+
+def decode_transfers(batch):
+    """
+    Decode all ERC-20 Transfers of a batch.
+    Returns columns (indices, from_addresses, to_addresses, amounts_raw),
+    indices point back into the batch.
+    """
+    idx = transfer_indices(batch)
+    topics = batch.topics
+    data = batch.data
+
+    # 32 byte topic -> last 20 bytes (40 hex chars) is the address
+    from_hex = ["0x" + _hex_str(topics[i][1])[-40:].lower() for i in idx]
+    to_hex = ["0x" + _hex_str(topics[i][2])[-40:].lower() for i in idx]
+
+    # distinct addresses only hit the checksum memo once per batch
+    checksummed = {a: checksum_address(a) for a in set(from_hex).union(to_hex)}
+    from_addrs = [checksummed[a] for a in from_hex]
+    to_addrs = [checksummed[a] for a in to_hex]
+
+    amounts = [int(data[i], 16) if data[i] not in (None, "", "0x") else None for i in idx]
+    return idx, from_addrs, to_addrs, amounts
@@ -1,18 +1,20 @@
+import os
+from eth_abi import decode as abi_decode, encode as abi_encode
 from web3 import Web3
 from utils.logger import logger
+from decoder.util import ERC20_TRANSFER_TOPIC
 
-ERC20_TRANSFER_SIG = Web3.keccak(text="Transfer(address,address,uint256)").hex()
+ERC20_TRANSFER_SIG = ERC20_TRANSFER_TOPIC[2:]
+_TRANSFER_SIG_BYTES = bytes.fromhex(ERC20_TRANSFER_TOPIC[2:])
 
 def decode_transfer_log(w3, log):
     """Safely decode an ERC20 Transfer event log."""
-    
-    ERC20_TRANSFER_SIG = Web3.keccak(text="Transfer(address,address,uint256)").hex().lower()
 
     # 1️⃣ Check event signature
     if len(log["topics"]) == 0:
         return None
 
-    if log["topics"][0].hex().lower() != ERC20_TRANSFER_SIG:
+    if bytes(log["topics"][0]) != _TRANSFER_SIG_BYTES:
         return None
 
     # 2️⃣ Must have at least 3 topics (event + indexed from + to)
@@ -68,35 +70,149 @@ ERC20_METADATA_ABI = [
 ]
 
 
-def decode_erc20_metadata(w3: Web3, token_address: str):
+# Multicall3 is deployed at the same address on mainnet and most EVM chains
+MULTICALL3_ADDRESS = Web3.to_checksum_address(
+    os.getenv("MULTICALL3_ADDRESS", "0xcA11bde05977b3631167028862bE2a173976CA11"))
+# tokens per aggregate3 call (3 sub-calls each)
+MULTICALL_CHUNK_SIZE = int(os.getenv("MULTICALL_CHUNK_SIZE", 200))
+
+AGGREGATE3_SELECTOR = Web3.keccak(text="aggregate3((address,bool,bytes)[])")[:4]
+METADATA_SELECTORS = {
+    "name": Web3.keccak(text="name()")[:4],
+    "symbol": Web3.keccak(text="symbol()")[:4],
+    "decimals": Web3.keccak(text="decimals()")[:4],
+}
+METADATA_DEFAULTS = {"name": "UNKNOWN", "symbol": "UNK", "decimals": 18}
+
+# endpoints without Multicall3 code (aggregate3 returned nothing)
+_no_multicall = set()
+
+
+def _endpoint_key(w3):
+    return getattr(w3.provider, "endpoint_uri", None) or id(w3.provider)
+
+
+def decode_string_or_bytes32(data):
     """
-    Fetches ERC20 token metadata: name, symbol, decimals.
-    Returns dict {name, symbol, decimals}
-    Falls back to safe defaults if call fails.
+    Decode the return data of name() / symbol().
+    Handles ABI `string` and the older `bytes32` style (MKR, SAI, ...).
+    Returns None when the data is neither.
     """
+    data = bytes(data or b"")
+    if len(data) == 32:
+        # bytes32: right padded with zero bytes
+        text = data.rstrip(b"\x00").decode("utf-8", errors="ignore")
+        return text or None
+    if len(data) >= 64:
+        try:
+            text = abi_decode(["string"], data)[0]
+        except Exception:
+            return None
+        return text.replace("\x00", "") or None
+    return None
+
+
+def decode_uint8(data):
+    """Decode the return data of decimals(), None if it is not a sane uint8"""
+    data = bytes(data or b"")
+    if len(data) < 32:
+        return None
+    value = int.from_bytes(data[:32], "big")
+    return value if value <= 255 else None
 
-    token_address = Web3.to_checksum_address(token_address)
 
-    contract = w3.eth.contract(address=token_address, abi=ERC20_METADATA_ABI)
+def _decode_metadata_field(field, data):
+    if field == "decimals":
+        return decode_uint8(data)
+    return decode_string_or_bytes32(data)
 
-    metadata = {}
 
-    # 1️⃣ Name
-    try:
-        metadata["name"] = contract.functions.name().call()
-    except Exception:
-        metadata["name"] = "UNKNOWN"
+def _metadata_from_results(results):
+    """
+    results: {field: (success, return_data)}
+    Returns dict {name, symbol, decimals, failed} like decode_erc20_metadata.
+    """
+    metadata = {"failed": []}
+    for field, default in METADATA_DEFAULTS.items():
+        success, data = results.get(field, (False, b""))
+        value = _decode_metadata_field(field, data) if success else None
+        if value is None:
+            metadata[field] = default
+            metadata["failed"].append(field)
+        else:
+            metadata[field] = value
+    return metadata
 
-    # 2️⃣ Symbol
-    try:
-        metadata["symbol"] = contract.functions.symbol().call()
-    except Exception:
-        metadata["symbol"] = "UNK"
 
-    # 3️⃣ Decimals
-    try:
-        metadata["decimals"] = contract.functions.decimals().call()
-    except Exception:
-        metadata["decimals"] = 18  # safest fallback
+def _aggregate3(w3, calls):
+    """
+    One eth_call to Multicall3.aggregate3 with allowFailure on every call.
+    calls: [(target, calldata)], returns [(success, return_data)]
+    """
+    payload = AGGREGATE3_SELECTOR + abi_encode(
+        ["(address,bool,bytes)[]"],
+        [[(target, True, calldata) for target, calldata in calls]],
+    )
+    raw = w3.eth.call({"to": MULTICALL3_ADDRESS, "data": Web3.to_hex(payload)})
+    if not raw:
+        _no_multicall.add(_endpoint_key(w3))
+        raise ValueError(f"no Multicall3 contract at {MULTICALL3_ADDRESS}")
+    return abi_decode(["(bool,bytes)[]"], bytes(raw))[0]
+
+
+def decode_erc20_metadata_batch(w3: Web3, token_addresses, chunk_size=None):
+    """
+    Fetches ERC20 metadata of many tokens through Multicall3 aggregate3,
+    chunk_size tokens (3 sub-calls each) per eth_call.
+    Returns {lowercase address: {name, symbol, decimals, failed}}.
+    A chunk whose aggregate call fails is resolved token by token.
+    """
+    chunk_size = chunk_size or MULTICALL_CHUNK_SIZE
+    addresses = list(dict.fromkeys(a.lower() for a in token_addresses if a))
+    out = {}
+
+    for i in range(0, len(addresses), chunk_size):
+        chunk = addresses[i:i + chunk_size]
+        calls = [
+            (Web3.to_checksum_address(addr), selector)
+            for addr in chunk
+            for selector in METADATA_SELECTORS.values()
+        ]
+        results = None
+        if _endpoint_key(w3) not in _no_multicall:
+            try:
+                results = _aggregate3(w3, calls)
+            except Exception as e:
+                logger.warning("aggregate3 failed for %s tokens, falling back to single calls -> %s", len(chunk), e)
+        if results is None:
+            for addr in chunk:
+                out[addr] = decode_erc20_metadata(w3, addr)
+            continue
+
+        fields = list(METADATA_SELECTORS)
+        for j, addr in enumerate(chunk):
+            per_token = results[j * len(fields):(j + 1) * len(fields)]
+            out[addr] = _metadata_from_results(dict(zip(fields, per_token)))
+
+    return out
 
-    return metadata
+
+def decode_erc20_metadata(w3: Web3, token_address: str):
+    """
+    Fetches ERC20 token metadata: name, symbol, decimals.
+    Returns dict {name, symbol, decimals, failed}
+    Falls back to safe defaults if call fails,
+    `failed` lists the fields whose call failed.
+    name / symbol may be `string` or `bytes32`.
+    """
+
+    token_address = Web3.to_checksum_address(token_address)
+
+    results = {}
+    for field, selector in METADATA_SELECTORS.items():
+        try:
+            results[field] = (True, w3.eth.call({"to": token_address, "data": Web3.to_hex(selector)}))
+        except Exception:
+            results[field] = (False, b"")
+
+    return _metadata_from_results(results)
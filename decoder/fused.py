@@ -0,0 +1,133 @@
+# decoder/fused.py
+import asyncio
+import json
+import os
+from decimal import Decimal
+from decoder.transform import decode_blocks_projected, decode_transactions_projected, decode_logs_projected
+from decoder.token_utils import resolve_tokens
+from decoder.util import ERC20_TRANSFER_TOPIC
+from utils.helpers import normalize
+from utils.logger import logger
+
+"""
+Fused ingest + decode: freshly fetched blocks are decoded in memory
+instead of being read back from raw_*.
+
+The build_raw_rows dicts (ingestion/raw_rows.py) are projected to the
+exact tuples Database_Operations.iter_*_fields would return after a raw
+write: values go through utils.helpers.normalize like the raw writers do,
+then get the same conversions as the SQL projection
+(->> text, ::bigint, ::numeric -> Decimal, ->'topics' JSON). The tuples
+go through the same *_projected transforms, so decoded_* rows are the
+same as with the two-stage (ingest, then decoder/main.py) path.
+
+Only web3-mode rows (build_raw_rows) can be projected, not the
+INGEST_MODE=raw passthrough payloads.
+"""
+
+FUSED_WRITE_RAW = os.getenv("FUSED_WRITE_RAW", "1") == "1"     # also keep raw_* rows
+_TRANSFER_TOPICS = (ERC20_TRANSFER_TOPIC, ERC20_TRANSFER_TOPIC[2:])
+
+
+def _text(value):
+    """raw_json->>'field'"""
+    value = normalize(value)
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def _bigint(value):
+    """(raw_json->>'field')::bigint"""
+    value = _text(value)
+    return None if value is None else int(value)
+
+
+def _numeric(value):
+    """(raw_json->>'field')::numeric"""
+    value = _text(value)
+    return None if value is None else Decimal(value)
+
+
+def project_block(block_row):
+    """raw_blocks row -> iter_block_fields tuple"""
+    block_number, _, block = block_row
+    return (
+        block_number,
+        _bigint(block.get("timestamp")),
+        _text(block.get("miner")),
+        _bigint(block.get("gasUsed")),
+        _bigint(block.get("gasLimit")),
+        _numeric(block.get("baseFeePerGas")),
+    )
+
+
+def project_txs(tx_rows, receipt_rows):
+    """raw_transactions + raw_receipts rows -> iter_tx_fields tuples (joined on tx_hash)"""
+    gas_used = {tx_hash: receipt.get("gasUsed") for tx_hash, _, receipt in receipt_rows}
+    return [
+        (
+            tx_hash,
+            block_number,
+            _text(tx.get("from")),
+            _text(tx.get("to")),
+            _numeric(tx.get("value")),
+            _numeric(tx.get("gasPrice")),
+            _bigint(gas_used[tx_hash]),
+            _text(tx.get("input")),
+        )
+        for tx_hash, block_number, tx in tx_rows if tx_hash in gas_used
+    ]
+
+
+def project_logs(log_rows):
+    """raw_logs rows -> iter_log_fields tuples"""
+    return [
+        (tx_hash, block_number, log_index, _text(lg.get("address")), normalize(lg.get("topics")), _text(lg.get("data")))
+        for tx_hash, block_number, log_index, lg in log_rows
+    ]
+
+
+def decode_fetched(items, w3):
+    """Function to decode build_raw_rows dicts of several blocks in one pass
+
+    Args:
+        items (list): build_raw_rows outputs (any block order)
+        w3 (Web3): client for token metadata lookups
+
+    Returns:
+        dict: {"blocks", "txs", "logs"} decoded counts
+    """
+    items = sorted((d for d in items if d), key=lambda d: d["block"][0])
+    block_rows = [project_block(d["block"]) for d in items]
+    tx_rows = [t for d in items for t in project_txs(d["tx"], d["receipt"])]
+    log_rows = sorted((lg for d in items for lg in project_logs(d["logs"])), key=lambda r: (r[1], r[2]))
+
+    # token metadata of the batch first, like resolve_tokens_for_range in the two-stage path
+    resolve_tokens(w3, {r[3].lower() for r in log_rows
+                        if r[3] and r[4] and r[4][0] in _TRANSFER_TOPICS})
+
+    counts = {
+        "blocks": decode_blocks_projected(block_rows),
+        "txs": decode_transactions_projected(tx_rows),
+        "logs": decode_logs_projected(log_rows, w3),
+    }
+    logger.debug("Fused decode of %s blocks: %s", len(items), counts)
+    return counts
+
+
+def write_fused(db, items, w3, write_raw=FUSED_WRITE_RAW):
+    """Function to write raw rows (optional) and decoded rows of fetched blocks"""
+    if write_raw:
+        db.insert_blocks_data([d["block"] for d in items])
+        db.insert_txs_data([r for d in items for r in d["tx"]])
+        db.insert_receipts_data([r for d in items for r in d["receipt"]])
+        db.insert_logs_data([r for d in items for r in d["logs"]])
+    return decode_fetched(items, w3)
+
+
+def fused_writer(w3, write_raw=FUSED_WRITE_RAW):
+    """writer(db, items) coroutine for the async engine / BlockListener"""
+    async def write(db, items):
+        await asyncio.to_thread(write_fused, db, items, w3, write_raw)
+    return write
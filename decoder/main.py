@@ -3,63 +3,190 @@ import os
 
 # Add the project root directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor
+import db.connection as db_connection
+import utils.rate_limit as rate_limit
 from db.db_operations import Database_Operations
 from utils.logger import logger
-from decoder.transform import decode_blocks, decode_transactions, decode_logs
+from decoder.transform import decode_blocks_projected, decode_transactions_projected, decode_logs_projected
+from decoder.token_utils import prefetch_tokens_for_range, resolve_tokens_for_range, resolve_tokens, token_cache_stats
 from utils.helpers import connect_to_rpc
+from db.checkpoints import CheckpointStore, run_stage
+from db.segment_archive import SegmentArchive
 
 """
 Runner orchestrates decoding for a block range.
 It:
-- queries raw_blocks / raw_transactions / raw_receipts / raw_logs for a block range
-- passes batches to the transform functions
+- streams raw_blocks / raw_transactions / raw_receipts / raw_logs for a block range
+  through server-side cursors (one query per table, bounded memory)
+- only the JSON fields the transforms use are projected out in SQL
+- warms the token cache with every known token of the range (one query)
+  and resolves new tokens in Multicall3 batches
+- passes the row streams to the transform functions
+- with RESUME only block ranges without a "decode" checkpoint (and already
+  ingested) are decoded, failed batches are retried with backoff (db/checkpoints.py)
+- with DECODE_WORKERS > 1 the range is cut into DECODE_SHARD_BLOCKS shards
+  decoded in a process pool (decoding is CPU bound: JSON, hex, checksums),
+  every worker with its own DB pool, RPC client and a CU limiter of
+  RPC_CU_PER_SECOND / workers (together they stay within the plan)
+- with DECODE_SOURCE=archive raw rows are replayed from the local segment
+  archive (db/segment_archive.py) instead of the raw tables, and the decode
+  checkpoints take their boundary hashes from it
 """
 
-BATCH_BLOCKS = 2 # number of blocks to decode per loop
+BATCH_BLOCKS = 10_000 # number of blocks to decode per loop
+RESUME = os.getenv("RESUME", "1") == "1"    # skip ranges with a decode checkpoint
+DECODE_WORKERS = int(os.getenv("DECODE_WORKERS", 1))                # decoder processes, 1 -> in process
+DECODE_SHARD_BLOCKS = int(os.getenv("DECODE_SHARD_BLOCKS", 1000))   # blocks per shard (and checkpoint)
+WORKER_DB_CONNS = 2     # a streaming cursor + the decoded_* inserts
+DECODE_SOURCE = os.getenv("DECODE_SOURCE", "db")     # "db" -> raw tables, "archive" -> segment archive
 db_help = Database_Operations()
 
+_worker_w3 = None           # RPC client of a decoder worker process
+_worker_source = None       # raw row source of a decoder worker process
+_inherited_pool = None      # parent's DB pool, kept referenced so its sockets are never closed by a child
 
-def run_decoder_for_range(start_block, end_block):
-    """Function to decode all the data from the raw table"""
-    w3 = connect_to_rpc()       # connecting to alchemy 
+
+def open_source():
+    """Raw row source selected by DECODE_SOURCE"""
+    return SegmentArchive() if DECODE_SOURCE == "archive" else db_help
+
+
+def checkpoint_store(source=None):
+    """Decode checkpoint store, hashing against the archive when it is the source (no raw tables then)"""
+    if DECODE_SOURCE != "archive":
+        return CheckpointStore()
+    return CheckpointStore(hash_source=source if source is not None else open_source())
+
+
+def run_decoder_for_range(start_block, end_block, w3=None, source=None):
+    """Function to decode all the data from the raw table (or `source`, e.g. a SegmentArchive),
+    returns True on success"""
+    w3 = w3 or connect_to_rpc()       # connecting to alchemy
+    source = db_help if source is None else source
     t0 = time.time()
     logger.info("Decoding blocks %s → %s", start_block, end_block)
 
     try:
         # decode blocks
-        block_rows = db_help.fetch_raw_block_rows(start_block, end_block)
-        if not block_rows:
+        if not decode_blocks_projected(source.iter_block_fields(start_block, end_block)):
             logger.warning("Empty blocks found while decoding")
-            return None
-        decode_blocks(block_rows)
+            return False
 
         # decode txs (& joining receipts)
-        trans_receipt_data = db_help.fetch_raw_tx_receipt_pairs(start_block, end_block)
-        if not trans_receipt_data:
+        if not decode_transactions_projected(source.iter_tx_fields(start_block, end_block)):
             logger.warning("Tranx and receipt data not found for recoding")
-            return None
-        decode_transactions(trans_receipt_data)
+            return True
 
-        # decode logs (events + erc20)
-        log_rows = db_help.fetch_raw_logs(start_block, end_block)
-        if not log_rows:
+        # decode logs (events + erc20), token metadata of the range preloaded
+        if isinstance(source, SegmentArchive):
+            resolve_tokens(w3, source.transfer_token_addresses(start_block, end_block))
+        else:
+            prefetch_tokens_for_range(start_block, end_block)
+            resolve_tokens_for_range(w3, start_block, end_block)
+        if not decode_logs_projected(source.iter_log_fields(start_block, end_block), w3):
             logger.warning("Empty logs found from DB")
-            return None
-        decode_logs(log_rows, w3)
+            return True
 
         logger.info("Decoded %s → %s in %s s", start_block, end_block, (time.time() - t0))
+        logger.info("Token cache: %s", token_cache_stats())
+        return True
     except Exception as e:
         logger.error("Error occured while decoding : %s to %s -> %s", start_block, end_block, e)
+        return False
+
+
+def _init_worker(workers=1):
+    """Process pool initializer: own DB pool, CU limiter & RPC client for every decoder worker"""
+    global _worker_w3, _worker_source, _inherited_pool
+    # a forked worker must not touch the parent's connections (same sockets),
+    # nor close them when the old pool gets garbage collected
+    _inherited_pool = db_connection._pool
+    db_connection._pool = db_connection.ConnectionPool(minconn=1, maxconn=WORKER_DB_CONNS)
+    # nor spend the whole plan: the forked limiter runs at the full RPC_CU_PER_SECOND
+    rate_limit.reset_shared_limiter(rate_limit.RPC_CU_PER_SECOND / workers)
+    _worker_w3 = connect_to_rpc()
+    _worker_source = open_source()
+
+
+def _decode_shard(start_block, end_block):
+    """Decode one shard inside a worker, returns (ok, seconds)"""
+    t0 = time.time()
+    ok = run_decoder_for_range(start_block, end_block, w3=_worker_w3, source=_worker_source)
+    return ok, time.time() - t0
+
+
+class ShardProgress():
+    """Class to log shard completion, throughput and ETA of a parallel decode"""
+
+    def __init__(self, total_blocks, total_shards):
+        self.total_blocks = total_blocks
+        self.total_shards = total_shards
+        self.done_blocks = 0
+        self.done_shards = 0
+        self.failed_shards = 0
+        self.t0 = time.time()
+        self._lock = threading.Lock()
+
+    def update(self, start_block, end_block, ok, seconds):
+        with self._lock:
+            if ok:
+                self.done_blocks += end_block - start_block + 1
+                self.done_shards += 1
+            else:
+                self.failed_shards += 1
+            elapsed = time.time() - self.t0
+            rate = self.done_blocks / elapsed if elapsed else 0.0
+            eta = (self.total_blocks - self.done_blocks) / rate if rate else float("inf")
+            logger.info("[DECODER] shard %s → %s %s in %.2fs | %s/%s shards, %s/%s blocks, "
+                        "%.0f blocks/s, ETA %.0fs",
+                        start_block, end_block, "done" if ok else "FAILED", seconds,
+                        self.done_shards, self.total_shards, self.done_blocks, self.total_blocks, rate, eta)
+
+
+def run_parallel_decoder(start_block, end_block, workers=DECODE_WORKERS, shard_blocks=DECODE_SHARD_BLOCKS,
+                         resume=RESUME):
+    """Function to decode a block range in shards on `workers` processes
+
+    Shards go through the "decode" checkpoints (db/checkpoints.run_stage),
+    so decoded shards are skipped on a re-run and failed ones are retried.
+
+    Returns:
+        dict: run_stage stats
+    """
+    blocks = end_block - start_block + 1
+    progress = ShardProgress(blocks, -(-blocks // shard_blocks))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(workers,)) as pool:
+
+        def process(shard_start, shard_end):
+            ok, seconds = pool.submit(_decode_shard, shard_start, shard_end).result()
+            progress.update(shard_start, shard_end, ok, seconds)
+            return ok
+
+        # one thread per worker hands shards to the pool and records checkpoints
+        stats = run_stage("decode", start_block, end_block, process, shard_blocks, store=checkpoint_store(),
+                          workers=workers, resume=resume, within="ingest" if DECODE_SOURCE == "db" else None)
+    logger.info("[DECODER] %s workers: %s blocks in %.2fs", workers, progress.done_blocks, stats["seconds"])
+    return stats
 
 if __name__ == "__main__":
 
     START_BLOCK = 23700776
     END_BLOCK = 23700780
 
-    # running the decoding block in batches 
-    bulk = START_BLOCK
-    while bulk <= END_BLOCK:
-        end = min(bulk + BATCH_BLOCKS - 1, END_BLOCK)
-        run_decoder_for_range(bulk, end)
-        bulk = end + 1
+    # running the decoding block in batches, only what is ingested & not decoded yet
+    if DECODE_WORKERS > 1:
+        run_parallel_decoder(START_BLOCK, END_BLOCK)
+    elif DECODE_SOURCE == "archive":
+        # the archive index tells what is ingested
+        w3, source = connect_to_rpc(), open_source()
+        store = checkpoint_store(source)
+        for s, e in source.archived_ranges(START_BLOCK, END_BLOCK):
+            run_stage("decode", s, e, lambda s, e: run_decoder_for_range(s, e, w3, source),
+                      BATCH_BLOCKS, store=store, resume=RESUME)
+    else:
+        w3 = connect_to_rpc()
+        run_stage("decode", START_BLOCK, END_BLOCK, lambda s, e: run_decoder_for_range(s, e, w3),
+                  BATCH_BLOCKS, resume=RESUME, within="ingest")
@@ -1,8 +1,22 @@
 # decoder/token_utils.py
 from web3 import Web3
-from db.connection import get_conn, release_conn
-from decoder.decode import decode_erc20_metadata  # your existing function
-from datetime import datetime
+from db.connection import connection
+from db.token_cache import token_cache
+from decoder.decode import decode_erc20_metadata, decode_erc20_metadata_batch
+from db.raw_compact import log_addresses_query
+from datetime import datetime, timezone
+from utils.logger import logger
+
+"""
+Tiered token metadata lookup:
+  1. in-process LRU (db/token_cache.py), incl. negative entries
+  2. tokens table
+  3. on-chain metadata calls (decode_erc20_metadata), result saved to 1 + 2
+resolve_tokens / resolve_tokens_for_range do step 3 for many tokens at once
+through Multicall3 (decode_erc20_metadata_batch).
+"""
+
+UNKNOWN_TOKEN = ("UNK", 18)
 
 def get_token_from_db(session_cursor, token_address):
     session_cursor.execute("SELECT symbol, decimals FROM tokens WHERE address = %s", (token_address.lower(),))
@@ -12,39 +26,134 @@ def get_token_from_db(session_cursor, token_address):
 def insert_token_to_db(session_cursor, token_address, symbol, decimals, name=None):
     session_cursor.execute(
         "INSERT INTO tokens(address, symbol, decimals, name, first_seen) VALUES (%s,%s,%s,%s,%s) ON CONFLICT (address) DO NOTHING",
-        (token_address.lower(), symbol, decimals, name, datetime())
+        (token_address.lower(), symbol, decimals, name, datetime.now(timezone.utc))
     )
 
+def prefetch_tokens(addresses):
+    """
+    Load metadata of all given addresses from the tokens table
+    into the in-process cache with one query.
+    Returns number of tokens found.
+    """
+    missing = list({a.lower() for a in addresses if a and a.lower() not in token_cache})
+    if not missing:
+        return 0
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT address, symbol, decimals FROM tokens WHERE address = ANY(%s)", (missing,))
+        rows = [(r[0], r[1], int(r[2])) for r in cur.fetchall()]
+    token_cache.set_many(rows)
+    return len(rows)
+
+def prefetch_tokens_for_range(start_block, end_block):
+    """
+    Load metadata of every contract emitting logs in a block range
+    (one query joining raw_logs and tokens). Returns number of tokens found.
+    """
+    addresses_sql, params = log_addresses_query()
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT t.address, t.symbol, t.decimals
+            FROM tokens t
+            WHERE t.address IN ({addresses_sql})
+        """, (start_block, end_block) + params)
+        rows = [(r[0], r[1], int(r[2])) for r in cur.fetchall()]
+    token_cache.set_many(rows)
+    logger.info("Prefetched %s tokens for %s → %s", len(rows), start_block, end_block)
+    return len(rows)
+
+def _store_metadata(cur, token_address, meta):
+    """
+    Save on-chain metadata to tokens table + cache.
+    Returns (symbol, decimals), or None when the contract is not an ERC-20
+    (symbol and decimals calls both failed) which is only cached negatively.
+    """
+    failed = meta.get("failed") or []
+    if "symbol" in failed and "decimals" in failed:
+        # not an ERC-20 (or calls revert): don't ask again for a while
+        token_cache.set_negative(token_address)
+        return None
+
+    symbol = meta.get("symbol") or "UNK"
+    decimals = int(meta.get("decimals") or 18)
+    insert_token_to_db(cur, token_address, symbol, decimals, meta.get("name"))
+    token_cache.set(token_address, symbol, decimals)
+    return symbol, decimals
+
+def resolve_tokens(w3, addresses, chunk_size=None):
+    """
+    Make sure metadata of all addresses is cached: loads known tokens
+    from the tokens table, resolves the rest with batched Multicall3
+    calls and saves them. Returns number of tokens resolved on-chain.
+    """
+    prefetch_tokens(addresses)
+    unknown = [
+        a for a in {a.lower() for a in addresses if a}
+        if a not in token_cache and not token_cache.is_negative(a)
+    ]
+    if not unknown:
+        return 0
+
+    token_cache.count("rpc_lookups")
+    metadata = decode_erc20_metadata_batch(w3, unknown, chunk_size=chunk_size)
+    with connection() as conn:
+        cur = conn.cursor()
+        for addr, meta in metadata.items():
+            _store_metadata(cur, addr, meta)
+        conn.commit()
+    logger.info("Resolved metadata of %s new tokens", len(metadata))
+    return len(metadata)
+
+def resolve_tokens_for_range(w3, start_block, end_block, chunk_size=None):
+    """
+    resolve_tokens for every contract emitting Transfer logs in a block range
+    """
+    addresses_sql, params = log_addresses_query(transfers_only=True)
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(addresses_sql, (start_block, end_block) + params)
+        addresses = [r[0] for r in cur.fetchall()]
+    return resolve_tokens(w3, addresses, chunk_size=chunk_size)
+
+def token_cache_stats():
+    """Hit / miss counters of the token metadata cache"""
+    return token_cache.get_stats()
+
 def get_or_create_token(w3, token_address):
     """
     Returns (symbol, decimals).
-    Uses DB tokens table as cache, falls back to on-chain calls (decode_erc20_metadata),
-    and inserts metadata into tokens table.
+    Uses in-process cache, then DB tokens table, falls back to on-chain
+    calls (decode_erc20_metadata), and inserts metadata into tokens table.
     """
+    cached = token_cache.get(token_address)
+    if cached is not None:
+        return cached
+    if token_cache.is_negative(token_address):
+        return UNKNOWN_TOKEN
+
     addr_chain = Web3.to_checksum_address(token_address)
     db_addr = token_address.lower()
 
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        row = get_token_from_db(cur, db_addr)
-        if row:
-            return row[0], int(row[1])
-
-        # fetch metadata from chain (best-effort)
-        meta = decode_erc20_metadata(w3, addr_chain)
-        symbol = meta.get("symbol") or "UNK"
-        decimals = int(meta.get("decimals") or 18)
-        name = meta.get("name")
-        insert_token_to_db(cur, db_addr, symbol, decimals, name)
-        conn.commit()
-        return symbol, decimals
-    except Exception:
-        # on any failure fallback
+    with connection() as conn:
+        cur = conn.cursor()
         try:
-            conn.rollback()
+            row = get_token_from_db(cur, db_addr)
+            if row:
+                token_cache.count("db_hits")
+                token_cache.set(db_addr, row[0], int(row[1]))
+                return row[0], int(row[1])
+
+            # fetch metadata from chain (best-effort)
+            token_cache.count("rpc_lookups")
+            meta = decode_erc20_metadata(w3, addr_chain)
+            token = _store_metadata(cur, db_addr, meta)
+            conn.commit()
+            return token or UNKNOWN_TOKEN
         except Exception:
-            pass
-        return "UNK", 18
-    finally:
-        release_conn(conn)
+            # on any failure fallback
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            return UNKNOWN_TOKEN
@@ -1,25 +1,60 @@
 # decoder/transform.py
 import json
+import re
 from psycopg2.extras import execute_values
 from web3 import Web3
 
 from db.db_operations import Database_Operations
-from decoder.util import json_from_raw, ERC20_TRANSFER_TOPIC, extract_address_from_topic, parse_uint_from_data
+from decoder.util import json_from_raw, ERC20_TRANSFER_TOPIC, extract_address_from_topic, parse_uint_from_data, hex_0x
 from decoder.token_utils import get_or_create_token
+from decoder.columnar import LogBatch, decode_transfers
 from utils.logger import logger
 
 db_help = Database_Operations()
 
+# decoded rows are inserted every DECODE_FLUSH_ROWS rows, so memory stays
+# bounded when the input is a streaming cursor over a large range
+DECODE_FLUSH_ROWS = 5000
+
+DECODED_BLOCKS_SQL = """
+    INSERT INTO decoded_blocks (block_number, block_timestamp, miner, gas_used, gas_limit, base_fee)
+    VALUES %s ON CONFLICT DO NOTHING
+"""
+DECODED_TXS_SQL = """
+    INSERT INTO decoded_transactions
+    (tx_hash, block_number, from_address, to_address, value_eth, gas_price, gas_used, input, method_id)
+    VALUES %s ON CONFLICT DO NOTHING
+"""
+DECODED_EVENTS_SQL = """
+    INSERT INTO decoded_events
+    (tx_hash, block_number, log_index, contract_address, event_topic, topics, data)
+    VALUES %s ON CONFLICT DO NOTHING
+"""
+DECODED_ERC20_SQL = """
+    INSERT INTO decoded_erc20_transfers
+    (tx_hash, block_number, log_index, token_address, token_symbol, token_decimals, from_address, to_address, amount_raw, amount)
+    VALUES %s ON CONFLICT DO NOTHING
+"""
+
+
+def _flush(query, rows, force=False):
+    """Insert and clear rows once DECODE_FLUSH_ROWS are buffered (or always with force)"""
+    if rows and (force or len(rows) >= DECODE_FLUSH_ROWS):
+        db_help.decoder_bulk_insertion(query, rows)
+        rows.clear()
+
 # Decode block row
 def decode_blocks(block_rows):
     """
-    block_rows: list of dicts from raw_blocks query: each with
+    block_rows: iterable of dicts from raw_blocks query: each with
       { 'block_number':..., 'raw_json': <dict> }
-    returns rows ready to insert into decoded_blocks
+    inserts decoded_blocks rows, returns number of blocks decoded
     """
+    count = 0
     try:
         results = []
         for r in block_rows:
+            count += 1
             raw = json_from_raw(r.get("raw_json"))
             block_number = r.get("block_number")
             results.append((
@@ -30,133 +65,272 @@ def decode_blocks(block_rows):
                 raw.get("gasLimit"),
                 raw.get("baseFeePerGas")
             ))
+            _flush(DECODED_BLOCKS_SQL, results)
         # insert
-        db_help.decoder_bulk_insertion("""
-            INSERT INTO decoded_blocks (block_number, block_timestamp, miner, gas_used, gas_limit, base_fee)
-            VALUES %s ON CONFLICT DO NOTHING
-        """, results)
+        _flush(DECODED_BLOCKS_SQL, results, force=True)
     except Exception as e:
         logger.error("error occured while decoding blocks -> %s", e)
+    return count
 
 
 # Decode transactions (join raw_transactions + raw_receipts)
+def _tx_row(tx_hash, bn, from_addr, to_addr, value_wei, gas_price, gas_used, tx_input):
+    """Build one decoded_transactions row"""
+    # web3 Web3.from_wei accepts ints; ensure int
+    try:
+        value_eth = Web3.from_wei(int(value_wei), "ether")
+    except Exception:
+        try:
+            value_eth = float(value_wei)
+        except Exception:
+            value_eth = 0.0
+
+    return (
+        tx_hash,
+        bn,
+        from_addr,
+        to_addr,
+        value_eth,
+        gas_price,
+        gas_used,
+        tx_input,
+        (tx_input[:10] if tx_input else None)
+    )
+
+
 # Expect input: list of tuples/dicts where you have both raw tx and its receipt
 def decode_transactions(tx_pairs):
     """
     tx_pairs: iterable of dicts { 'tx': raw_tx_row, 'receipt': raw_receipt_row }
+    returns number of transactions decoded
     """
     results = []
+    count = 0
     for pair in tx_pairs:
+        count += 1
         raw_tx = json_from_raw(pair["tx"].get("raw_json"))
         raw_receipt = json_from_raw(pair["receipt"].get("raw_json"))
-        tx_hash = pair["tx"].get("tx_hash")
-        bn = pair["tx"].get("block_number")
 
-        value_wei = raw_tx.get("value", 0)
-        # web3 Web3.from_wei accepts ints; ensure int
-        try:
-            value_eth = Web3.from_wei(int(value_wei), "ether")
-        except Exception:
-            try:
-                value_eth = float(value_wei)
-            except Exception:
-                value_eth = 0.0
-
-        results.append((
-            tx_hash,
-            bn,
+        results.append(_tx_row(
+            pair["tx"].get("tx_hash"),
+            pair["tx"].get("block_number"),
             raw_tx.get("from"),
             raw_tx.get("to"),
-            value_eth,
+            raw_tx.get("value", 0),
             raw_tx.get("gasPrice"),
             raw_receipt.get("gasUsed"),
             raw_tx.get("input"),
-            (raw_tx.get("input")[:10] if raw_tx.get("input") else None)
         ))
+        _flush(DECODED_TXS_SQL, results)
 
-    db_help.decoder_bulk_insertion("""
-        INSERT INTO decoded_transactions
-        (tx_hash, block_number, from_address, to_address, value_eth, gas_price, gas_used, input, method_id)
-        VALUES %s ON CONFLICT DO NOTHING
-    """, results)
+    _flush(DECODED_TXS_SQL, results, force=True)
+    return count
 
 
 # Decode generic logs and also produce ERC20 transfer rows
+def _event_row(tx_hash, bn, log_index, address, topics, data):
+    """Build one decoded_events row"""
+    # topics in DB might already be list of hex strings - leave as-is for storage
+    return (
+        tx_hash,
+        bn,
+        log_index,
+        address,
+        (topics[0] if len(topics) > 0 else None),
+        json.dumps([t if isinstance(t, str) else (t.hex() if hasattr(t,'hex') else str(t)) for t in topics]),
+        data
+    )
+
+
+def _erc20_row(tx_hash, bn, log_index, token_addr, from_addr, to_addr, amount_raw, symbol, decimals):
+    """Build one decoded_erc20_transfers row"""
+    amount = None
+    try:
+        amount = amount_raw / (10 ** decimals)
+    except Exception:
+        amount = amount_raw
+    return (
+        tx_hash,
+        bn,
+        log_index,
+        token_addr.lower(),
+        symbol,
+        decimals,
+        from_addr,
+        to_addr,
+        amount_raw,
+        amount
+    )
+
+
+def _decode_log(tx_hash, bn, log_index, address, topics, data, w3, events_out, erc20_out):
+    """Append the decoded_events row (and decoded_erc20_transfers row for a Transfer) of one log"""
+    # normalize topics: may be list of hex strings or bytes
+    topics = topics or []
+    events_out.append(_event_row(tx_hash, bn, log_index, address, topics, data))
+
+    # Check ERC20 transfer by topic equality
+    t0 = None
+    if len(topics) > 0:
+        t0 = topics[0]
+        if not isinstance(t0, str) and hasattr(t0, "hex"):
+            t0 = t0.hex()
+        if isinstance(t0, str):
+            t0 = hex_0x(t0.lower())
+
+    if t0 == ERC20_TRANSFER_TOPIC:
+        # need topics[1], topics[2], data (ERC-721 Transfer has the tokenId as 4th topic)
+        if len(topics) == 3:
+            from_addr = extract_address_from_topic(topics[1])
+            to_addr = extract_address_from_topic(topics[2])
+            amount_raw = parse_uint_from_data(data)
+            # fetch token metadata (symbol, decimals)
+            symbol, decimals = get_or_create_token(w3, address)
+            erc20_out.append(_erc20_row(tx_hash, bn, log_index, address, from_addr, to_addr, amount_raw, symbol, decimals))
+
+
+_HEX_CHARS = re.compile(r"[0-9a-fA-Fx]*")
+
+def _topics_json(topics):
+    """json.dumps of a topic list, built directly for plain hex strings"""
+    if all(isinstance(t, str) for t in topics):
+        flat = "".join(topics)
+        if _HEX_CHARS.fullmatch(flat):
+            return '["' + '", "'.join(topics) + '"]' if topics else "[]"
+        return json.dumps(topics)
+    return json.dumps([t if isinstance(t, str) else (t.hex() if hasattr(t,'hex') else str(t)) for t in topics])
+
+
+def _decode_log_batch(batch, w3, events_out, erc20_out):
+    """
+    Columnar version of _decode_log for a whole LogBatch:
+    Transfers are filtered / sliced per column (decoder/columnar.py),
+    token metadata is looked up once per distinct token of the batch
+    """
+    for tx_hash, bn, log_index, address, topics, data in zip(
+            batch.tx_hash, batch.block_number, batch.log_index, batch.address, batch.topics, batch.data):
+        events_out.append((
+            tx_hash, bn, log_index, address,
+            (topics[0] if len(topics) > 0 else None),
+            _topics_json(topics),
+            data
+        ))
+
+    tokens = {}
+    for i, from_addr, to_addr, amount_raw in zip(*decode_transfers(batch)):
+        address = batch.address[i]
+        token = tokens.get(address)
+        if token is None:
+            token = tokens[address] = get_or_create_token(w3, address)
+        erc20_out.append(_erc20_row(batch.tx_hash[i], batch.block_number[i], batch.log_index[i],
+                                    address, from_addr, to_addr, amount_raw, *token))
+
+
 def decode_logs(log_rows, w3):
     """
-    log_rows: list of rows from raw_logs query, each dict { 'tx_hash', 'block_number', 'log_index', 'raw_json' }
+    log_rows: iterable of rows from raw_logs query, each dict { 'tx_hash', 'block_number', 'log_index', 'raw_json' }
     w3: Web3 instance for calls
+    returns number of logs decoded
     """
     events_out = []
     erc20_out = []
+    count = 0
     
     try:
         for lr in log_rows:
-            tx_hash = lr.get("tx_hash")
-            bn = lr.get("block_number")
-            log_index = lr.get("log_index")
+            count += 1
             raw = json_from_raw(lr.get("raw_json"))
+            _decode_log(lr.get("tx_hash"), lr.get("block_number"), lr.get("log_index"),
+                        raw.get("address"), raw.get("topics"), raw.get("data"),
+                        w3, events_out, erc20_out)
 
-            # normalize topics: may be list of hex strings or bytes
-            topics = raw.get("topics") or []
-            # topics in DB might already be list of hex strings - leave as-is for storage
-            events_out.append((
-                tx_hash,
-                bn,
-                log_index,
-                raw.get("address"),
-                (topics[0] if len(topics) > 0 else None),
-                json.dumps([t if isinstance(t, str) else (t.hex() if hasattr(t,'hex') else str(t)) for t in topics]),
-                raw.get("data")
-            ))
-
-            # Check ERC20 transfer by topic equality
-            t0 = None
-            if len(topics) > 0:
-                t0 = topics[0]
-                if not isinstance(t0, str) and hasattr(t0, "hex"):
-                    t0 = t0.hex()
-                if isinstance(t0, str):
-                    t0 = t0.lower()
-
-            if t0 == ERC20_TRANSFER_TOPIC:
-                # need topics[1], topics[2], data
-                if len(topics) >= 3:
-                    from_addr = extract_address_from_topic(topics[1])
-                    to_addr = extract_address_from_topic(topics[2])
-                    amount_raw = parse_uint_from_data(raw.get("data"))
-                    token_addr = raw.get("address")
-                    # fetch token metadata (symbol, decimals)
-                    symbol, decimals = get_or_create_token(w3, token_addr)
-                    amount = None
-                    try:
-                        amount = amount_raw / (10 ** decimals)
-                    except Exception:
-                        amount = amount_raw
-                    erc20_out.append((
-                        tx_hash,
-                        bn,
-                        log_index,
-                        token_addr.lower(),
-                        symbol,
-                        decimals,
-                        from_addr,
-                        to_addr,
-                        amount_raw,
-                        amount
-                    ))
+            _flush(DECODED_EVENTS_SQL, events_out)
+            _flush(DECODED_ERC20_SQL, erc20_out)
 
         # bulk insert events & erc20 transfers
-        db_help.decoder_bulk_insertion("""
-            INSERT INTO decoded_events
-            (tx_hash, block_number, log_index, contract_address, event_topic, topics, data)
-            VALUES %s ON CONFLICT DO NOTHING
-        """, events_out)
-
-        db_help.decoder_bulk_insertion("""
-            INSERT INTO decoded_erc20_transfers
-            (tx_hash, block_number, log_index, token_address, token_symbol, token_decimals, from_address, to_address, amount_raw, amount)
-            VALUES %s ON CONFLICT DO NOTHING
-        """, erc20_out)
+        _flush(DECODED_EVENTS_SQL, events_out, force=True)
+        _flush(DECODED_ERC20_SQL, erc20_out, force=True)
+    except Exception as e:
+        logger.error("error occured while decoding logs -> %s", e)
+    return count
+
+
+# ---------------------------------------------------------------------
+# Projected variants: rows come from Database_Operations.iter_*_fields,
+# which only ship the JSON fields used above (raw_json->>'field').
+# A failed decode / insert is logged and raised, so the range is not
+# checkpointed as decoded (run_decoder_for_range returns False)
+# ---------------------------------------------------------------------
+def decode_blocks_projected(block_rows):
+    """
+    block_rows: iterable of (block_number, timestamp, miner, gas_used, gas_limit, base_fee)
+    which already is the decoded_blocks row. Returns number of blocks decoded.
+    """
+    count = 0
+    try:
+        results = []
+        for r in block_rows:
+            count += 1
+            results.append(r)
+            _flush(DECODED_BLOCKS_SQL, results)
+        _flush(DECODED_BLOCKS_SQL, results, force=True)
+    except Exception as e:
+        logger.error("error occured while decoding blocks -> %s", e)
+        raise
+    return count
+
+
+def decode_transactions_projected(tx_rows):
+    """
+    tx_rows: iterable of (tx_hash, block_number, from, to, value_wei, gas_price, receipt_gas_used, input)
+    returns number of transactions decoded
+    """
+    results = []
+    count = 0
+    try:
+        for r in tx_rows:
+            count += 1
+            results.append(_tx_row(*r))
+            _flush(DECODED_TXS_SQL, results)
+
+        _flush(DECODED_TXS_SQL, results, force=True)
+    except Exception as e:
+        logger.error("error occured while decoding transactions -> %s", e)
+        raise
+    return count
+
+
+def _chunks(rows, size):
+    chunk = []
+    for r in rows:
+        chunk.append(r)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def decode_logs_projected(log_rows, w3):
+    """
+    log_rows: iterable of (tx_hash, block_number, log_index, address, topics, data)
+    decoded in columnar batches of DECODE_FLUSH_ROWS logs
+    returns number of logs decoded
+    """
+    events_out = []
+    erc20_out = []
+    count = 0
+
+    try:
+        for chunk in _chunks(log_rows, DECODE_FLUSH_ROWS):
+            count += len(chunk)
+            _decode_log_batch(LogBatch.from_rows(chunk), w3, events_out, erc20_out)
+            _flush(DECODED_EVENTS_SQL, events_out)
+            _flush(DECODED_ERC20_SQL, erc20_out)
+
+        _flush(DECODED_EVENTS_SQL, events_out, force=True)
+        _flush(DECODED_ERC20_SQL, erc20_out, force=True)
     except Exception as e:
         logger.error("error occured while decoding logs -> %s", e)
+        raise
+    return count
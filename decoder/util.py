@@ -1,9 +1,11 @@
 # decoder/utils.py
 import json
+from functools import lru_cache
 from hexbytes import HexBytes
 from web3 import Web3
 
-ERC20_TRANSFER_TOPIC = Web3.keccak(text="Transfer(address,address,uint256)").hex().lower()
+# always 0x-prefixed, whatever HexBytes.hex() returns in the installed version
+ERC20_TRANSFER_TOPIC = Web3.to_hex(Web3.keccak(text="Transfer(address,address,uint256)")).lower()
 
 def normalize_value(value):
     """Recursively normalize Web3 types to JSON-serializable."""
@@ -26,6 +28,17 @@ def json_from_raw(raw):
     # if it's already a dict (psycopg2 JSONB -> dict)
     return raw
 
+@lru_cache(maxsize=200_000)
+def checksum_address(addr):
+    """
+    Memoized Web3.to_checksum_address (one keccak per distinct address),
+    returns lowercase address if it is not a valid address.
+    """
+    try:
+        return Web3.to_checksum_address(addr)
+    except Exception:
+        return addr.lower()
+
 def extract_address_from_topic(topic_hex):
     """Get address (0x...) from topic hex string or bytes (topic contains 32-byte padded address)."""
     if topic_hex is None:
@@ -37,15 +50,16 @@ def extract_address_from_topic(topic_hex):
         if hexstr.startswith("0x"):
             hexstr = hexstr[2:]
     # last 40 hex chars are address
-    addr = "0x" + hexstr[-40:]
-    try:
-        return Web3.to_checksum_address(addr)
-    except Exception:
-        # fallback return lowercase
-        return addr.lower()
+    return checksum_address("0x" + hexstr[-40:].lower())
+
+def hex_0x(value):
+    """Return hex string with 0x prefix (raw payloads have it, normalized HexBytes may not)."""
+    if isinstance(value, str) and not value.startswith("0x"):
+        return "0x" + value
+    return value
 
 def parse_uint_from_data(data: str):
-    if data is None:
+    if data is None or data in ("", "0x"):
         return None
     if data.startswith("0x"):
         return int(data, 16)
@@ -1,14 +1,13 @@
 
-from web3 import Web3
 import json
 from dotenv import load_dotenv
-import os
 load_dotenv()
+from utils.helpers import connect_to_rpc
 
-alchemy_url = os.getenv('ALCHEMY_RPC_URL') 
-web3 = Web3(Web3.HTTPProvider(alchemy_url))
+web3 = connect_to_rpc()     # ALCHEMY_RPC_URL or the RPC_URLS pool
 
 print("Connected:", web3.is_connected())
+print("Endpoints:", web3.provider.pool.stats())
 
 # latest_block = web3.eth.get_block('latest')
 # with open("raw_block.json", "w") as f:
@@ -0,0 +1,201 @@
+# ingestion/async_engine.py
+import asyncio
+import os
+import time
+from web3.exceptions import MethodNotSupported, MethodUnavailable, Web3RPCError
+from utils.logger import logger
+from utils.helpers import connect_to_rpc_async
+from ingestion.raw_rows import build_raw_rows
+from ingestion.receipts import is_method_missing, RECEIPT_BATCH_SIZE
+
+"""
+Asyncio ingestion engine.
+
+- BLOCK_CONCURRENCY blocks are fetched at the same time (block semaphore)
+- at most RECEIPT_CONCURRENCY receipt requests are in flight (receipt semaphore)
+- fetched blocks go through a bounded queue (QUEUE_SIZE) to a single writer
+  which flushes WRITE_BATCH_BLOCKS blocks at a time with the
+  Database_Operations.insert_*_data writers, so a slow DB slows the fetchers
+  down instead of growing memory.
+- `writer` replaces the raw insert, e.g. decoder/fused.write_fused to
+  decode the fetched blocks in the same pass
+- its own client comes from utils.helpers.connect_to_rpc_async: finalized
+  blocks / receipts are read from the RPC cache (RPC_CACHE=offline replays
+  a cached range without any RPC call)
+"""
+
+BLOCK_CONCURRENCY = int(os.getenv("BLOCK_CONCURRENCY", 8))
+RECEIPT_CONCURRENCY = int(os.getenv("RECEIPT_CONCURRENCY", 16))
+QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 32))
+WRITE_BATCH_BLOCKS = int(os.getenv("WRITE_BATCH_BLOCKS", 20))
+
+_DONE = object()    # end of stream marker for the writer
+
+
+class AsyncBlockFetcher():
+    """Class to fetch blocks + receipts concurrently with an AsyncWeb3 client"""
+
+    def __init__(self, aw3, block_concurrency=BLOCK_CONCURRENCY, receipt_concurrency=RECEIPT_CONCURRENCY,
+                 batch_size=RECEIPT_BATCH_SIZE):
+        self.aw3 = aw3
+        self.block_sem = asyncio.Semaphore(block_concurrency)
+        self.receipt_sem = asyncio.Semaphore(receipt_concurrency)
+        self.batch_size = batch_size
+        self.block_receipts_supported = True
+
+    async def _receipts_by_tx(self, tx_hashes):
+        """Fallback when eth_getBlockReceipts is missing: batched eth_getTransactionReceipt"""
+        async def fetch_chunk(chunk):
+            async with self.receipt_sem:
+                async with self.aw3.batch_requests() as batch:
+                    for tx_hash in chunk:
+                        batch.add(self.aw3.eth.get_transaction_receipt(tx_hash))
+                    return await batch.async_execute()
+
+        chunks = [tx_hashes[i:i + self.batch_size] for i in range(0, len(tx_hashes), self.batch_size)]
+        results = await asyncio.gather(*(fetch_chunk(c) for c in chunks))
+        return [r for chunk in results for r in chunk]
+
+    async def fetch_receipts(self, block):
+        tx_hashes = [tx["hash"] for tx in block["transactions"]]
+        if not tx_hashes:
+            return []
+
+        if self.block_receipts_supported:
+            try:
+                async with self.receipt_sem:
+                    receipts = await self.aw3.eth.get_block_receipts(block["number"])
+                if len(receipts) == len(tx_hashes):
+                    return list(receipts)
+            except (Web3RPCError, MethodUnavailable, MethodNotSupported) as e:
+                if not is_method_missing(e):
+                    raise
+                logger.warning("eth_getBlockReceipts not supported by endpoint, falling back to batch requests")
+                self.block_receipts_supported = False
+
+        return await self._receipts_by_tx(tx_hashes)
+
+    async def fetch_block(self, block_number):
+        """Function to fetch one block with full txs and its receipts"""
+        block = await self.aw3.eth.get_block(block_number, full_transactions=True)
+        receipts = await self.fetch_receipts(block)
+        return block, receipts
+
+    async def fetch(self, block_number):
+        """Function to fetch one block and return its raw rows"""
+        block, receipts = await self.fetch_block(block_number)
+        return build_raw_rows(block_number, block, receipts)
+
+
+async def insert_raw_rows(db, items):
+    """Insert the raw rows of several blocks (build_raw_rows dicts) off the event loop"""
+    blocks = [d["block"] for d in items]
+    txs = [r for d in items for r in d["tx"]]
+    receipts = [r for d in items for r in d["receipt"]]
+    logs = [r for d in items for r in d["logs"]]
+    # DB writers are blocking, keep them off the event loop
+    await asyncio.to_thread(db.insert_blocks_data, blocks)
+    await asyncio.to_thread(db.insert_txs_data, txs)
+    await asyncio.to_thread(db.insert_receipts_data, receipts)
+    await asyncio.to_thread(db.insert_logs_data, logs)
+
+
+async def _writer(queue, db, batch_blocks, stats, write=insert_raw_rows):
+    """Consume fetched blocks from the queue and flush them in batches"""
+    buffer = []
+
+    async def flush():
+        if not buffer:
+            return
+        await write(db, buffer)
+        stats["written"] += len(buffer)
+        buffer.clear()
+
+    while True:
+        item = await queue.get()
+        if item is _DONE:
+            await flush()
+            return
+        buffer.append(item)
+        if len(buffer) >= batch_blocks:
+            await flush()
+
+
+async def ingest_range_async(start_block, end_block, db, rpc_url=None, aw3=None,
+                             block_concurrency=BLOCK_CONCURRENCY, receipt_concurrency=RECEIPT_CONCURRENCY,
+                             queue_size=QUEUE_SIZE, batch_blocks=WRITE_BATCH_BLOCKS, writer=insert_raw_rows):
+    """Function to fetch & insert all blocks in [start_block, end_block]
+
+    writer(db, items) is awaited with every batch of build_raw_rows dicts
+
+    Returns:
+        dict: {"blocks", "written", "failed", "seconds"}
+    """
+    own_client = aw3 is None
+    if own_client:
+        # RPC cache, CU limiter and endpoint pool, like the sync clients
+        aw3 = connect_to_rpc_async(rpc_url)
+
+    fetcher = AsyncBlockFetcher(aw3, block_concurrency, receipt_concurrency)
+    queue = asyncio.Queue(maxsize=queue_size)
+    stats = {"blocks": end_block - start_block + 1, "written": 0, "failed": []}
+    t0 = time.time()
+
+    write_task = asyncio.create_task(_writer(queue, db, batch_blocks, stats, writer))
+
+    async def put(item):
+        """queue.put racing the writer: once it died nothing drains the queue, its error is raised instead"""
+        put_task = asyncio.ensure_future(queue.put(item))
+        await asyncio.wait({put_task, write_task}, return_when=asyncio.FIRST_COMPLETED)
+        if not put_task.done():
+            put_task.cancel()
+            write_task.result()
+            raise RuntimeError("raw writer stopped")
+        put_task.result()
+
+    async def fetch_one(block_number):
+        try:
+            try:
+                data = await fetcher.fetch(block_number)
+            except Exception as e:
+                logger.error("Error fetching block %s: %s", block_number, e)
+                stats["failed"].append(block_number)
+                return
+            await put(data)
+        finally:
+            fetcher.block_sem.release()
+
+    tasks = set()
+    try:
+        for block_number in range(start_block, end_block + 1):
+            # the semaphore bounds the number of blocks in flight
+            await fetcher.block_sem.acquire()
+            if write_task.done():
+                fetcher.block_sem.release()
+                break
+            task = asyncio.create_task(fetch_one(block_number))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.gather(*tasks)
+        await put(_DONE)
+        await write_task
+    finally:
+        # writer failed: stop the fetchers still running, the error propagates
+        for task in list(tasks):
+            task.cancel()
+        if not write_task.done():
+            write_task.cancel()
+        if own_client:
+            await aw3.provider.disconnect()
+
+    stats["seconds"] = time.time() - t0
+    logger.info("Async ingestion %s → %s: %s blocks in %.2f s (%s failed)",
+                start_block, end_block, stats["written"], stats["seconds"], len(stats["failed"]))
+    return stats
+
+
+def ingest_range(start_block, end_block, db, **kwargs):
+    """Sync entry point for the async engine"""
+    return asyncio.run(ingest_range_async(start_block, end_block, db, **kwargs))
@@ -1,40 +1,383 @@
+# ingestion/block_listener.py
 import asyncio
+import os
+import time
+from collections import deque
+from web3 import AsyncWeb3, WebSocketProvider
+from db.connection import connection
+from ingestion.async_engine import AsyncBlockFetcher, insert_raw_rows
+from ingestion.process_erc20 import handle_erc20_transfers
+from ingestion.process_eth import handle_eth_transfers
+from ingestion.raw_rows import build_raw_rows
+from utils.helpers import connect_to_rpc
 from utils.logger import logger
-from ingestion.process_eth import process_eth_transfers
-from ingestion.process_erc20 import process_erc20_logs
-from ingestion.save_data import save_block
+from utils.rate_limit import RateLimitedAsyncHTTPProvider, shared_limiter
+from utils.rpc_pool import rpc_urls
 
-POLL_INTERVAL = 4  # seconds
+"""
+Real-time block listener.
 
+    heads ──> scheduler ──fetch_q──> checker ──decode_q──> decoder ──write_q──> writer
+              (concurrent fetch       (parentHash   (build rows in   (batched DB insert,
+               tasks, in order)        / reorgs)     a thread)        latency)
 
-async def poll_blocks(w3, wallet_set):
-    """
-    Polls Ethereum blocks in real-time and streams them to processors.
-    """
-    latest = w3.eth.block_number
-    logger.info(f"[BLOCK LISTENER] Starting from block: {latest}")
+- new heads come from a newHeads WebSocket subscription (LISTENER_WS_URL);
+  without it, or while the WebSocket is down, eth_blockNumber is polled
+- up to LISTENER_CONCURRENCY blocks (+ receipts) are fetched at once with
+  AsyncWeb3, nothing blocking runs on the event loop; with several
+  RPC_URLS a request still unanswered after the endpoint's p95 latency is
+  hedged on a second endpoint (utils/rpc_pool.py)
+- every stage hands over through a bounded queue, so a slow DB stalls the
+  fetchers instead of growing memory
+- each block's parentHash is checked against the hash of the block before;
+  on a mismatch the fork point is searched (up to REORG_DEPTH blocks back),
+  the writer deletes rows from the fork point on (Database_Operations.delete_from_block)
+  and the blocks are fetched again from the new branch
+- latency (block timestamp -> rows written) is tracked per block
+- `writer` replaces the raw insert (decoder/fused.write_fused: raw and
+  decoded rows in one pass)
+- with `wallets` (WalletIndex / WalletIndexWatcher / set of addresses),
+  every written block is matched against the tracked wallets: ETH
+  transfers go to eth_transfers, ERC-20 Transfers to token_transfers
+  (handle_eth_transfers / handle_erc20_transfers on the block and receipts
+  already fetched), like the old poll_blocks did. A rollback deletes the
+  wallet rows of the dropped blocks by tx hash.
+"""
 
-    while True:
-        try:
-            new_block = w3.eth.block_number
+POLL_INTERVAL = float(os.getenv("POLL_INTERVAL", 4))                  # seconds between eth_blockNumber polls
+LISTENER_CONCURRENCY = int(os.getenv("LISTENER_CONCURRENCY", 4))      # blocks fetched at once
+LISTENER_QUEUE_SIZE = int(os.getenv("LISTENER_QUEUE_SIZE", 16))       # decode / write queue bound
+LISTENER_WRITE_BATCH = int(os.getenv("LISTENER_WRITE_BATCH", 10))     # max blocks per DB flush
+REORG_DEPTH = int(os.getenv("REORG_DEPTH", 64))                       # block hashes kept for reorg checks
+WS_RETRY_DELAY = float(os.getenv("WS_RETRY_DELAY", 15))               # seconds of polling before WS reconnect
+FETCH_RETRIES = 5
+
+_STOP = object()
+
+
+class Rollback():
+    """Queue item telling the writer to drop rows from block_number on"""
+
+    def __init__(self, block_number):
+        self.block_number = block_number
+
+
+class BlockListener():
+    """Class to stream new blocks into the raw tables, reorg aware"""
+
+    def __init__(self, db, rpc_url=None, ws_url=None, aw3=None, start_block=None,
+                 poll_interval=POLL_INTERVAL, concurrency=LISTENER_CONCURRENCY,
+                 queue_size=LISTENER_QUEUE_SIZE, write_batch=LISTENER_WRITE_BATCH,
+                 reorg_depth=REORG_DEPTH, decode=build_raw_rows, writer=insert_raw_rows,
+                 wallets=None, w3=None):
+        self.db = db
+        self.rpc_url = rpc_url or rpc_urls()
+        self.ws_url = ws_url if ws_url is not None else os.getenv("LISTENER_WS_URL")
+        self.aw3 = aw3
+        self.start_block = start_block
+        self.poll_interval = poll_interval
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.write_batch = write_batch
+        self.reorg_depth = reorg_depth
+        self.decode = decode
+        self.writer = writer
+        self.wallets = wallets
+        self.w3 = w3                # sync client of the wallet stage (token metadata)
+
+        self.head = None
+        self.next_block = None
+        self.generation = 0         # bumped on every resync, stale fetches are dropped
+        self.canonical = {}         # block number -> hash of the accepted chain
+        self.wallet_txs = {}        # block number -> tx hashes, for rolling back wallet rows
+        self.latencies = deque(maxlen=1000)
+        self.stats = {"blocks_written": 0, "reorgs": 0, "rolled_back": 0, "fetch_errors": 0,
+                      "ws_failures": 0, "wallet_errors": 0, "head_source": None,
+                      "last_written": None}
+        self._stop = None
+        self._until_block = None
+
+    # ------------------------------------------------------------------
+    # heads
+    # ------------------------------------------------------------------
+    def _set_head(self, number):
+        if self.head is None or number > self.head:
+            self.head = number
+            self._head_event.set()
+
+    async def _poll_heads(self, duration=None):
+        """Poll eth_blockNumber (for duration seconds, forever if None)"""
+        self.stats["head_source"] = "poll"
+        deadline = None if duration is None else time.monotonic() + duration
+        while deadline is None or time.monotonic() < deadline:
+            try:
+                self._set_head(await self.aw3.eth.block_number)
+            except Exception as e:
+                logger.error("[LISTENER] eth_blockNumber failed -> %s", e)
+            await asyncio.sleep(self.poll_interval)
+
+    async def _ws_heads(self):
+        """Follow newHeads over the WebSocket until it fails"""
+        async with AsyncWeb3(WebSocketProvider(self.ws_url)) as ws3:
+            await ws3.eth.subscribe("newHeads")
+            self.stats["head_source"] = "ws"
+            logger.info("[LISTENER] subscribed to newHeads on %s", self.ws_url)
+            # catch up with anything mined while (re)connecting
+            self._set_head(await ws3.eth.block_number)
+            async for message in ws3.socket.process_subscriptions():
+                self._set_head(message["result"]["number"])
+
+    async def _heads(self):
+        while True:
+            if self.ws_url:
+                try:
+                    await self._ws_heads()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.stats["ws_failures"] += 1
+                    logger.warning("[LISTENER] newHeads subscription failed, polling for %ss -> %s",
+                                   WS_RETRY_DELAY, e)
+                await self._poll_heads(WS_RETRY_DELAY)
+            else:
+                await self._poll_heads()
+
+    # ------------------------------------------------------------------
+    # fetch + chain check
+    # ------------------------------------------------------------------
+    async def _fetch(self, block_number):
+        """Fetch block + receipts, retrying while the node has not got the block yet"""
+        for attempt in range(FETCH_RETRIES):
+            try:
+                return await self.fetcher.fetch_block(block_number)
+            except Exception as e:
+                if attempt == FETCH_RETRIES - 1:
+                    raise
+                logger.debug("[LISTENER] fetch %s failed (%s), retrying", block_number, e)
+                await asyncio.sleep(0.2 * 2 ** attempt)
 
-            if new_block > latest:
-                for bn in range(latest + 1, new_block + 1):
-                    block = w3.eth.get_block(bn, full_transactions=True)
-                    timestamp = block.timestamp
+    async def _schedule(self):
+        """Start fetch tasks in block order, at most `concurrency` ahead of the checker"""
+        while True:
+            while self.head is None or self.next_block > self.head:
+                self._head_event.clear()
+                await self._head_event.wait()
+            block_number = self.next_block
+            self.next_block += 1
+            task = asyncio.create_task(self._fetch(block_number))
+            await self.fetch_q.put((self.generation, block_number, task))
 
-                    save_block(block)
+    def _resync(self, block_number):
+        """Drop pending fetches and continue from block_number"""
+        self.generation += 1
+        self.next_block = block_number
+        for bn in [bn for bn in self.canonical if bn >= block_number]:
+            del self.canonical[bn]
+        while not self.fetch_q.empty():
+            _, _, task = self.fetch_q.get_nowait()
+            task.cancel()
+        self._head_event.set()
 
-                    for tx in block.transactions:
-                        await process_eth_transfers(w3, tx, timestamp, wallet_set)
-                        await process_erc20_logs(w3, tx.hash.hex(), timestamp, wallet_set)
+    async def _find_fork(self, block_number):
+        """Highest block <= block_number whose hash still matches the node"""
+        lowest = max(min(self.canonical, default=block_number + 1), block_number - self.reorg_depth)
+        for bn in range(block_number, lowest - 1, -1):
+            block = await self.aw3.eth.get_block(bn)
+            if block["hash"] == self.canonical.get(bn):
+                return bn
+        logger.error("[LISTENER] reorg deeper than %s blocks below %s", self.reorg_depth, block_number)
+        return lowest - 1
 
-                    logger.info(f"[BLOCK] processed {bn}")
+    async def _check(self):
+        """Await fetches in order, verify parentHash links, hand blocks to the decoder"""
+        while True:
+            generation, block_number, task = await self.fetch_q.get()
+            if generation != self.generation:
+                task.cancel()
+                continue
+            try:
+                block, receipts = await task
+            except Exception as e:
+                self.stats["fetch_errors"] += 1
+                logger.error("[LISTENER] unable to fetch block %s -> %s", block_number, e)
+                await asyncio.sleep(self.poll_interval)
+                self._resync(block_number)
+                continue
 
-                latest = new_block
+            parent = self.canonical.get(block_number - 1)
+            if parent is not None and block["parentHash"] != parent:
+                fork = await self._find_fork(block_number - 1)
+                self.stats["reorgs"] += 1
+                logger.warning("[LISTENER] reorg at %s, rolling back to %s", block_number, fork)
+                self._resync(fork + 1)
+                await self.decode_q.put(Rollback(fork + 1))
+                continue
+
+            self.canonical[block_number] = block["hash"]
+            self.canonical.pop(block_number - self.reorg_depth, None)
+            await self.decode_q.put((block_number, block, receipts))
+
+    # ------------------------------------------------------------------
+    # decode + write
+    # ------------------------------------------------------------------
+    async def _decode(self):
+        while True:
+            item = await self.decode_q.get()
+            if item is _STOP or isinstance(item, Rollback):
+                await self.write_q.put(item)
+                if item is _STOP:
+                    return
+                continue
+            block_number, block, receipts = item
+            rows = await asyncio.to_thread(self.decode, block_number, block, receipts)
+            # block + receipts ride along only for the wallet stage
+            fetched = (block, receipts) if self.wallets is not None else None
+            await self.write_q.put((block_number, block["timestamp"], rows, fetched))
+
+    # ------------------------------------------------------------------
+    # wallet matching
+    # ------------------------------------------------------------------
+    def _match_wallets(self, written):
+        """Function to save the tracked wallets' ETH / ERC-20 transfers of written blocks"""
+        for block_number, _, _, (block, receipts) in written:
+            with connection() as conn:
+                cur = conn.cursor()
+                try:
+                    handle_eth_transfers(self.w3, block, cur, self.wallets)
+                    handle_erc20_transfers(self.w3, block, cur, self.wallets, receipts=receipts)
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    self.stats["wallet_errors"] += 1
+                    logger.error("[LISTENER] wallet matching of block %s failed -> %s", block_number, e)
+            self.wallet_txs[block_number] = [tx.hash.hex() for tx in block.transactions]
+            self.wallet_txs.pop(block_number - self.reorg_depth, None)
+
+    def _rollback_wallets(self, block_number):
+        """Function to delete the wallet rows of blocks >= block_number"""
+        tx_hashes = []
+        for bn in [bn for bn in self.wallet_txs if bn >= block_number]:
+            tx_hashes += self.wallet_txs.pop(bn)
+        if not tx_hashes:
+            return
+        with connection() as conn:
+            cur = conn.cursor()
+            for table in ("eth_transfers", "token_transfers"):
+                cur.execute(f"DELETE FROM {table} WHERE tx_hash = ANY(%s)", (tx_hashes,))
+            conn.commit()
+
+    async def _write(self):
+        buffer = []
+
+        async def flush():
+            if not buffer:
+                return
+            await self.writer(self.db, [rows for _, _, rows, _ in buffer])
+            if self.wallets is not None:
+                await asyncio.to_thread(self._match_wallets, buffer)
+            now = time.time()
+            for block_number, timestamp, _, _ in buffer:
+                self.latencies.append(now - timestamp)
+                self.stats["last_written"] = block_number
+            self.stats["blocks_written"] += len(buffer)
+            buffer.clear()
+
+        while True:
+            item = await self.write_q.get()
+            if item is _STOP:
+                await flush()
+                return
+            if isinstance(item, Rollback):
+                await flush()
+                last = self.stats["last_written"]
+                if last is not None and last >= item.block_number:
+                    self.stats["rolled_back"] += last - item.block_number + 1
+                await asyncio.to_thread(self.db.delete_from_block, item.block_number)
+                if self.wallets is not None:
+                    await asyncio.to_thread(self._rollback_wallets, item.block_number)
+                self.stats["last_written"] = item.block_number - 1
+                continue
+            buffer.append(item)
+            if self.write_q.empty() or len(buffer) >= self.write_batch:
+                await flush()
+                last = self.stats["last_written"]
+                if self._until_block is not None and last is not None and last >= self._until_block:
+                    self._stop.set()
+
+    # ------------------------------------------------------------------
+    def get_stats(self):
+        """Counters plus block timestamp -> DB latency percentiles (seconds)"""
+        out = dict(self.stats, head=self.head, latency_samples=len(self.latencies))
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            out["latency_p50"] = ordered[len(ordered) // 2]
+            out["latency_p95"] = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            out["latency_max"] = ordered[-1]
+        return out
+
+    def stop(self):
+        if self._stop:
+            self._stop.set()
+
+    async def run(self, until_block=None):
+        """Function to listen until stop() is called (or until_block is written)"""
+        own_client = self.aw3 is None
+        if own_client:
+            if not self.rpc_url:
+                raise ValueError("ALCHEMY_RPC_URL missing in environment")
+            self.aw3 = AsyncWeb3(RateLimitedAsyncHTTPProvider(self.rpc_url, limiter=shared_limiter(),
+                                                                  hedge=True))
+        if self.wallets is not None and self.w3 is None:
+            self.w3 = connect_to_rpc()
+
+        self.fetcher = AsyncBlockFetcher(self.aw3)
+        self.fetch_q = asyncio.Queue(maxsize=self.concurrency)
+        self.decode_q = asyncio.Queue(maxsize=self.queue_size)
+        self.write_q = asyncio.Queue(maxsize=self.queue_size)
+        self._head_event = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._until_block = until_block
+
+        head = await self.aw3.eth.block_number
+        self.next_block = self.start_block if self.start_block is not None else head
+        self._set_head(head)
+        logger.info("[LISTENER] starting from block %s (head %s)", self.next_block, head)
+
+        upstream = [asyncio.create_task(c) for c in (self._heads(), self._schedule(), self._check())]
+        decoder = asyncio.create_task(self._decode())
+        writer = asyncio.create_task(self._write())
+        stages = upstream + [decoder, writer]
+        stop = asyncio.create_task(self._stop.wait())
+        try:
+            # a stage that dies (DB down, decode error) would leave the others blocked on full queues
+            await asyncio.wait([stop, *stages], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stop.cancel()
+            for task in upstream:
+                task.cancel()
+            await asyncio.gather(*upstream, return_exceptions=True)
+            while not self.fetch_q.empty():
+                self.fetch_q.get_nowait()[2].cancel()
+            if decoder.done() or writer.done():
+                decoder.cancel()
+                writer.cancel()
+            else:
+                await self.decode_q.put(_STOP)
+            await asyncio.gather(decoder, writer, return_exceptions=True)
+            if own_client:
+                await self.aw3.provider.disconnect()
+        for task in stages:
+            if task.done() and not task.cancelled() and task.exception() is not None:
+                logger.error("[LISTENER] stopped on error: %s", self.get_stats())
+                raise task.exception()
+        logger.info("[LISTENER] stopped: %s", self.get_stats())
+        return self.get_stats()
 
-            await asyncio.sleep(POLL_INTERVAL)
 
-        except Exception as e:
-            logger.error(f"[BLOCK ERROR] {e}")
-            await asyncio.sleep(5)
+def run_listener(db, **kwargs):
+    """Sync entry point: listen until interrupted"""
+    listener = BlockListener(db, **kwargs)
+    try:
+        return asyncio.run(listener.run())
+    except KeyboardInterrupt:
+        return listener.get_stats()
@@ -0,0 +1,126 @@
+# ingestion/log_filter.py
+import os
+from decoder.util import ERC20_TRANSFER_TOPIC
+from utils.bloom import wallet_topic
+from utils.logger import logger
+
+"""
+Topic-filtered eth_getLogs fetch of ERC-20 Transfers touching tracked wallets.
+
+For every block window and every chunk of LOGS_ADDRESS_CHUNK wallets two
+filters are sent:
+    [Transfer, wallets, null]   -> wallet is the sender   (topic1)
+    [Transfer, null, wallets]   -> wallet is the receiver (topic2)
+so a window costs 2 * ceil(wallets / chunk) requests instead of one
+receipt request per transaction.
+
+When the provider refuses a query ("too many results", "response size
+exceeded", ...) the block window is split in half and retried; a single
+block that is still too large is retried with half the wallet chunk.
+"""
+
+LOGS_WINDOW_BLOCKS = int(os.getenv("LOGS_WINDOW_BLOCKS", 2000))
+LOGS_ADDRESS_CHUNK = int(os.getenv("LOGS_ADDRESS_CHUNK", 200))
+TRANSFER_TOPIC = ERC20_TRANSFER_TOPIC
+
+TOO_MANY_RESULTS = (
+    "too many results",
+    "more than 10000 results",
+    "query returned more than",
+    "response size exceeded",
+    "log response size",
+    "limit exceeded",
+    "block range is too large",
+    "range too large",
+    "exceed maximum block range",
+)
+
+
+def is_too_many_results(err):
+    """Function to check if an eth_getLogs error asks for a smaller query"""
+    rpc_error = getattr(err, "rpc_response", None) or {}
+    code = (rpc_error.get("error") or {}).get("code") if isinstance(rpc_error, dict) else None
+    if code == -32005:
+        return True
+    msg = str(err).lower()
+    return any(s in msg for s in TOO_MANY_RESULTS)
+
+
+def _get_logs(w3, start, end, topics, stats):
+    stats["requests"] += 1
+    return w3.eth.get_logs({"fromBlock": start, "toBlock": end, "topics": topics})
+
+
+def _fetch(w3, start, end, wallet_topics, position, stats):
+    """
+    Logs of [start, end] with wallet_topics at topic position (1 / 2),
+    splitting the window / wallet chunk while the provider says "too many results"
+    """
+    topics = [TRANSFER_TOPIC, None, None]
+    topics[position] = wallet_topics
+    try:
+        return list(_get_logs(w3, start, end, topics, stats))
+    except Exception as e:
+        if not is_too_many_results(e):
+            raise
+        stats["splits"] += 1
+        if end > start:
+            mid = (start + end) // 2
+            logger.debug("eth_getLogs %s → %s too large, splitting at %s", start, end, mid)
+            return (_fetch(w3, start, mid, wallet_topics, position, stats)
+                    + _fetch(w3, mid + 1, end, wallet_topics, position, stats))
+        if len(wallet_topics) > 1:
+            half = len(wallet_topics) // 2
+            return (_fetch(w3, start, end, wallet_topics[:half], position, stats)
+                    + _fetch(w3, start, end, wallet_topics[half:], position, stats))
+        raise
+
+
+def get_block_timestamps(w3, block_numbers, batch_size=100):
+    """Function to fetch {block_number: timestamp} with batched header requests"""
+    numbers = sorted(set(block_numbers))
+    out = {}
+    for i in range(0, len(numbers), batch_size):
+        chunk = numbers[i:i + batch_size]
+        with w3.batch_requests() as batch:
+            for bn in chunk:
+                batch.add(w3.eth.get_block(bn))
+            for bn, block in zip(chunk, batch.execute()):
+                out[bn] = block["timestamp"]
+    return out
+
+
+def iter_wallet_transfer_logs(w3, start_block, end_block, wallets,
+                              window=None, chunk=None, stats=None):
+    """
+    Yield Transfer logs in [start_block, end_block] where a wallet is sender or
+    receiver, window by window (ordered by block, log index), each log once.
+    stats (dict) collects requests / splits / logs counters.
+    """
+    window = window or LOGS_WINDOW_BLOCKS
+    chunk = chunk or LOGS_ADDRESS_CHUNK
+    stats = stats if stats is not None else {}
+    for key in ("requests", "splits", "logs", "windows"):
+        stats.setdefault(key, 0)
+
+    topics = sorted({"0x" + wallet_topic(w).hex() for w in wallets})
+    if not topics:
+        return
+
+    start = start_block
+    while start <= end_block:
+        end = min(start + window - 1, end_block)
+        stats["windows"] += 1
+        found = {}
+        for i in range(0, len(topics), chunk):
+            part = topics[i:i + chunk]
+            for position in (1, 2):
+                for lg in _fetch(w3, start, end, part, position, stats):
+                    if lg.get("removed"):
+                        continue
+                    # wallet -> wallet transfers come back from both filters
+                    found[(lg["blockNumber"], lg["logIndex"])] = lg
+        for key in sorted(found):
+            stats["logs"] += 1
+            yield found[key]
+        start = end + 1
@@ -1,24 +1,91 @@
-from web3_projects.decoder.decode import decode_transfer_log
+import os
+from decoder.decode import decode_transfer_log
 from ingestion.save_data import save_token_transfer
 from ingestion.save_data import get_or_create_token
+from ingestion.receipts import fetch_block_receipts
+from ingestion.log_filter import iter_wallet_transfer_logs, get_block_timestamps
+from utils.bloom import TransferBloomFilter
 from utils.logger import logger
 
+# skip blocks / receipts whose logsBloom can't hold a tracked wallet Transfer
+BLOOM_PRESCREEN = os.getenv("BLOOM_PRESCREEN", "1") == "1"
 
-def handle_erc20_transfers(w3, block, session, whale_set):
+_bloom = TransferBloomFilter()
+_bloom_source = None     # wallet index the bloom masks were built from
+
+
+def _bloom_filter(whale_set):
+    """Bloom filter for the current watchlist (rebuilt when a watcher reloads its index)"""
+    global _bloom_source
+    current = getattr(whale_set, "index", whale_set)
+    if current is not _bloom_source:
+        _bloom.set_wallets(current)
+        _bloom_source = current
+    return _bloom
+
+
+def bloom_stats():
+    """Skip rate / false positive rate of the logsBloom pre-screen"""
+    return _bloom.get_stats()
+
+
+def save_wallet_transfer(w3, session, timestamp, tx_hash, decoded, whale_set):
+    """Insert one decoded Transfer touching a tracked wallet into token_transfers"""
+    from_addr = decoded["from"]
+    to_addr = decoded["to"]
+
+    direction = "inflow" if to_addr in whale_set else "outflow"
+    whale_addr = to_addr if direction == "inflow" else from_addr
+
+    # metadata from token registry
+    symbol, decimals = get_or_create_token(w3, decoded["token"], session)
+
+    amount = decoded["value"] / (10 ** decimals)
+
+    session.execute("""
+        INSERT INTO token_transfers
+        (timestamp, tx_hash, wallet_address, direction, token_address, symbol, amount)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """, (
+        timestamp,
+        tx_hash,
+        whale_addr.lower(),
+        direction,
+        decoded["token"].lower(),
+        symbol,
+        amount
+    ))
+
+
+def handle_erc20_transfers(w3, block, session, whale_set, receipts=None):
     """
     Process ERC-20 transfer logs inside every transaction of the block.
+    Blocks whose logsBloom rules out a tracked wallet Transfer are skipped
+    without fetching receipts, receipts are screened the same way before decoding.
+    `receipts`: the block's receipts when the caller already has them (listener).
     """
 
     timestamp = block.timestamp
+    bloom = _bloom_filter(whale_set) if BLOOM_PRESCREEN else None
 
-    for tx in block.transactions:
-        tx_hash = tx.hash.hex()
+    if bloom and not bloom.check_block(block.get("logsBloom")):
+        return
 
+    if receipts is None:
         try:
-            receipt = w3.eth.get_transaction_receipt(tx_hash)
-        except Exception:
+            receipts = fetch_block_receipts(w3, block)
+        except Exception as e:
+            logger.error("Unable to fetch receipts for block %s -> %s", block.number, e)
+            return
+
+    block_matched = False
+    for tx, receipt in zip(block.transactions, receipts):
+        if bloom and not bloom.check_receipt(receipt.get("logsBloom")):
             continue
 
+        tx_hash = tx.hash.hex()
+        receipt_matched = False
+
         for log in receipt.logs:
             decoded = decode_transfer_log(w3, log)
             if not decoded:
@@ -29,25 +96,36 @@ def handle_erc20_transfers(w3, block, session, whale_set):
 
             if from_addr not in whale_set and to_addr not in whale_set:
                 continue
+            receipt_matched = True
+
+            save_wallet_transfer(w3, session, timestamp, tx_hash, decoded, whale_set)
+
+        if bloom and not receipt_matched:
+            bloom.false_positive("receipt")
+        block_matched = block_matched or receipt_matched
+
+    if bloom and not block_matched:
+        bloom.false_positive("block")
 
-            direction = "inflow" if to_addr in whale_set else "outflow"
-            whale_addr = to_addr if direction == "inflow" else from_addr
-
-            # metadata from token registry
-            symbol, decimals = get_or_create_token(w3, decoded["token"], session)
-
-            amount = decoded["amount_raw"] / (10 ** decimals)
-
-            session.execute("""
-                INSERT INTO token_transfers
-                (timestamp, tx_hash, wallet_address, direction, token_address, symbol, amount)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, (
-                timestamp,
-                tx_hash,
-                whale_addr.lower(),
-                direction,
-                decoded["token"].lower(),
-                symbol,
-                amount
-            ))
+
+def handle_erc20_transfers_by_logs(w3, start_block, end_block, session, whale_set, stats=None):
+    """
+    Same token_transfers rows as handle_erc20_transfers over a block range,
+    fetched with topic-filtered eth_getLogs (one request per window and
+    wallet chunk) instead of the receipts of every block.
+    Returns number of transfers saved.
+    """
+    logs = list(iter_wallet_transfer_logs(w3, start_block, end_block, list(whale_set), stats=stats))
+    timestamps = get_block_timestamps(w3, [lg["blockNumber"] for lg in logs])
+
+    saved = 0
+    for log in logs:
+        decoded = decode_transfer_log(w3, log)
+        if not decoded:
+            continue
+        if decoded["from"] not in whale_set and decoded["to"] not in whale_set:
+            continue
+        save_wallet_transfer(w3, session, timestamps[log["blockNumber"]],
+                             log["transactionHash"].hex(), decoded, whale_set)
+        saved += 1
+    return saved
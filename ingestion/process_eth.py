@@ -11,23 +11,25 @@ def handle_eth_transfers(w3, block, session, whale_set):
 
     timestamp = block.timestamp
 
-    for tx in block.transactions:
-        involved = is_wallet_involved(tx, whale_set)
-        if not involved:
-            continue
+    if hasattr(whale_set, "match_block"):
+        # whole block against the wallet index in one call
+        matches = [(tx, direction, addr) for tx, direction, addr, _, _ in whale_set.match_block(block.transactions)]
+    else:
+        matches = [(tx, direction, addr) for tx in block.transactions
+                   for direction, addr in is_wallet_involved(tx, whale_set)]
 
+    for tx, direction, wallet_addr in matches:
         tx_hash = tx.hash.hex()
         value_eth = float(w3.from_wei(tx.value, "ether"))
 
-        for direction, wallet_addr in involved:
-            session.execute("""
-                INSERT INTO eth_transfers (timestamp, tx_hash, wallet_address, direction, value_eth)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (
-                timestamp,
-                tx_hash,
-                wallet_addr.lower(),
-                direction,
-                value_eth
-            ))
+        session.execute("""
+            INSERT INTO eth_transfers (timestamp, tx_hash, wallet_address, direction, value_eth)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (
+            timestamp,
+            tx_hash,
+            wallet_addr.lower(),
+            direction,
+            value_eth
+        ))
 
@@ -0,0 +1,218 @@
+# ingestion/raw_passthrough.py
+import json
+import os
+from hexbytes import HexBytes
+from decoder.util import checksum_address
+from utils.logger import logger
+
+"""
+Raw passthrough ingestion.
+
+Blocks and receipts are fetched as plain JSON-RPC payloads (one HTTP
+batch for a whole range of blocks), parsed once with json.loads and split
+into per-tx / per-receipt / per-log fragments that are written to the
+raw_* tables as JSON text. There is no web3 result formatting, no
+AttributeDict/HexBytes and no utils.helpers.normalize pass.
+
+The stored values are the ones the web3 path stores (web3 formatting +
+normalize), field by field, so decoder/transform.py decodes the same
+rows whatever the ingest mode: hex quantities become ints (timestamp,
+gasUsed, value, logIndex, ...), addresses are checksummed (from, to,
+miner, address, ...) and byte strings (hashes, input, data, topics,
+logsBloom, ...) lose their 0x prefix like HexBytes(...).hex().
+
+The batches go through the provider of the web3 client
+(utils.helpers.connect_to_rpc): RPC cache, CU limiter with its 429 and
+transient error retries, RPC_URLS endpoint pool and the shared keep-alive
+session, like every other request of the pipeline. web3 only decodes the
+JSON there, the results are the node's payloads.
+"""
+
+RAW_BATCH_BLOCKS = int(os.getenv("RAW_BATCH_BLOCKS", 10))     # blocks per HTTP request
+
+BLOCK_QUANTITIES = (
+    "baseFeePerGas", "blobGasUsed", "difficulty", "excessBlobGas", "gasLimit",
+    "gasUsed", "number", "size", "timestamp", "totalDifficulty",
+)
+TX_QUANTITIES = (
+    "blockNumber", "chainId", "gas", "gasPrice", "maxFeePerBlobGas", "maxFeePerGas",
+    "maxPriorityFeePerGas", "nonce", "transactionIndex", "type", "v", "value", "yParity",
+)
+RECEIPT_QUANTITIES = (
+    "blobGasPrice", "blobGasUsed", "blockNumber", "cumulativeGasUsed",
+    "effectiveGasPrice", "gasUsed", "status", "transactionIndex", "type",
+)
+LOG_QUANTITIES = ("blockNumber", "logIndex", "transactionIndex")
+WITHDRAWAL_QUANTITIES = ("amount", "index", "validatorIndex")
+
+# byte strings (HexBytes in web3, unprefixed hex once normalized), single values or lists
+BLOCK_BYTES = (
+    "extraData", "hash", "logsBloom", "mixHash", "nonce", "parentBeaconBlockRoot", "parentHash",
+    "receiptsRoot", "requestsHash", "sha3Uncles", "stateRoot", "transactionsRoot", "uncles", "withdrawalsRoot",
+)
+TX_BYTES = ("blobVersionedHashes", "blockHash", "hash", "input", "r", "s")
+RECEIPT_BYTES = ("blockHash", "logsBloom", "root", "transactionHash")
+LOG_BYTES = ("blockHash", "data", "topics", "transactionHash")
+# addresses (checksummed by web3)
+BLOCK_ADDRESSES = ("miner",)
+TX_ADDRESSES = ("from", "to")
+RECEIPT_ADDRESSES = ("contractAddress", "from", "to")
+LOG_ADDRESSES = ("address",)
+
+class RawRPCError(Exception):
+    """Error object returned by the node for a raw call"""
+
+    def __init__(self, method, error):
+        self.method = method
+        self.error = error or {}
+        super().__init__(f"{method}: {self.error.get('message')}")
+
+
+def _ints(obj, fields):
+    """Function to turn hex quantities into ints in place"""
+    for f in fields:
+        v = obj.get(f)
+        if isinstance(v, str) and v.startswith("0x"):
+            obj[f] = int(v, 16)
+    return obj
+
+
+def _unprefixed(value):
+    return value[2:] if isinstance(value, str) and value.startswith("0x") else value
+
+
+def _bytes(obj, fields):
+    """Function to turn 0x byte strings into the HexBytes(...).hex() form in place"""
+    for f in fields:
+        v = obj.get(f)
+        if isinstance(v, list):
+            obj[f] = [_unprefixed(x) for x in v]
+        elif v is not None:
+            obj[f] = _unprefixed(v)
+    return obj
+
+
+def _addresses(obj, fields):
+    """Function to checksum addresses in place"""
+    for f in fields:
+        v = obj.get(f)
+        if isinstance(v, str):
+            obj[f] = checksum_address(v)
+    return obj
+
+
+def _web3_form(obj, quantities, byte_fields, addresses):
+    return _addresses(_bytes(_ints(obj, quantities), byte_fields), addresses)
+
+
+def _tx_form(tx):
+    _web3_form(tx, TX_QUANTITIES, TX_BYTES, TX_ADDRESSES)
+    for entry in tx.get("accessList") or []:
+        _addresses(_bytes(entry, ("storageKeys",)), ("address",))
+    return tx
+
+
+def _batch(w3, calls):
+    """Function to send [(method, params), ...] in one HTTP request
+
+    Returns:
+        list: (result, error) per call, same order as calls
+    """
+    answers = w3.provider.make_batch_request(calls)
+    if isinstance(answers, dict):
+        raise RawRPCError("batch", answers.get("error"))
+    if len(answers) != len(calls):
+        raise RawRPCError("batch", {"message": f"{len(answers)} answers to {len(calls)} calls"})
+    return [(a.get("result"), a.get("error")) for a in answers]
+
+
+def fetch_raw_blocks(w3, block_numbers):
+    """Function to fetch blocks + receipts as raw JSON-RPC payloads
+
+    Returns:
+        dict: block_number -> (block, receipts)
+    """
+    calls = []
+    for bn in block_numbers:
+        calls.append(("eth_getBlockByNumber", [hex(bn), True]))
+        calls.append(("eth_getBlockReceipts", [hex(bn)]))
+    answers = _batch(w3, calls)
+
+    out, missing_receipts = {}, []
+    for i, bn in enumerate(block_numbers):
+        (block, block_err), (receipts, receipts_err) = answers[2 * i], answers[2 * i + 1]
+        if block_err or block is None:
+            raise RawRPCError("eth_getBlockByNumber", block_err or {"message": f"block {bn} not found"})
+        if receipts_err or receipts is None:
+            missing_receipts.append(bn)
+        out[bn] = (block, receipts)
+
+    # endpoints without eth_getBlockReceipts: one batch of per-tx receipt calls
+    if missing_receipts:
+        calls = [("eth_getTransactionReceipt", [tx["hash"]])
+                 for bn in missing_receipts for tx in out[bn][0]["transactions"]]
+        answers = iter(_batch(w3, calls)) if calls else iter(())
+        for bn in missing_receipts:
+            receipts = []
+            for _ in out[bn][0]["transactions"]:
+                receipt, err = next(answers)
+                if err or receipt is None:
+                    raise RawRPCError("eth_getTransactionReceipt", err or {"message": "receipt not found"})
+                receipts.append(receipt)
+            out[bn] = (out[bn][0], receipts)
+    return out
+
+
+def split_raw_block(block_number, block, receipts):
+    """Function to split raw payloads into raw_* rows with JSON text columns
+
+    Returns:
+        dict: {"block": row, "tx": rows, "receipt": rows, "logs": rows}
+              (same layout as ingestion.raw_rows.build_raw_rows)
+    """
+    tx_rows, receipt_rows, log_rows = [], [], []
+
+    for tx, receipt in zip(block["transactions"], receipts):
+        tx_hash = HexBytes(tx["hash"]).hex()
+        _tx_form(tx)
+        _web3_form(receipt, RECEIPT_QUANTITIES, RECEIPT_BYTES, RECEIPT_ADDRESSES)
+        for lg in receipt.get("logs") or []:
+            _web3_form(lg, LOG_QUANTITIES, LOG_BYTES, LOG_ADDRESSES)
+            log_rows.append([tx_hash, block_number, lg["logIndex"], json.dumps(lg)])
+        tx_rows.append([tx_hash, block_number, json.dumps(tx)])
+        receipt_rows.append([tx_hash, block_number, json.dumps(receipt)])
+
+    _web3_form(block, BLOCK_QUANTITIES, BLOCK_BYTES, BLOCK_ADDRESSES)
+    for w in block.get("withdrawals") or []:
+        _addresses(_ints(w, WITHDRAWAL_QUANTITIES), ("address",))
+
+    return {
+        "block": [block_number, block["timestamp"], json.dumps(block)],
+        "tx": tx_rows,
+        "receipt": receipt_rows,
+        "logs": log_rows
+    }
+
+
+def get_raw_block_data(w3, block_numbers, batch_blocks=RAW_BATCH_BLOCKS):
+    """Function to fetch & split a list of blocks in raw passthrough mode
+
+    Returns:
+        list: one build_raw_rows style dict per block
+
+    Raises:
+        the error of a failed chunk (after the provider's retries): a
+        batch with missing blocks must fail, not be checkpointed
+    """
+    results = []
+    for i in range(0, len(block_numbers), batch_blocks):
+        chunk = block_numbers[i:i + batch_blocks]
+        try:
+            payloads = fetch_raw_blocks(w3, chunk)
+        except Exception as e:
+            logger.error("Error fetching raw blocks %s → %s: %s", chunk[0], chunk[-1], e)
+            raise
+        for bn in chunk:
+            block, receipts = payloads[bn]
+            results.append(split_raw_block(bn, block, receipts))
+    return results
@@ -0,0 +1,47 @@
+# ingestion/raw_rows.py
+
+"""
+Turn a fetched block + its receipts into the row lists written to the
+raw_blocks / raw_transactions / raw_receipts / raw_logs tables.
+Shared by insertion_main.get_block_data and the async ingestion engine.
+"""
+
+
+def build_raw_rows(block_number, block, receipts):
+    """Function to build raw_* rows for one block
+
+    Args:
+        block_number (int): block number
+        block (AttributeDict): block fetched with full_transactions=True
+        receipts (list): receipts in the same order as block.transactions
+
+    Returns:
+        dict: {"block": row, "tx": rows, "receipt": rows, "logs": rows}
+    """
+    block_row = [
+        block_number,
+        block["timestamp"],
+        dict(block)
+    ]
+
+    tx_rows, receipt_rows, log_rows = [], [], []
+
+    for tx, receipt in zip(block["transactions"], receipts):
+        tx_hash = tx["hash"].hex()
+        tx_rows.append([tx_hash, block_number, dict(tx)])
+        receipt_rows.append([tx_hash, block_number, dict(receipt)])
+
+        for lg in receipt["logs"]:
+            log_rows.append([
+                tx_hash,
+                block_number,
+                lg["logIndex"],
+                dict(lg)
+            ])
+
+    return {
+        "block": block_row,
+        "tx": tx_rows,
+        "receipt": receipt_rows,
+        "logs": log_rows
+    }
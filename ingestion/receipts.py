@@ -0,0 +1,109 @@
+# ingestion/receipts.py
+import os
+from web3.exceptions import MethodNotSupported, MethodUnavailable, Web3RPCError
+from utils.logger import logger
+
+"""
+Fetch all receipts of a block with as few RPC round trips as possible.
+
+Fetch modes:
+- "block"  : one eth_getBlockReceipts call per block. Falls back to "batch"
+             when the endpoint does not support the method.
+- "batch"  : JSON-RPC batches of eth_getTransactionReceipt,
+             RECEIPT_BATCH_SIZE calls per HTTP request.
+- "single" : one eth_getTransactionReceipt per transaction (old behaviour).
+"""
+
+RECEIPT_FETCH_MODE = os.getenv("RECEIPT_FETCH_MODE", "block")
+RECEIPT_BATCH_SIZE = int(os.getenv("RECEIPT_BATCH_SIZE", 100))
+FETCH_MODES = ("block", "batch", "single")
+
+# endpoints which answered "method not found" for eth_getBlockReceipts
+_no_block_receipts = set()
+
+
+def _endpoint_key(w3):
+    return getattr(w3.provider, "endpoint_uri", None) or id(w3.provider)
+
+
+def is_method_missing(err):
+    """Function to check if an RPC error means the method is not available"""
+    if isinstance(err, (MethodUnavailable, MethodNotSupported)):
+        return True
+    rpc_error = getattr(err, "rpc_response", None) or {}
+    code = (rpc_error.get("error") or {}).get("code") if isinstance(rpc_error, dict) else None
+    if code == -32601:
+        return True
+    msg = str(err).lower()
+    return any(s in msg for s in ("method not found", "does not exist", "not supported", "not available"))
+
+
+def _tx_hashes(block):
+    """Function to return tx hashes of a block (full txs or hash only)"""
+    hashes = []
+    for tx in block["transactions"]:
+        tx_hash = tx["hash"] if isinstance(tx, dict) or hasattr(tx, "keys") else tx
+        hashes.append(tx_hash)
+    return hashes
+
+
+def get_receipts_single(w3, tx_hashes):
+    """One eth_getTransactionReceipt per transaction"""
+    return [w3.eth.get_transaction_receipt(h) for h in tx_hashes]
+
+
+def get_receipts_batched(w3, tx_hashes, batch_size=RECEIPT_BATCH_SIZE):
+    """Fetch receipts with JSON-RPC batch requests of batch_size calls"""
+    receipts = []
+    for i in range(0, len(tx_hashes), batch_size):
+        chunk = tx_hashes[i:i + batch_size]
+        with w3.batch_requests() as batch:
+            for tx_hash in chunk:
+                batch.add(w3.eth.get_transaction_receipt(tx_hash))
+            receipts.extend(batch.execute())
+    return receipts
+
+
+def get_receipts_by_block(w3, block_number):
+    """Fetch every receipt of the block with one eth_getBlockReceipts call"""
+    return list(w3.eth.get_block_receipts(block_number))
+
+
+def fetch_block_receipts(w3, block, mode=None, batch_size=None):
+    """Function to fetch all receipts of a block
+
+    Args:
+        w3 (Web3): web3 client
+        block (dict | AttributeDict): block with full txs or tx hashes
+        mode (str): "block", "batch" or "single" (default RECEIPT_FETCH_MODE)
+        batch_size (int): calls per batch for the "batch" mode
+
+    Returns:
+        list: receipts in the same order as block.transactions
+    """
+    mode = mode or RECEIPT_FETCH_MODE
+    batch_size = batch_size or RECEIPT_BATCH_SIZE
+    if mode not in FETCH_MODES:
+        raise ValueError(f"Unknown receipt fetch mode: {mode}")
+
+    tx_hashes = _tx_hashes(block)
+    if not tx_hashes:
+        return []
+
+    if mode == "single":
+        return get_receipts_single(w3, tx_hashes)
+
+    if mode == "block" and _endpoint_key(w3) not in _no_block_receipts:
+        try:
+            receipts = get_receipts_by_block(w3, block["number"])
+            if len(receipts) == len(tx_hashes):
+                return receipts
+            logger.warning("eth_getBlockReceipts returned %s receipts for %s txs in block %s, using batches",
+                           len(receipts), len(tx_hashes), block["number"])
+        except (Web3RPCError, MethodUnavailable, MethodNotSupported) as e:
+            if not is_method_missing(e):
+                raise
+            logger.warning("eth_getBlockReceipts not supported by endpoint, falling back to batch requests")
+            _no_block_receipts.add(_endpoint_key(w3))
+
+    return get_receipts_batched(w3, tx_hashes, batch_size)
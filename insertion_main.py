@@ -1,31 +1,40 @@
+import os
 import time
 import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from utils.helpers import connect_to_rpc
 from utils.logger import logger
 from db.db_operations import Database_Operations
+from ingestion.receipts import fetch_block_receipts
+from ingestion.raw_rows import build_raw_rows
+from ingestion.async_engine import ingest_range, insert_raw_rows
+from utils.block_index import find_block_for_timestamp
+from ingestion.raw_passthrough import get_raw_block_data
+from db.checkpoints import run_stage, CheckpointStore, split_ranges
+from db.segment_archive import SegmentArchive, archive_writer
+from decoder.fused import write_fused, fused_writer, FUSED_WRITE_RAW
 
 db_help = Database_Operations()
 w3 = connect_to_rpc()    # creating an connection with RPC
 
+# "web3" -> web3 objects + normalize, "raw" -> JSON-RPC payloads stored as-is
+INGEST_MODE = os.getenv("INGEST_MODE", "web3")
 
-def find_block_for_timestamp(w3, target_ts):
-    """function to block number for the targetted timestamp"""
-    low = 0
-    high = w3.eth.block_number
-    chosen = None
+# "async" -> ingestion/async_engine, "threads" -> process_batch
+ENGINE = os.getenv("ENGINE", "async")
+if INGEST_MODE == "raw" and ENGINE == "async":
+    # the async engine fetches through web3, raw payloads only go through process_batch
+    raise ValueError("INGEST_MODE=raw needs ENGINE=threads")
 
-    while low <= high:
-        mid = (low + high) // 2
-        block = w3.eth.get_block(mid)
+# decode fetched blocks in memory (decoded_* written in the same pass, see
+# decoder/fused.py), FUSED_WRITE_RAW=0 skips the raw_* tables
+FUSED_DECODE = os.getenv("FUSED_DECODE", "0") == "1"
+if FUSED_DECODE and INGEST_MODE == "raw":
+    raise ValueError("FUSED_DECODE needs INGEST_MODE=web3")
 
-        if block.timestamp < target_ts:
-            low = mid + 1
-        else:
-            chosen = mid
-            high = mid - 1
-
-    return chosen
+# where raw rows go: "db" -> raw tables, "archive" -> local segment files
+# (db/segment_archive.py, ARCHIVE_DIR), "both"
+RAW_SINK = os.getenv("RAW_SINK", "db")
+archive = SegmentArchive() if RAW_SINK in ("archive", "both") else None
 
 
 def get_block_data(block_number):
@@ -35,42 +44,20 @@ def get_block_data(block_number):
         block_number (int): block number 
     Returns:
         dict: list of values
+    Raises:
+        the fetch error (after the provider's retries), so the batch fails
+        instead of being stored without the block
     """
     try:
         block = w3.eth.get_block(block_number, full_transactions=True)
-        block_row = [
-            block_number,
-            block.timestamp,
-            dict(block)
-        ]
-
-        tx_rows, receipt_rows, log_rows = [], [], []
-
-        for tx in block.transactions:
-            tx_hash = tx.hash.hex()
-            tx_rows.append([tx_hash, block_number, dict(tx)])
-
-            receipt = w3.eth.get_transaction_receipt(tx_hash)
-            receipt_rows.append([tx_hash, block_number, dict(receipt)])
-
-            for lg in receipt.logs:
-                log_rows.append([
-                    tx_hash,
-                    block_number,
-                    lg["logIndex"],
-                    dict(lg)
-                ])
-
-        return {
-            "block": block_row,
-            "tx": tx_rows,
-            "receipt": receipt_rows,
-            "logs": log_rows
-        }
+
+        # all receipts of the block in one round trip (or a few batches)
+        receipts = fetch_block_receipts(w3, block)
+        return build_raw_rows(block_number, block, receipts)
 
     except Exception as e:
         logger.error("Error fetching block %s: %s", block_number, e)
-        return {}
+        raise
 
 
 def process_batch(start_block, end_block):
@@ -86,8 +73,25 @@ def process_batch(start_block, end_block):
     all_blocks, all_txs, all_receipts, all_logs = [], [], [], []
 
     try:
-        for block_number in range(start_block, end_block + 1):
-            data = get_block_data(block_number)
+        if INGEST_MODE == "raw":
+            fetched = get_raw_block_data(w3, list(range(start_block, end_block + 1)))
+        else:
+            fetched = (get_block_data(bn) for bn in range(start_block, end_block + 1))
+
+        if archive is not None:
+            fetched = [data for data in fetched if data]
+            archive.append(fetched)
+            logger.info("Data for %s → %s archived", start_block, end_block)
+
+        if FUSED_DECODE:
+            write_fused(db_help, [data for data in fetched if data], w3,
+                        write_raw=FUSED_WRITE_RAW and RAW_SINK != "archive")
+            logger.info("Data for %s → %s decoded & stored in DB!!", start_block, end_block)
+            return True
+        if RAW_SINK == "archive":
+            return True
+
+        for data in fetched:
             if data:
                 all_blocks.append(data["block"])
                 all_txs.extend(data["tx"])
@@ -106,19 +110,45 @@ def process_batch(start_block, end_block):
         return False
 
 
-def get_block_number_for_date(date):
+def ingest_batch_async(start_block, end_block, batch_blocks=20):
+    """Function to ingest a block range with the async engine, True when no block failed"""
+    if FUSED_DECODE:
+        writer = fused_writer(w3, write_raw=FUSED_WRITE_RAW and RAW_SINK != "archive")
+    else:
+        writer = insert_raw_rows if RAW_SINK != "archive" else None
+    if archive is not None:
+        writer = archive_writer(archive, then=writer)
+    try:
+        stats = ingest_range(start_block, end_block, db_help, batch_blocks=batch_blocks, writer=writer)
+    except Exception as e:
+        # a failed write is raised by the engine
+        logger.error("Error occured during async batch %s → %s -> %s", start_block, end_block, e)
+        return False
+    return not stats["failed"]
+
+
+def get_block_number_for_date(date, days=1):
     """
-        Function to generate start & 
-        and block number based on date value
+        Function to generate start & end block number
+        for `days` UTC days starting at `date`
+
+    Args:
+        date (str | datetime.date): day to ingest, e.g. "2025-11-01"
+        days (int): number of days in the range
+
+    Returns:
+        tuple: (start_block, end_block), end_block is the first block of the next day
     """
     try:
-        logger.info("Starting raw block ingestion for %s", date)
-        # 2025-11-01 to 2025-11-02 (UTC)
-        start_date = datetime.datetime(2025, 11, 1, 0, 0, 0, tzinfo=datetime.timezone.utc)
-        end_date = datetime.datetime(2025, 11, 2, 0, 0, 0, tzinfo=datetime.timezone.utc)
+        logger.info("Starting raw block ingestion for %s (%s days)", date, days)
+        if isinstance(date, str):
+            date = datetime.date.fromisoformat(date)
+        start_date = datetime.datetime(date.year, date.month, date.day, tzinfo=datetime.timezone.utc)
+        end_date = start_date + datetime.timedelta(days=days)
         start_ts = int(start_date.timestamp())
         end_ts = int(end_date.timestamp())
-        
+
+        # block index keeps what it learns, nearby & repeat lookups are (almost) free
         logger.info("Finding start block…")
         start_block = find_block_for_timestamp(w3, start_ts)
 
@@ -133,12 +163,15 @@ def get_block_number_for_date(date):
     
 
 if __name__ == "__main__":
-    DATE = None
+    DATE = None         # e.g. "2025-11-01"
+    DAYS = 1            # number of days starting at DATE
     BATCH_SIZE = 20     # TODO: batch size for bulk insertion can be increased
     MAX_WORKERS = 1     # TODO: we can increas in future
+    CHECKPOINT_BLOCKS = 500     # blocks per async engine run (and per checkpoint)
+    RESUME = os.getenv("RESUME", "1") == "1"    # only ingest ranges without an "ingest" checkpoint
     START_BLOCK, END_BLOCK = None, None
     if DATE:
-        START_BLOCK, END_BLOCK = get_block_number_for_date(date=DATE)
+        START_BLOCK, END_BLOCK = get_block_number_for_date(date=DATE, days=DAYS)
     else:
         # by default the ingestion module will work on the basis
         # of input start & end block
@@ -147,16 +180,32 @@ if __name__ == "__main__":
         logger.info("Block to process: %s to %s", START_BLOCK, END_BLOCK)
 
     initial_time = time.time()
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = []
-        blk = START_BLOCK
-
-        while blk <= END_BLOCK:
-            batch_end = min(blk + BATCH_SIZE - 1, END_BLOCK)
-            futures.append(executor.submit(process_batch, blk, batch_end))
-            blk += BATCH_SIZE
-
-        for f in as_completed(futures):
-            f.result()
-            
+    # completed batches are checkpointed, a re-run only fetches the gaps
+    # and failed batches are retried with backoff (db/checkpoints.py)
+    if ENGINE == "async":
+        process = lambda s, e: ingest_batch_async(s, e, batch_blocks=BATCH_SIZE)
+        batch = CHECKPOINT_BLOCKS
+    else:
+        process, batch = process_batch, BATCH_SIZE
+
+    if RAW_SINK == "archive" and not FUSED_DECODE:
+        # the archive index is the checkpoint: only blocks not archived yet are fetched
+        ranges = archive.missing_ranges(START_BLOCK, END_BLOCK) if RESUME else [(START_BLOCK, END_BLOCK)]
+        for s, e in split_ranges(ranges, batch):
+            if not process(s, e):
+                logger.warning("Batch %s → %s failed, re-run to fetch the gap", s, e)
+    elif FUSED_DECODE:
+        # fused batches are decoded batches, the raw rows (if kept) are ingested ones too
+        store = CheckpointStore()
+
+        def process_fused(s, e):
+            ok = process(s, e)
+            if ok and FUSED_WRITE_RAW and RAW_SINK != "archive":
+                store.mark_done("ingest", s, e)
+            return ok
+        run_stage("decode", START_BLOCK, END_BLOCK, process_fused, batch, store=store,
+                  workers=MAX_WORKERS, resume=RESUME)
+    else:
+        run_stage("ingest", START_BLOCK, END_BLOCK, process, batch, workers=MAX_WORKERS, resume=RESUME)
+
     logger.info("Completed ingestion in %s s!", (time.time() - initial_time))
@@ -1,37 +1,21 @@
 # main_backfill_single_day.py
 
 import datetime
+import os
 from utils.connect_to_rpc import make_web3
 from utils.helpers import load_whale_wallets
 from db.connection import SessionLocal
 from ingestion.process_eth import handle_eth_transfers
-from ingestion.process_erc20 import handle_erc20_transfers
+from ingestion.process_erc20 import handle_erc20_transfers, handle_erc20_transfers_by_logs
 from ingestion.save_data import check_data
+from utils.block_index import find_block_for_timestamp
 
-
-# -------------------------------------------------------
-# 1. Binary search block by timestamp
-# -------------------------------------------------------
-def find_block_for_timestamp(w3, target_ts):
-    low = 0
-    high = w3.eth.block_number
-    chosen = None
-
-    while low <= high:
-        mid = (low + high) // 2
-        blk = w3.eth.get_block(mid)
-
-        if blk.timestamp < target_ts:
-            low = mid + 1
-        else:
-            chosen = mid
-            high = mid - 1
-
-    return chosen
+# "receipts" -> scan receipts of every block, "logs" -> topic filtered eth_getLogs windows
+ERC20_FETCH_MODE = os.getenv("ERC20_FETCH_MODE", "receipts")
 
 
 # -------------------------------------------------------
-# 2. MAIN: backfill data for specific date
+# 1. MAIN: backfill data for specific date
 # -------------------------------------------------------
 def main():
     print("🚀 Starting backfill for 2025-11-01")
@@ -55,6 +39,19 @@ def main():
 
     print(f"📌 Block range: {start_block} → {end_block}")
 
+    if ERC20_FETCH_MODE == "logs":
+        # whale ERC-20 flows of the whole range with eth_getLogs windows
+        session = SessionLocal()
+        try:
+            saved = handle_erc20_transfers_by_logs(w3, start_block, end_block - 1, session, whale_wallets)
+            session.commit()
+            print(f"Saved {saved} whale token transfers")
+        except Exception as e:
+            print(f"❌ Error in eth_getLogs fetch: {e}")
+            session.rollback()
+        finally:
+            session.close()
+
     # process blocks
     for block_number in range(start_block, end_block):
         block = w3.eth.get_block(block_number, full_transactions=True)
@@ -62,7 +59,8 @@ def main():
 
         try:
             handle_eth_transfers(w3, block, session, whale_wallets)
-            handle_erc20_transfers(w3, block, session, whale_wallets)
+            if ERC20_FETCH_MODE != "logs":
+                handle_erc20_transfers(w3, block, session, whale_wallets)
             session.commit()
 
         except Exception as e:
@@ -0,0 +1,62 @@
+# tests/conftest.py
+import sys
+import os
+
+# Add the project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("RPC_CACHE", "off")       # read at import by utils.helpers / utils.rpc_cache
+import logging
+import pytest
+from benchmarks.synthetic_chain import SyntheticChain, GENESIS_BLOCK
+from benchmarks.fake_rpc import FakeRPCServer
+from benchmarks.memory_db import MemoryDatabase
+
+"""
+Shared fixtures: a synthetic chain served by the local fake node, the
+in-process DB stand-in as the process-wide connection pool, and no CU
+limiter unless a test builds its own.
+
+    python -m pytest -q tests
+    DATABASE_URL=postgresql://... python -m pytest -q tests     # + the Postgres tests
+"""
+
+
+def pytest_unconfigure(config):
+    # module level Database_Operations (decoder.main) log from __del__ at exit,
+    # after pytest closed the captured stream the logging handler writes to
+    logging.raiseExceptions = False
+
+
+@pytest.fixture(autouse=True)
+def no_shared_limiter(monkeypatch):
+    import utils.rate_limit as rate_limit
+    monkeypatch.setattr(rate_limit, "RPC_CU_PER_SECOND", 0)
+    monkeypatch.setattr(rate_limit, "_shared", None)
+
+
+@pytest.fixture
+def chain():
+    return SyntheticChain(txs_per_block=5, head=GENESIS_BLOCK + 30)
+
+
+@pytest.fixture
+def server(chain):
+    server = FakeRPCServer(chain).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def memory_db(monkeypatch):
+    import db.connection as db_connection
+    db = MemoryDatabase()
+    monkeypatch.setattr(db_connection, "_pool", db.pool())
+    return db
+
+
+@pytest.fixture
+def postgres_dsn():
+    dsn = os.getenv("DATABASE_URL")
+    if not dsn:
+        pytest.skip("DATABASE_URL not set")
+    return dsn
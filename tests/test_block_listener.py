@@ -0,0 +1,57 @@
+# tests/test_block_listener.py
+import asyncio
+import time
+import pytest
+from benchmarks.bench_listener import ChainDB
+from ingestion.block_listener import BlockListener
+
+
+async def _wait_for(condition, timeout=20):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "listener did not catch up"
+        await asyncio.sleep(0.05)
+
+
+def _canonical(chain, start):
+    return {bn: chain.block_hash(bn)[2:] for bn in range(start, chain.head + 1)}
+
+
+def test_reorg_rolls_back_to_the_canonical_chain(chain, server):
+    db = ChainDB()
+    start = chain.head
+    listener = BlockListener(db, rpc_url=server.url, ws_url="", start_block=start, poll_interval=0.05)
+
+    async def run():
+        task = asyncio.create_task(listener.run())
+        await _wait_for(lambda: start in db.blocks)
+        server.mine(5)
+        await _wait_for(lambda: db.blocks.get(chain.head) == chain.block_hash(chain.head)[2:])
+        orphaned = {bn: db.blocks[bn] for bn in range(chain.head - 2, chain.head + 1)}
+        server.reorg(3, extra=1)
+        server.mine(2)
+        await _wait_for(lambda: db.blocks == _canonical(chain, start))
+        listener.stop()
+        return orphaned, await task
+
+    orphaned, stats = asyncio.run(run())
+    assert db.blocks == _canonical(chain, start)
+    assert all(db.blocks[bn] != block_hash for bn, block_hash in orphaned.items())
+    assert stats["reorgs"] >= 1
+    assert stats["rolled_back"] >= 1
+
+
+@pytest.mark.parametrize("stage", ["writer", "decode"])
+def test_failing_stage_stops_the_listener(chain, server, stage):
+    def decode(block_number, block, receipts):
+        raise RuntimeError("bad block")
+
+    async def writer(db, items):
+        raise RuntimeError("db down")
+
+    failing = {"writer": {"writer": writer}, "decode": {"decode": decode}}[stage]
+    listener = BlockListener(ChainDB(), rpc_url=server.url, ws_url="", start_block=chain.head - 20,
+                             poll_interval=0.05, queue_size=2, **failing)
+
+    with pytest.raises(RuntimeError, match="db down" if stage == "writer" else "bad block"):
+        asyncio.run(asyncio.wait_for(listener.run(), timeout=20))
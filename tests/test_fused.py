@@ -0,0 +1,83 @@
+# tests/test_fused.py
+import psycopg2
+import pytest
+from web3 import Web3
+from benchmarks.bench_fused import DB_DIR, DECODED_TABLES, SCHEMA_FILES
+from benchmarks.synthetic_chain import GENESIS_BLOCK
+
+SCHEMA = "test_fused"
+BLOCKS = 8
+
+
+def _reset_schema(dsn):
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"SET search_path TO {SCHEMA}")
+    for name in SCHEMA_FILES:
+        with open(f"{DB_DIR}/{name}", "r", encoding="utf-8") as f:
+            cur.execute(f.read())
+    conn.commit()
+    conn.close()
+
+
+def _dump_decoded(dsn):
+    conn = psycopg2.connect(dsn, options=f"-c search_path={SCHEMA}")
+    cur = conn.cursor()
+    out = {}
+    for table, order in DECODED_TABLES.items():
+        cur.execute(f"SELECT * FROM {table} ORDER BY {order}")
+        out[table] = cur.fetchall()
+    conn.close()
+    return out
+
+
+@pytest.fixture
+def scratch_db(postgres_dsn, monkeypatch):
+    import db.connection as db_connection
+    import db.raw_compact as raw_compact
+    monkeypatch.setenv("PGOPTIONS", f"-c search_path={SCHEMA}")
+    monkeypatch.setattr(raw_compact, "RAW_LAYOUT", "json")
+    monkeypatch.setattr(db_connection, "_pool", db_connection.ConnectionPool(dsn=postgres_dsn, minconn=0))
+    yield postgres_dsn
+    db_connection._pool.close_all()
+
+
+def test_fused_decode_matches_two_stage(chain, server, scratch_db):
+    from db.db_operations import Database_Operations
+    from db.token_cache import token_cache
+    from decoder.main import run_decoder_for_range
+    from decoder.fused import write_fused
+    from ingestion.raw_rows import build_raw_rows
+    from ingestion.receipts import fetch_block_receipts
+
+    w3 = Web3(Web3.HTTPProvider(server.url))
+    db = Database_Operations()
+    start, end = GENESIS_BLOCK, GENESIS_BLOCK + BLOCKS - 1
+    items = []
+    for bn in range(start, end + 1):
+        block = w3.eth.get_block(bn, full_transactions=True)
+        items.append(build_raw_rows(bn, block, fetch_block_receipts(w3, block)))
+
+    def two_stage():
+        db.insert_blocks_data([d["block"] for d in items])
+        db.insert_txs_data([r for d in items for r in d["tx"]])
+        db.insert_receipts_data([r for d in items for r in d["receipt"]])
+        db.insert_logs_data([r for d in items for r in d["logs"]])
+        assert run_decoder_for_range(start, end, w3)
+
+    results = {}
+    for name, run in (("two-stage", two_stage),
+                      ("fused + raw", lambda: write_fused(db, items, w3, write_raw=True)),
+                      ("fused, no raw", lambda: write_fused(db, items, w3, write_raw=False))):
+        _reset_schema(scratch_db)
+        token_cache.clear()
+        run()
+        results[name] = _dump_decoded(scratch_db)
+
+    expected = results["two-stage"]
+    assert all(expected[table] for table in DECODED_TABLES)
+    for name, decoded in results.items():
+        for table in DECODED_TABLES:
+            assert decoded[table] == expected[table], f"{name}: {table} differs from the two-stage path"
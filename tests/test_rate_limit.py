@@ -0,0 +1,85 @@
+# tests/test_rate_limit.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from web3 import Web3, AsyncWeb3
+from benchmarks.synthetic_chain import GENESIS_BLOCK
+from benchmarks.fake_rpc import FakeRPCServer
+from db.db_operations import Database_Operations
+from ingestion.async_engine import ingest_range_async, insert_raw_rows
+from utils.rate_limit import ComputeUnitLimiter, RateLimitedHTTPProvider, RateLimitedAsyncHTTPProvider
+from utils.rpc_pool import RPCPool
+
+
+def _limiter(cu_per_second):
+    # quick retries, the fake plan refills within a second
+    limiter = ComputeUnitLimiter(cu_per_second=cu_per_second, max_retries=30)
+    limiter.backoff = lambda attempt, retry_after=None: 0.05
+    return limiter
+
+
+def test_throttled_async_ingest_loses_no_block(chain, memory_db):
+    # the node's plan is well below what the limiter starts at: 429s are certain
+    server = FakeRPCServer(chain, throttle_cups=2500).start()
+    limiter = _limiter(20000)
+    written = []
+
+    async def writer(db, items):
+        await insert_raw_rows(db, items)
+        written.extend(item["block"][0] for item in items)
+
+    async def run():
+        aw3 = AsyncWeb3(RateLimitedAsyncHTTPProvider([server.url], limiter=limiter, pool=RPCPool([server.url])))
+        try:
+            return await ingest_range_async(GENESIS_BLOCK, GENESIS_BLOCK + 9, Database_Operations(), aw3=aw3,
+                                            writer=writer)
+        finally:
+            await aw3.provider.disconnect()
+
+    try:
+        stats = asyncio.run(run())
+    finally:
+        server.stop()
+    assert server.throttled > 0
+    assert stats["failed"] == []
+    assert sorted(written) == list(range(GENESIS_BLOCK, GENESIS_BLOCK + 10))
+    assert stats["written"] == 10 and memory_db.stats["commits"] > 0
+    assert limiter.stats["throttled"] > 0 and limiter.stats["retries"] > 0
+    assert limiter.stats["decreases"] >= 1
+    assert limiter.rate < limiter.max_rate
+
+
+def test_throttled_sync_requests_are_retried(chain):
+    server = FakeRPCServer(chain, throttle_cups=200).start()
+    limiter = _limiter(5000)
+    w3 = Web3(RateLimitedHTTPProvider([server.url], limiter=limiter, pool=RPCPool([server.url])))
+    numbers = list(range(GENESIS_BLOCK, GENESIS_BLOCK + 30))
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            blocks = list(pool.map(w3.eth.get_block, numbers))
+    finally:
+        server.stop()
+    assert server.throttled > 0
+    assert [b["number"] for b in blocks] == numbers
+    assert [b["hash"].hex() for b in blocks] == [chain.block_hash(bn)[2:] for bn in numbers]
+    assert limiter.stats["retries"] > 0
+
+
+def test_transient_errors_are_retried(chain, server):
+    # one 503 from the load balancer must not cost a block, sync or async
+    limiter = _limiter(5000)
+    w3 = Web3(RateLimitedHTTPProvider([server.url], limiter=limiter, pool=RPCPool([server.url])))
+    server.fail_next(1, status=503, method="eth_getBlockByNumber")
+    assert w3.eth.get_block(GENESIS_BLOCK)["hash"].hex() == chain.block_hash(GENESIS_BLOCK)[2:]
+
+    async def run():
+        aw3 = AsyncWeb3(RateLimitedAsyncHTTPProvider([server.url], limiter=limiter, pool=RPCPool([server.url])))
+        try:
+            server.fail_next(2, status=502, method="eth_getBlockByNumber")
+            return await aw3.eth.get_block(GENESIS_BLOCK + 1)
+        finally:
+            await aw3.provider.disconnect()
+
+    assert asyncio.run(run())["hash"].hex() == chain.block_hash(GENESIS_BLOCK + 1)[2:]
+    assert server.failed == 3
+    assert limiter.stats["errors"] == 3 and limiter.stats["retries"] == 3
+    assert limiter.stats["throttled"] == 0 and limiter.stats["decreases"] == 0
@@ -0,0 +1,45 @@
+# tests/test_raw_inserts.py
+import asyncio
+import pytest
+from web3 import AsyncWeb3
+from benchmarks.synthetic_chain import GENESIS_BLOCK
+from benchmarks.memory_db import MemoryCursor
+from db.db_operations import Database_Operations
+from ingestion.async_engine import ingest_range_async
+
+
+@pytest.fixture
+def receipts_down(memory_db, monkeypatch):
+    """raw_receipts inserts fail, the other raw tables take their rows"""
+    execute, copy_expert = MemoryCursor.execute, MemoryCursor.copy_expert
+
+    def failing(name, method):
+        def run(self, query, *args, **kwargs):
+            if "raw_receipts" in str(query):
+                raise RuntimeError(f"raw_receipts {name} failed")
+            return method(self, query, *args, **kwargs)
+        return run
+    monkeypatch.setattr(MemoryCursor, "execute", failing("insert", execute))
+    monkeypatch.setattr(MemoryCursor, "copy_expert", failing("copy", copy_expert))
+    return memory_db
+
+
+@pytest.mark.parametrize("method", ["values", "copy"])
+def test_failed_raw_insert_is_raised(receipts_down, method):
+    db = Database_Operations()
+    db.insert_txs_data([["aa", GENESIS_BLOCK, "{}"]], method=method)
+    with pytest.raises(RuntimeError, match="raw_receipts"):
+        db.insert_receipts_data([["aa", GENESIS_BLOCK, "{}"]], method=method)
+
+
+def test_failed_raw_insert_fails_the_ingest(chain, server, receipts_down):
+    # the batch must not look complete (and be checkpointed) without its receipts
+    async def run():
+        aw3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(server.url))
+        try:
+            return await ingest_range_async(GENESIS_BLOCK, GENESIS_BLOCK + 4, Database_Operations(), aw3=aw3)
+        finally:
+            await aw3.provider.disconnect()
+
+    with pytest.raises(RuntimeError, match="raw_receipts"):
+        asyncio.run(run())
@@ -0,0 +1,41 @@
+# tests/test_raw_passthrough.py
+import pytest
+import requests
+from web3 import Web3
+from benchmarks.synthetic_chain import GENESIS_BLOCK
+from benchmarks.fake_rpc import FakeRPCServer
+from ingestion.raw_passthrough import get_raw_block_data
+from utils.rate_limit import ComputeUnitLimiter, RateLimitedHTTPProvider
+import utils.rpc_pool as rpc_pool
+from utils.rpc_pool import RPCPool
+
+
+def test_raw_batches_go_through_the_limiter(chain):
+    # raw mode shares the 429 / transient error handling of the provider stack
+    server = FakeRPCServer(chain, throttle_cups=1500).start()
+    limiter = ComputeUnitLimiter(cu_per_second=20000, max_retries=30)
+    limiter.backoff = lambda attempt, retry_after=None: 0.05
+    w3 = Web3(RateLimitedHTTPProvider([server.url], limiter=limiter, pool=RPCPool([server.url])))
+    numbers = list(range(GENESIS_BLOCK, GENESIS_BLOCK + 12))
+    server.fail_next(1, status=503, method="eth_getBlockByNumber")
+    try:
+        rows = get_raw_block_data(w3, numbers, batch_blocks=4)
+    finally:
+        server.stop()
+    assert [r["block"][0] for r in rows] == numbers
+    assert [len(r["tx"]) for r in rows] == [len(chain.get_block(bn, False)["transactions"]) for bn in numbers]
+    assert server.throttled > 0 and server.failed == 1
+    assert limiter.stats["throttled"] > 0 and limiter.stats["errors"] == 1
+
+
+def test_failed_chunk_fails_the_batch(chain, monkeypatch):
+    # process_batch must return False instead of checkpointing a range with missing blocks
+    monkeypatch.setattr(rpc_pool, "RPC_POOL_BACKOFF", 0.01)
+    server = FakeRPCServer(chain).start()
+    w3 = Web3(RateLimitedHTTPProvider([server.url], pool=RPCPool([server.url])))
+    server.fail_next(100, status=500)
+    try:
+        with pytest.raises(requests.exceptions.HTTPError):
+            get_raw_block_data(w3, list(range(GENESIS_BLOCK, GENESIS_BLOCK + 4)), batch_blocks=2)
+    finally:
+        server.stop()
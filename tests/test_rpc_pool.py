@@ -0,0 +1,111 @@
+# tests/test_rpc_pool.py
+import asyncio
+import socket
+import pytest
+import requests
+from web3 import Web3, AsyncWeb3
+from benchmarks.synthetic_chain import GENESIS_BLOCK
+from benchmarks.fake_rpc import FakeRPCServer
+from utils.rate_limit import ComputeUnitLimiter, RateLimitedAsyncHTTPProvider
+import utils.rpc_pool as rpc_pool
+from utils.rpc_pool import RPCPool, PooledHTTPProvider, PooledAsyncHTTPProvider
+
+
+def _dead_url():
+    """URL of a local port nobody listens on"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}"
+
+
+def test_failing_endpoint_is_ejected_and_requests_fail_over(chain, server):
+    dead = _dead_url()
+    pool = RPCPool([dead, server.url])
+    # the dead endpoint looked the fastest before it went down: it keeps being picked until ejected
+    pool.endpoints[0].latencies.extend([0.001] * 20)
+    pool.endpoints[1].latencies.extend([0.5] * 20)
+    w3 = Web3(PooledHTTPProvider(pool=pool))
+    numbers = list(range(GENESIS_BLOCK, GENESIS_BLOCK + 20))
+
+    blocks = [w3.eth.get_block(bn) for bn in numbers]
+
+    assert [b["hash"].hex() for b in blocks] == [chain.block_hash(bn)[2:] for bn in numbers]
+    stats = pool.stats()
+    assert stats[dead]["ejected"] and stats[dead]["ejections"] == 1
+    assert stats[dead]["requests"] == stats[dead]["errors"] >= 1
+    assert stats[server.url]["requests"] == len(numbers)
+    assert not stats[server.url]["ejected"]
+
+
+def test_slow_endpoint_is_hedged(chain):
+    slow = FakeRPCServer(chain, latency=0.5).start()
+    fast = FakeRPCServer(chain, latency=0.01).start()
+    pool = RPCPool([slow.url, fast.url])
+    for endpoint in pool.endpoints:
+        endpoint.latencies.extend([0.02] * 20)      # both look fast: hedge after ~20 ms
+    limiter = ComputeUnitLimiter(cu_per_second=100000)
+    numbers = list(range(GENESIS_BLOCK, GENESIS_BLOCK + 20))
+
+    async def run():
+        aw3 = AsyncWeb3(RateLimitedAsyncHTTPProvider(limiter=limiter, pool=pool, hedge=True))
+        try:
+            return await asyncio.gather(*(aw3.eth.get_block(bn) for bn in numbers))
+        finally:
+            await aw3.provider.disconnect()
+
+    try:
+        blocks = asyncio.run(run())
+    finally:
+        slow.stop()
+        fast.stop()
+    assert [b["hash"].hex() for b in blocks] == [chain.block_hash(bn)[2:] for bn in numbers]
+    stats = pool.stats()
+    assert stats[slow.url]["hedges"] > 0 and stats[fast.url]["hedges_won"] > 0
+    # every hedge is a second physical send, charged to the CU limiter
+    assert limiter.stats["resends"] == sum(s["hedges"] for s in stats.values())
+
+
+def test_no_hedge_without_flag(chain):
+    slow = FakeRPCServer(chain, latency=0.2).start()
+    fast = FakeRPCServer(chain).start()
+    pool = RPCPool([slow.url, fast.url])
+
+    async def run():
+        aw3 = AsyncWeb3(PooledAsyncHTTPProvider(pool=pool))
+        try:
+            return await asyncio.gather(*(aw3.eth.get_block(GENESIS_BLOCK + i) for i in range(10)))
+        finally:
+            await aw3.provider.disconnect()
+
+    try:
+        asyncio.run(run())
+    finally:
+        slow.stop()
+        fast.stop()
+    assert all(s["hedges"] == 0 for s in pool.stats().values())
+
+
+def test_single_endpoint_retries_transient_errors(chain, server, monkeypatch):
+    monkeypatch.setattr(rpc_pool, "RPC_POOL_BACKOFF", 0.01)
+    pool = RPCPool([server.url])
+    w3 = Web3(PooledHTTPProvider(pool=pool))
+    server.fail_next(2, status=503)
+    assert w3.eth.get_block(GENESIS_BLOCK)["hash"].hex() == chain.block_hash(GENESIS_BLOCK)[2:]
+
+    async def run():
+        aw3 = AsyncWeb3(PooledAsyncHTTPProvider(pool=pool))
+        try:
+            server.fail_next(2, status=504)
+            return await aw3.eth.get_block(GENESIS_BLOCK + 1)
+        finally:
+            await aw3.provider.disconnect()
+
+    assert asyncio.run(run())["hash"].hex() == chain.block_hash(GENESIS_BLOCK + 1)[2:]
+    assert server.failed == 4
+    assert pool.stats()[server.url]["errors"] == 4
+
+    # bounded: an endpoint that keeps failing is raised after RPC_POOL_RETRIES more rounds
+    server.fail_next(100, status=503)
+    with pytest.raises(requests.exceptions.HTTPError):
+        w3.eth.get_block(GENESIS_BLOCK)
+    assert server.failed == 4 + 1 + rpc_pool.RPC_POOL_RETRIES
@@ -0,0 +1,35 @@
+# tests/test_segment_archive.py
+from web3 import Web3
+from benchmarks.synthetic_chain import GENESIS_BLOCK
+from db.segment_archive import SegmentArchive, decode_block_row
+from ingestion.raw_rows import build_raw_rows
+from ingestion.receipts import fetch_block_receipts
+
+
+def _items(server, numbers):
+    w3 = Web3(Web3.HTTPProvider(server.url))
+    items = []
+    for bn in numbers:
+        block = w3.eth.get_block(bn, full_transactions=True)
+        items.append(build_raw_rows(bn, block, fetch_block_receipts(w3, block)))
+    return items
+
+
+def test_reads_survive_appends_to_the_segment(server, tmp_path):
+    # the decoder replaying a segment an ingest run is still appending to
+    archive = SegmentArchive(tmp_path)
+    items = _items(server, range(GENESIS_BLOCK, GENESIS_BLOCK + 6))
+    archive.append(items[:2])
+    pending = archive.iter_views(GENESIS_BLOCK, GENESIS_BLOCK + 1)
+    first = next(pending)                           # a view of the first mapping, still alive
+    txs = list(archive.iter_tx_fields(GENESIS_BLOCK, GENESIS_BLOCK + 1))
+
+    archive.append(items[2:4])
+    txs_grown = list(archive.iter_tx_fields(GENESIS_BLOCK, GENESIS_BLOCK + 3))
+    archive.append(items[4:])
+
+    assert decode_block_row(first)[0] == GENESIS_BLOCK
+    assert decode_block_row(next(pending))[0] == GENESIS_BLOCK + 1
+    assert txs_grown[:len(txs)] == txs and len(txs_grown) > len(txs)
+    numbers = [decode_block_row(view)[0] for view in archive.iter_views(GENESIS_BLOCK, GENESIS_BLOCK + 5)]
+    assert numbers == list(range(GENESIS_BLOCK, GENESIS_BLOCK + 6))
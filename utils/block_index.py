@@ -0,0 +1,172 @@
+# utils/block_index.py
+import bisect
+import json
+import os
+import threading
+from pathlib import Path
+from utils.logger import logger
+
+"""
+Timestamp → block number index.
+
+Keeps a sorted table of known (block_number, timestamp) samples and
+persists it to disk. A lookup starts from the tightest bracket of known
+samples and probes with interpolation search (block times are ~12s so
+the first guess is usually exact). Each probe fetches the guessed block
+and its parent in one JSON-RPC batch, so a lookup that lands right is a
+single round trip and a repeated lookup needs no RPC call at all.
+"""
+
+BLOCK_INDEX_PATH = os.getenv(
+    "BLOCK_INDEX_PATH",
+    str(Path(__file__).resolve().parent.parent / ".cache" / "block_time_index.json"),
+)
+FINALITY_DEPTH = 64     # never persist samples this close to the head
+
+
+class BlockTimeIndex():
+    """Class to map timestamps to block numbers with few RPC calls"""
+
+    def __init__(self, w3, path=BLOCK_INDEX_PATH):
+        self.w3 = w3
+        self.path = Path(path) if path else None
+        self.blocks = []        # sorted block numbers
+        self.timestamps = []    # timestamps, same order as blocks
+        self._volatile = set()  # near-head block numbers, used for lookups but never saved
+        self.rpc_calls = 0
+        self._head = None
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.load()
+
+    # ------------------------------------------------------------------
+    def load(self):
+        """Function to load persisted samples"""
+        if not self.path or not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                samples = json.load(f).get("samples", [])
+            for bn, ts in samples:
+                self._add(bn, ts)
+            self._dirty = False     # nothing new to write back
+            logger.info("Loaded %s block/time samples from %s", len(self.blocks), self.path)
+        except Exception as e:
+            logger.error("Unable to load block index %s -> %s", self.path, e)
+
+    def save(self):
+        """Function to persist samples (only when something new was learned)"""
+        if not self.path or not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"samples": [(bn, ts) for bn, ts in zip(self.blocks, self.timestamps)
+                                   if bn not in self._volatile]}, f)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+    def _add(self, block_number, timestamp, persist=True):
+        """Function to add a sample, persist=False keeps it out of the saved file (not final yet)"""
+        i = bisect.bisect_left(self.blocks, block_number)
+        if i < len(self.blocks) and self.blocks[i] == block_number:
+            if persist and block_number in self._volatile:
+                # final now (the head moved on): refresh the sample, it may have been reorged
+                self.timestamps[i] = timestamp
+                self._volatile.discard(block_number)
+                self._dirty = True
+            return
+        self.blocks.insert(i, block_number)
+        self.timestamps.insert(i, timestamp)
+        if persist:
+            self._dirty = True
+        else:
+            self._volatile.add(block_number)
+
+    # ------------------------------------------------------------------
+    def _head_sample(self):
+        if self._head is None:
+            block = self.w3.eth.get_block("latest")
+            self.rpc_calls += 1
+            self._head = (block.number, block.timestamp)
+        return self._head
+
+    def _fetch(self, block_numbers):
+        """Fetch timestamps for block_numbers in one round trip"""
+        with self.w3.batch_requests() as batch:
+            for bn in block_numbers:
+                batch.add(self.w3.eth.get_block(bn))
+            blocks = batch.execute()
+        self.rpc_calls += 1
+
+        head = self._head_sample()[0]
+        for block in blocks:
+            self._add(block.number, block.timestamp, persist=block.number <= head - FINALITY_DEPTH)
+        return {b.number: b.timestamp for b in blocks}
+
+    def _bracket(self, target_ts):
+        """Tightest known (lo, lo_ts, hi, hi_ts) with lo_ts < target_ts <= hi_ts"""
+        i = bisect.bisect_left(self.timestamps, target_ts)
+        if i < len(self.blocks):
+            hi, hi_ts = self.blocks[i], self.timestamps[i]
+        else:
+            hi, hi_ts = self._head_sample()
+        if i > 0:
+            lo, lo_ts = self.blocks[i - 1], self.timestamps[i - 1]
+        else:
+            lo, lo_ts = -1, float("-inf")
+        return lo, lo_ts, hi, hi_ts
+
+    def find_block_for_timestamp(self, target_ts):
+        """Function to return the first block with timestamp >= target_ts"""
+        with self._lock:
+            head, head_ts = self._head_sample()
+            if target_ts > head_ts:
+                # chain may have moved on since the head was cached
+                self._head = None
+                head, head_ts = self._head_sample()
+                if target_ts > head_ts:
+                    return None
+
+            while True:
+                lo, lo_ts, hi, hi_ts = self._bracket(target_ts)
+                if hi - lo <= 1:
+                    self.save()
+                    return hi
+
+                # interpolation guess, bisection when there is no lower bound yet
+                if lo < 0:
+                    guess = hi - max(1, int((hi_ts - target_ts) // 12))
+                else:
+                    guess = lo + int((target_ts - lo_ts) * (hi - lo) / (hi_ts - lo_ts))
+                guess = min(max(guess, lo + 1), hi - 1)
+                guess = max(guess, 0)
+
+                # probe guess together with its parent so an exact hit ends the search
+                probes = [guess - 1, guess] if guess - 1 > lo else [guess]
+                ts = self._fetch(probes)
+
+                # guess fell far outside the real answer: cut the bracket in half instead
+                new_lo, _, new_hi, _ = self._bracket(target_ts)
+                if (new_hi - new_lo) * 2 > (hi - lo) and new_hi - new_lo > 2:
+                    self._fetch([(new_lo + new_hi) // 2])
+
+                if guess in ts and ts[guess] >= target_ts and ts.get(guess - 1, target_ts) < target_ts:
+                    self.save()
+                    return guess
+
+
+_indexes = {}
+
+
+def get_block_index(w3, path=BLOCK_INDEX_PATH):
+    """Function to return the shared BlockTimeIndex of a web3 client"""
+    key = (id(w3), path)
+    if key not in _indexes:
+        _indexes[key] = BlockTimeIndex(w3, path)
+    return _indexes[key]
+
+
+def find_block_for_timestamp(w3, target_ts):
+    """Function to return the first block with timestamp >= target_ts"""
+    return get_block_index(w3).find_block_for_timestamp(target_ts)
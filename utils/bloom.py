@@ -0,0 +1,123 @@
+# utils/bloom.py
+import threading
+from eth_utils import keccak
+from hexbytes import HexBytes
+from decoder.util import ERC20_TRANSFER_TOPIC
+
+"""
+Ethereum logsBloom helpers (2048 bit bloom, 3 bits per item, see the
+yellow paper M3:2048) and a pre-screen for ERC-20 Transfers touching
+tracked wallets.
+
+A log sets the bits of its address and of every topic, the receipt bloom
+is the OR of its logs and the block bloom the OR of its receipts. So a
+block / receipt can only hold a wallet Transfer if its bloom has the bits
+of the Transfer topic AND of the wallet's padded address topic.
+Blooms have false positives, never false negatives.
+"""
+
+BLOOM_BITS = 2048
+TRANSFER_TOPIC_BYTES = bytes.fromhex(ERC20_TRANSFER_TOPIC[2:])
+
+
+def bloom_mask(item):
+    """Function to return the 3 bloom bits of an item (address / topic bytes) as an int"""
+    digest = keccak(bytes(item))
+    mask = 0
+    for i in (0, 2, 4):
+        mask |= 1 << (((digest[i] << 8) | digest[i + 1]) & (BLOOM_BITS - 1))
+    return mask
+
+
+def bloom_to_int(bloom):
+    """Function to turn a logsBloom (hex string / bytes) into an int"""
+    if bloom is None:
+        return None
+    if isinstance(bloom, str):
+        return int(bloom, 16) if bloom not in ("", "0x") else 0
+    return int.from_bytes(bytes(bloom), "big")
+
+
+def bloom_contains(bloom_int, mask):
+    return bloom_int & mask == mask
+
+
+def build_bloom(logs):
+    """Function to compute the logsBloom int of a list of logs"""
+    bloom = 0
+    for lg in logs:
+        bloom |= bloom_mask(HexBytes(lg["address"]))
+        for topic in lg["topics"]:
+            bloom |= bloom_mask(HexBytes(topic))
+    return bloom
+
+
+def wallet_topic(address):
+    """Function to left pad a 20 byte address into its 32 byte topic"""
+    return b"\x00" * 12 + bytes(HexBytes(address))
+
+
+class TransferBloomFilter():
+    """
+    Class to pre-screen block / receipt blooms for Transfer logs of tracked wallets.
+    Keeps counters so the skip rate and false positive rate can be reported.
+    """
+
+    def __init__(self, wallets=()):
+        self.transfer_mask = bloom_mask(TRANSFER_TOPIC_BYTES)
+        self._lock = threading.Lock()
+        self.set_wallets(wallets)
+        self.stats = {
+            "blocks_checked": 0,
+            "blocks_skipped": 0,
+            "blocks_false_positive": 0,     # passed the bloom, no wallet Transfer found
+            "receipts_checked": 0,
+            "receipts_skipped": 0,
+            "receipts_false_positive": 0,
+        }
+
+    def set_wallets(self, wallets):
+        """Function to (re)build the wallet masks, counters are kept"""
+        # one mask per wallet topic; identical masks collapse (rare)
+        self.wallet_masks = list({bloom_mask(wallet_topic(w)) for w in wallets})
+
+    def may_match(self, bloom):
+        """Function to tell if a bloom can contain a Transfer of a tracked wallet"""
+        bloom_int = bloom_to_int(bloom)
+        if bloom_int is None:
+            return True             # no bloom available: can't rule anything out
+        if not bloom_contains(bloom_int, self.transfer_mask):
+            return False
+        return any(bloom_int & m == m for m in self.wallet_masks)
+
+    def check_block(self, bloom):
+        passed = self.may_match(bloom)
+        with self._lock:
+            self.stats["blocks_checked"] += 1
+            if not passed:
+                self.stats["blocks_skipped"] += 1
+        return passed
+
+    def check_receipt(self, bloom):
+        passed = self.may_match(bloom)
+        with self._lock:
+            self.stats["receipts_checked"] += 1
+            if not passed:
+                self.stats["receipts_skipped"] += 1
+        return passed
+
+    def false_positive(self, kind):
+        """Record that a block / receipt passed the bloom but held no match"""
+        with self._lock:
+            self.stats[f"{kind}s_false_positive"] += 1
+
+    def get_stats(self):
+        """Counters plus skip rate and false positive rate (of the ones that passed)"""
+        with self._lock:
+            out = dict(self.stats)
+        for kind in ("blocks", "receipts"):
+            checked = out[f"{kind}_checked"]
+            passed = checked - out[f"{kind}_skipped"]
+            out[f"{kind}_skip_rate"] = round(out[f"{kind}_skipped"] / checked, 4) if checked else 0.0
+            out[f"{kind}_false_positive_rate"] = round(out[f"{kind}_false_positive"] / passed, 4) if passed else 0.0
+        return out
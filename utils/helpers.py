@@ -1,10 +1,14 @@
 import os
 import json
+import threading
 from hexbytes import HexBytes
-from web3 import Web3
+from web3 import Web3, AsyncWeb3
 from utils.logger import logger
 from web3.datastructures import AttributeDict
-from pathlib import Path
+from utils.wallet_index import WHALE_WALLETS_PATH, WalletIndexWatcher, load_wallet_index
+from utils.rpc_cache import CachingHTTPProvider, CachingAsyncHTTPProvider, RPC_CACHE
+from utils.rate_limit import RateLimitedHTTPProvider, RateLimitedAsyncHTTPProvider, shared_limiter
+from utils.rpc_pool import rpc_urls
 
 def to_eth(wei):
     """function to conert wei to eth"""
@@ -18,18 +22,16 @@ def checksum(address):
         logger.error("Invalid address detected!")
         return address
 
-def load_whale_wallets():
-    """Load whale wallet addresses from JSON file."""
-    data = {}
-    # Get project root directory
-    project_root = Path(__file__).parent
-    
-    # Build absolute path
-    file_path = project_root / "whale_wallets.json"
-    
-    with open(file_path, "r", encoding='utf-8') as f:
-        data = json.load(f)
-        return {addr.lower() for addr in data.values()}
+def load_whale_wallets(path=WHALE_WALLETS_PATH, watch=True):
+    """
+    Load tracked whale / exchange wallets from the wallet file.
+    Returns a WalletIndexWatcher (hot reloads when the file changes)
+    or a plain WalletIndex with watch=False. Both support `in`,
+    lookup(address) -> (label, category) and match_block(transactions).
+    """
+    if watch:
+        return WalletIndexWatcher(path)
+    return load_wallet_index(path)
 
 def is_wallet_involved(tx, wallet_set):
     """
@@ -37,7 +39,7 @@ def is_wallet_involved(tx, wallet_set):
 
     Args:
         tx (dict or AttributeDict): full transaction object returned by web3
-        wallet_set (set): set of checksum addresses being tracked
+        wallet_set: WalletIndex / WalletIndexWatcher, or a set of lowercase addresses
 
     Returns:
         list of tuples: [
@@ -54,18 +56,19 @@ def is_wallet_involved(tx, wallet_set):
         from_addr = tx.get("from")
         to_addr = tx.get("to")
 
-        # Normalize
+        # Normalize: lowercase hex is the canonical form for both index kinds,
+        # no checksum (keccak) needed for a lookup
         if from_addr:
-            from_addr = Web3.to_checksum_address(from_addr)
+            from_addr = from_addr.lower()
         if to_addr:
-            to_addr = Web3.to_checksum_address(to_addr)
+            to_addr = to_addr.lower()
 
         # Check outflow (wallet sending ETH)
-        if from_addr in wallet_set:
+        if from_addr and from_addr in wallet_set:
             involved.append(("outflow", from_addr))
 
         # Check inflow (wallet receiving ETH)
-        if to_addr in wallet_set:
+        if to_addr and to_addr in wallet_set:
             involved.append(("inflow", to_addr))
 
         return involved
@@ -75,19 +78,61 @@ def is_wallet_involved(tx, wallet_set):
         return []
 
 
-def connect_to_rpc():
-    """ Create and return a Web3 client 
-        using the Alchemy RPC URL.
-    """
-    rpc_url = os.getenv("ALCHEMY_RPC_URL")
-    if not rpc_url:
+_clients = {}      # (pid, cache mode, endpoints) -> Web3, see connect_to_rpc
+_clients_lock = threading.Lock()
+
+
+def _rpc_urls_for(cache, urls=None):
+    urls = urls or rpc_urls()
+    if isinstance(urls, str):
+        urls = [urls]
+    if cache == "offline":
+        return urls or ["http://offline.invalid"]
+    if not urls:
         raise ValueError("ALCHEMY_RPC_URL missing in environment")
+    return urls
+
 
-    w3 = Web3(Web3.HTTPProvider(rpc_url))
-    logger.info("Connected to Alchemy server")
-    if not w3.is_connected():
-        raise ConnectionError("Unable to connect to Ethereum mainnet")
-    return w3
+def connect_to_rpc(cache=RPC_CACHE):
+    """ Create and return a Web3 client 
+        using the Alchemy RPC URL (or the RPC_URLS endpoint pool, utils/rpc_pool.py).
+        Finalized blocks / receipts and immutable calls are served from
+        the on-disk cache (utils/rpc_cache.py) unless cache="off",
+        cache="offline" never goes to the network.
+        Network calls share the process-wide CU limiter (utils/rate_limit.py).
+        The client is created (and its connection checked) once per process
+        and cache mode, every later call returns the same thread safe client,
+        all on one keep-alive HTTP session (utils/http_session.py).
+    """
+    urls = _rpc_urls_for(cache)
+    key = (os.getpid(), cache, tuple(urls))
+    with _clients_lock:
+        if key in _clients:
+            return _clients[key]
+
+        if cache == "off":
+            w3 = Web3(RateLimitedHTTPProvider(urls, limiter=shared_limiter()))
+        else:
+            w3 = Web3(CachingHTTPProvider(urls, offline=cache == "offline", limiter=shared_limiter()))
+        if cache != "offline" and not w3.is_connected():
+            raise ConnectionError("Unable to connect to Ethereum mainnet")
+        logger.info("Connected to %s RPC endpoint(s)", len(urls))
+        _clients[key] = w3
+        return w3
+
+
+def connect_to_rpc_async(rpc_url=None, cache=RPC_CACHE, **kwargs):
+    """ Create and return an AsyncWeb3 client (async ingestion engine)
+        with the same RPC cache / CU limiter / endpoint pool stack as
+        connect_to_rpc, so a re-run or an offline replay of the async
+        ingestion reads finalized blocks from the on-disk cache.
+        Not shared: the caller disconnects it at the end of its run.
+    """
+    urls = _rpc_urls_for(cache, rpc_url)
+    if cache == "off":
+        return AsyncWeb3(RateLimitedAsyncHTTPProvider(urls, limiter=shared_limiter(), **kwargs))
+    return AsyncWeb3(CachingAsyncHTTPProvider(urls, offline=cache == "offline", limiter=shared_limiter(),
+                                              **kwargs))
 
 
 def safe_json(row):
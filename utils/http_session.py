@@ -0,0 +1,76 @@
+# utils/http_session.py
+import asyncio
+import os
+import threading
+import weakref
+import requests
+from aiohttp import ClientSession, TCPConnector
+from requests.adapters import HTTPAdapter
+
+"""
+Process-wide keep-alive HTTP sessions for the JSON-RPC providers.
+
+web3 gives every provider its own sessions (one requests.Session per
+thread, an aiohttp session per event loop opened with force_close, so the
+async providers reconnect on every request). The pooled providers
+(utils/rpc_pool.py) use these instead:
+
+- shared_session(): one requests.Session per process, thread safe, with
+  up to RPC_HTTP_POOL_SIZE kept-alive connections per endpoint (default
+  RPC_MAX_CONCURRENCY, the number of requests the CU limiter lets run
+  at once, so no connection is ever opened and thrown away)
+- shared_async_session(): one aiohttp ClientSession per event loop with
+  the same connection limit and keep-alive
+
+Both ask for compressed responses (RPC_HTTP_COMPRESSION, Accept-Encoding),
+block / receipt JSON shrinks several times. A forked process (decoder
+workers) gets its own sessions, sockets are never shared with the parent.
+"""
+
+RPC_HTTP_POOL_SIZE = int(os.getenv("RPC_HTTP_POOL_SIZE", os.getenv("RPC_MAX_CONCURRENCY", 16)))
+RPC_HTTP_COMPRESSION = os.getenv("RPC_HTTP_COMPRESSION", "gzip, deflate")   # "" -> identity
+RPC_HTTP_KEEPALIVE = float(os.getenv("RPC_HTTP_KEEPALIVE", 60))             # seconds idle (async)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+_async_sessions = weakref.WeakKeyDictionary()      # event loop -> ClientSession
+
+
+def _headers():
+    return {"Accept-Encoding": RPC_HTTP_COMPRESSION or "identity"}
+
+
+def shared_session(pool_size=RPC_HTTP_POOL_SIZE):
+    """The process-wide requests.Session of the RPC providers"""
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            # retries are the CU limiter's / pool failover's job
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size, max_retries=0)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(_headers())
+            _session, _session_pid = session, os.getpid()
+        return _session
+
+
+async def shared_async_session(pool_size=RPC_HTTP_POOL_SIZE):
+    """The aiohttp ClientSession of the running event loop"""
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        connector = TCPConnector(limit=pool_size, limit_per_host=pool_size,
+                                 keepalive_timeout=RPC_HTTP_KEEPALIVE, ttl_dns_cache=300)
+        # raise_for_status: web3 (and the CU limiter) expect ClientResponseError on a 429
+        session = ClientSession(connector=connector, headers=_headers(), raise_for_status=True)
+        _async_sessions[loop] = session
+    return session
+
+
+async def close_async_session():
+    """Function to close the session of the running event loop (end of an async run)"""
+    session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
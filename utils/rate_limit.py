@@ -0,0 +1,402 @@
+# utils/rate_limit.py
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import Counter
+from utils.logger import logger
+from utils.rpc_pool import PooledHTTPProvider, PooledAsyncHTTPProvider, http_status, is_transient
+
+"""
+Client-side limiter of JSON-RPC traffic against the provider's
+compute-unit plan (Alchemy bills every method in compute units, CU).
+
+ComputeUnitLimiter:
+- token bucket in CU: a request takes the CU_COSTS of its method(s)
+  (DEFAULT_CU otherwise), the bucket refills at `rate` CU/s and holds
+  RPC_CU_BURST seconds of it
+- AIMD: on throttling (HTTP 429, JSON-RPC 429 / rate limit errors) or a
+  request slower than RPC_LATENCY_TARGET, the rate and the number of
+  requests in flight are multiplied by RPC_AIMD_BACKOFF (at most once
+  per RPC_DECREASE_COOLDOWN, a burst of 429s is one signal), every
+  success adds back up to the plan (RPC_CU_PER_SECOND) and
+  RPC_MAX_CONCURRENCY
+- throttled requests are retried with full-jitter exponential backoff
+  (Retry-After honoured) up to RPC_MAX_RETRIES times, then raised;
+  transient errors (connection error, timeout, HTTP 5xx) are retried the
+  same way, without backing off the rate
+
+shared_limiter() is the one limiter of the process: every client from
+utils.helpers.connect_to_rpc (RateLimitedHTTPProvider) and the async
+engine / listener clients (RateLimitedAsyncHTTPProvider) use it, so all
+threads and tasks draw from the same budget, shared by all the endpoints
+of the RPC pool (utils/rpc_pool.py) below it. The pool charges its
+failover resends and hedges to the limiter and raises HTTP 429s to it
+instead of failing them over. A forked process inherits the parent's
+limiter at the full rate: decoder workers replace it with
+reset_shared_limiter(RPC_CU_PER_SECOND / workers).
+RPC_CU_PER_SECOND=0 disables it.
+"""
+
+RPC_CU_PER_SECOND = float(os.getenv("RPC_CU_PER_SECOND", 330))     # plan limit (Alchemy free tier)
+RPC_CU_BURST = float(os.getenv("RPC_CU_BURST", 1.0))               # bucket size, seconds of the rate
+RPC_MAX_CONCURRENCY = int(os.getenv("RPC_MAX_CONCURRENCY", 16))    # requests in flight
+RPC_LATENCY_TARGET = float(os.getenv("RPC_LATENCY_TARGET", 5.0))   # slower requests count as congestion
+RPC_AIMD_BACKOFF = 0.5              # multiplicative decrease
+RPC_AIMD_INCREASE = 0.05            # additive increase, share of the plan per second at full rate
+RPC_DECREASE_COOLDOWN = 1.0         # seconds between two decreases
+RPC_MAX_RETRIES = int(os.getenv("RPC_MAX_RETRIES", 8))
+RPC_BACKOFF_BASE = 0.25
+RPC_BACKOFF_MAX = 20.0
+
+# compute units per method (Alchemy pricing), DEFAULT_CU for the others
+CU_COSTS = {
+    "eth_chainId": 0,
+    "net_version": 0,
+    "web3_clientVersion": 0,
+    "eth_blockNumber": 10,
+    "eth_getBlockByNumber": 16,
+    "eth_getBlockByHash": 21,
+    "eth_getTransactionByHash": 17,
+    "eth_getTransactionReceipt": 15,
+    "eth_getBlockReceipts": 500,
+    "eth_getLogs": 75,
+    "eth_call": 26,
+}
+DEFAULT_CU = 20
+
+_THROTTLE_MESSAGES = ("rate limit", "compute units", "too many requests", "exceeded its")
+
+
+def method_cost(method):
+    return CU_COSTS.get(method, DEFAULT_CU)
+
+
+class Throttled(Exception):
+    """Raised for a throttled request, retry_after in seconds when the provider sent one"""
+
+    def __init__(self, message="throttled by provider", retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _retry_after(headers):
+    try:
+        return float(headers.get("Retry-After")) if headers else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_throttled_response(response):
+    """True for a JSON-RPC response carrying a throttling error"""
+    error = response.get("error") if isinstance(response, dict) else None
+    if not isinstance(error, dict):
+        return False
+    message = str(error.get("message", "")).lower()
+    return error.get("code") == 429 or any(m in message for m in _THROTTLE_MESSAGES)
+
+
+def as_throttled(exc):
+    """Throttled for an HTTP 429 error (requests / aiohttp), None for any other exception"""
+    if isinstance(exc, Throttled):
+        return exc
+    if http_status(exc) != 429:
+        return None
+    headers = getattr(getattr(exc, "response", None), "headers", None) or getattr(exc, "headers", None)
+    return Throttled(str(exc), _retry_after(headers))
+
+
+class ComputeUnitLimiter():
+    """Class to pace JSON-RPC requests on a CU budget with AIMD and jittered retries"""
+
+    def __init__(self, cu_per_second=RPC_CU_PER_SECOND, max_concurrency=RPC_MAX_CONCURRENCY,
+                 burst_seconds=RPC_CU_BURST, latency_target=RPC_LATENCY_TARGET, max_retries=RPC_MAX_RETRIES):
+        self.max_rate = float(cu_per_second)
+        self.rate = self.max_rate
+        self.min_rate = self.max_rate * 0.05
+        self.burst_seconds = burst_seconds
+        self.tokens = self.max_rate * burst_seconds
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(max_concurrency)
+        self.in_flight = 0
+        self.latency_target = latency_target
+        self.max_retries = max_retries
+        self.stats = Counter()
+        self._updated = time.monotonic()
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._slot_free = threading.Condition(self._lock)
+
+    # ------------------------------------------------------------------
+    # bucket & slots
+    # ------------------------------------------------------------------
+    def _reserve(self, cost):
+        """Take cost CU from the bucket (it may go negative), returns seconds to wait before sending"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate * self.burst_seconds, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self.tokens -= cost
+            self.stats["cu"] += cost
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            self.stats["wait_s"] += wait
+            return wait
+
+    def charge(self, cost):
+        """Function to take cost CU for a send the limiter did not schedule
+        (pool failover / hedge), later requests wait for it"""
+        self._reserve(cost)
+        with self._lock:
+            self.stats["resends"] += 1
+
+    def _try_enter(self):
+        with self._lock:
+            if self.in_flight < max(1, int(self.concurrency)):
+                self.in_flight += 1
+                return True
+            return False
+
+    def _enter(self):
+        with self._slot_free:
+            while self.in_flight >= max(1, int(self.concurrency)):
+                self._slot_free.wait(0.1)
+            self.in_flight += 1
+
+    def _leave(self):
+        with self._slot_free:
+            self.in_flight -= 1
+            self._slot_free.notify()
+
+    # ------------------------------------------------------------------
+    # AIMD
+    # ------------------------------------------------------------------
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < RPC_DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        self.rate = max(self.min_rate, self.rate * RPC_AIMD_BACKOFF)
+        self.concurrency = max(1.0, self.concurrency * RPC_AIMD_BACKOFF)
+        self.tokens = min(self.tokens, 0.0)     # no burst right after a throttle
+        self.stats["decreases"] += 1
+        logger.info("[RATE LIMIT] backing off: %.0f CU/s, %s in flight", self.rate, int(self.concurrency))
+
+    def on_success(self, cost, latency):
+        with self._lock:
+            self.stats["requests"] += 1
+            if latency > self.latency_target:
+                self.stats["slow"] += 1
+                self._decrease()
+                return
+            # ~ +RPC_AIMD_INCREASE of the plan per second of traffic at the current rate
+            self.rate = min(self.max_rate, self.rate + RPC_AIMD_INCREASE * self.max_rate * cost / self.rate)
+            self.concurrency = min(float(self.max_concurrency), self.concurrency + 1 / self.concurrency)
+
+    def on_throttle(self):
+        with self._lock:
+            self.stats["throttled"] += 1
+            self._decrease()
+
+    def backoff(self, attempt, retry_after=None):
+        """Full-jitter exponential backoff, at least retry_after"""
+        delay = random.uniform(0, min(RPC_BACKOFF_MAX, RPC_BACKOFF_BASE * 2 ** attempt))
+        return max(delay, retry_after or 0.0)
+
+    # ------------------------------------------------------------------
+    # run requests
+    # ------------------------------------------------------------------
+    def _cost(self, cost):
+        return cost() if callable(cost) else cost
+
+    def _on_error(self, error, throttled):
+        """Function to account a failed attempt, returns the Retry-After of a throttle"""
+        if throttled is None:
+            # connection error / timeout / 5xx: says nothing about our rate
+            with self._lock:
+                self.stats["errors"] += 1
+            logger.warning("[RATE LIMIT] transient RPC error, retrying: %s", error)
+            return None
+        self.on_throttle()
+        return throttled.retry_after
+
+    def call(self, send, cost):
+        """Function to run send() (one HTTP request of `cost` CU, or a callable
+        returning it) under the limiter, retrying while it raises Throttled / HTTP 429
+        or a transient error (connection error, timeout, HTTP 5xx)"""
+        for attempt in range(self.max_retries + 1):
+            wait = self._reserve(self._cost(cost))
+            if wait:
+                time.sleep(wait)
+            self._enter()
+            t0 = time.monotonic()
+            try:
+                result = send()
+            except Exception as e:
+                error, throttled = e, as_throttled(e)
+                if throttled is None and not is_transient(e):
+                    raise
+            else:
+                self.on_success(self._cost(cost), time.monotonic() - t0)
+                return result
+            finally:
+                self._leave()
+            retry_after = self._on_error(error, throttled)
+            if attempt == self.max_retries:
+                self.stats["failed"] += 1
+                raise throttled or error
+            self.stats["retries"] += 1
+            time.sleep(self.backoff(attempt, retry_after))
+
+    async def call_async(self, send, cost):
+        """call() for a coroutine function send, waits without blocking the event loop"""
+        for attempt in range(self.max_retries + 1):
+            wait = self._reserve(self._cost(cost))
+            if wait:
+                await asyncio.sleep(wait)
+            while not self._try_enter():
+                await asyncio.sleep(0.005)
+            t0 = time.monotonic()
+            try:
+                result = await send()
+            except Exception as e:
+                error, throttled = e, as_throttled(e)
+                if throttled is None and not is_transient(e):
+                    raise
+            else:
+                self.on_success(self._cost(cost), time.monotonic() - t0)
+                return result
+            finally:
+                self._leave()
+            retry_after = self._on_error(error, throttled)
+            if attempt == self.max_retries:
+                self.stats["failed"] += 1
+                raise throttled or error
+            self.stats["retries"] += 1
+            await asyncio.sleep(self.backoff(attempt, retry_after))
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_limiter():
+    """The process-wide limiter, None with RPC_CU_PER_SECOND=0"""
+    global _shared
+    if RPC_CU_PER_SECOND <= 0:
+        return None
+    with _shared_lock:
+        if _shared is None:
+            _shared = ComputeUnitLimiter()
+        return _shared
+
+
+def reset_shared_limiter(cu_per_second=None):
+    """
+    Function to replace the process-wide limiter (a forked decoder worker
+    must not keep the parent's full-rate one), with cu_per_second of the
+    plan (RPC_CU_PER_SECOND by default). Returns the new limiter.
+    """
+    global _shared, _shared_lock
+    _shared_lock = threading.Lock()     # the parent's may have been held at fork time
+    rate = RPC_CU_PER_SECOND if cu_per_second is None else cu_per_second
+    _shared = ComputeUnitLimiter(cu_per_second=rate) if RPC_CU_PER_SECOND > 0 and rate > 0 else None
+    return _shared
+
+
+def _batch_sender(batch_requests):
+    """
+    (pending_requests, collect, cost) of a JSON-RPC batch: collect(responses
+    to pending_requests()) keeps the answered entries and raises Throttled
+    while some were throttled, so only those are sent again
+    """
+    responses = [None] * len(batch_requests)
+    pending = list(range(len(batch_requests)))
+
+    def collect(out):
+        nonlocal pending
+        if not isinstance(out, list):
+            # one error for the whole batch
+            if is_throttled_response(out):
+                raise Throttled(str(out.get("error")))
+            return out
+        throttled = []
+        for i, response in zip(pending, out):
+            if is_throttled_response(response):
+                throttled.append(i)
+            else:
+                responses[i] = response
+        pending = throttled
+        if throttled:
+            raise Throttled(f"{len(throttled)} of the batch throttled")
+        return responses
+
+    def pending_requests():
+        return [batch_requests[i] for i in pending]
+
+    def cost():
+        return sum(method_cost(batch_requests[i][0]) for i in pending)
+
+    return pending_requests, collect, cost
+
+
+class RateLimitedHTTPProvider(PooledHTTPProvider):
+    """PooledHTTPProvider sending every request through a ComputeUnitLimiter"""
+
+    def __init__(self, endpoint_uri=None, limiter=None, **kwargs):
+        super().__init__(endpoint_uri, **kwargs)
+        self.limiter = limiter
+
+    def make_request(self, method, params):
+        if self.limiter is None:
+            return PooledHTTPProvider.make_request(self, method, params)
+
+        def send():
+            response = PooledHTTPProvider.make_request(self, method, params, method_cost(method))
+            if is_throttled_response(response):
+                raise Throttled(str(response.get("error")))
+            return response
+        return self.limiter.call(send, method_cost(method))
+
+    def make_batch_request(self, batch_requests):
+        if self.limiter is None:
+            return PooledHTTPProvider.make_batch_request(self, batch_requests)
+        pending_requests, collect, cost = _batch_sender(batch_requests)
+        return self.limiter.call(
+            lambda: collect(PooledHTTPProvider.make_batch_request(self, pending_requests(), cost())), cost)
+
+
+class RateLimitedAsyncHTTPProvider(PooledAsyncHTTPProvider):
+    """PooledAsyncHTTPProvider sending every request through a ComputeUnitLimiter"""
+
+    def __init__(self, endpoint_uri=None, limiter=None, **kwargs):
+        super().__init__(endpoint_uri, **kwargs)
+        self.limiter = limiter
+
+    async def make_request(self, method, params):
+        if self.limiter is None:
+            return await PooledAsyncHTTPProvider.make_request(self, method, params)
+
+        async def send():
+            response = await PooledAsyncHTTPProvider.make_request(self, method, params, method_cost(method))
+            if is_throttled_response(response):
+                raise Throttled(str(response.get("error")))
+            return response
+        return await self.limiter.call_async(send, method_cost(method))
+
+    async def make_batch_request(self, batch_requests):
+        if self.limiter is None:
+            return await PooledAsyncHTTPProvider.make_batch_request(self, batch_requests)
+        pending_requests, collect, cost = _batch_sender(batch_requests)
+
+        async def send():
+            return collect(await PooledAsyncHTTPProvider.make_batch_request(self, pending_requests(), cost()))
+        return await self.limiter.call_async(send, cost)
+
+
+def limiter_stats(limiter=None):
+    """Counters and current AIMD state of a limiter (the shared one by default)"""
+    limiter = limiter or shared_limiter()
+    if limiter is None:
+        return None
+    return dict(limiter.stats, rate=round(limiter.rate, 1), concurrency=int(limiter.concurrency))
@@ -0,0 +1,341 @@
+# utils/rpc_cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+from eth_abi import decode as abi_decode
+from decoder.decode import AGGREGATE3_SELECTOR, METADATA_SELECTORS, MULTICALL3_ADDRESS
+from utils.logger import logger
+from utils.rate_limit import RateLimitedHTTPProvider, RateLimitedAsyncHTTPProvider
+
+"""
+On-disk cache of JSON-RPC responses that can never change.
+
+CachingHTTPProvider (utils.helpers.connect_to_rpc) and
+CachingAsyncHTTPProvider (utils.helpers.connect_to_rpc_async, the async
+ingestion engine) answer the cacheable requests from RPC_CACHE_DIR,
+single ones and JSON-RPC batches alike (a batch only sends its misses). Entries are keyed by the sha256 of
+method + params and stored as zlib-compressed JSON results:
+
+- block by number, block receipts: cached when the block is at least
+  RPC_CACHE_FINALITY_DEPTH blocks below the head
+- tx / receipt by hash, block by hash: same, block number taken from the result
+- eth_getLogs with numeric fromBlock / toBlock: toBlock must be final
+- eth_call at a final block number; at "latest" only ERC-20
+  name / symbol / decimals reads and Multicall3 aggregate3 batches made
+  of nothing else (RPC_CACHE_LATEST_CALLS=1, the default: the tokens
+  table already treats that metadata as immutable), any other call at
+  "latest" is never cached
+- eth_chainId / net_version
+
+Errors and null results are never stored. The head is read with
+eth_blockNumber at most every RPC_CACHE_HEAD_TTL seconds. When the cache
+grows past RPC_CACHE_MAX_BYTES the least recently used entries (hits touch
+the file mtime) are deleted down to 90%.
+
+RPC_CACHE=offline never touches the network: hits are served, misses
+raise RPCCacheMiss, so a re-run of a cached backfill or benchmark makes
+zero RPC calls. RPC_CACHE=off disables the layer.
+"""
+
+RPC_CACHE = os.getenv("RPC_CACHE", "on")       # "on" | "offline" | "off"
+RPC_CACHE_DIR = os.getenv(
+    "RPC_CACHE_DIR",
+    str(Path(__file__).resolve().parent.parent / ".cache" / "rpc"),
+)
+RPC_CACHE_MAX_BYTES = int(os.getenv("RPC_CACHE_MAX_BYTES", 2 << 30))
+RPC_CACHE_FINALITY_DEPTH = int(os.getenv("RPC_CACHE_FINALITY_DEPTH", 64))
+RPC_CACHE_HEAD_TTL = float(os.getenv("RPC_CACHE_HEAD_TTL", 12))
+RPC_CACHE_LATEST_CALLS = os.getenv("RPC_CACHE_LATEST_CALLS", "1") == "1"
+
+_BLOCK_PARAM = {"eth_getBlockByNumber", "eth_getBlockReceipts"}
+_BLOCK_IN_RESULT = {"eth_getTransactionReceipt", "eth_getTransactionByHash", "eth_getBlockByHash"}
+_STATIC = {"eth_chainId", "net_version"}
+_METADATA = {bytes(s).hex() for s in METADATA_SELECTORS.values()}
+_AGGREGATE3 = bytes(AGGREGATE3_SELECTOR).hex()
+
+
+class RPCCacheMiss(Exception):
+    """Raised in offline mode for a request that is not in the cache"""
+
+
+def _metadata_call(call):
+    """True for an eth_call object reading only ERC-20 name / symbol / decimals"""
+    data = (call.get("data") or call.get("input") or "").lower()
+    data = data[2:] if data.startswith("0x") else data
+    selector = data[:8]
+    if selector in _METADATA:
+        return True
+    if selector != _AGGREGATE3 or str(call.get("to", "")).lower() != MULTICALL3_ADDRESS.lower():
+        return False
+    try:
+        (calls,) = abi_decode(["(address,bool,bytes)[]"], bytes.fromhex(data[8:]))
+    except Exception:
+        return False
+    return bool(calls) and all(bytes(cd[:4]).hex() in _METADATA for _, _, cd in calls)
+
+
+def _block_number(value):
+    """Block parameter / field -> int, None for tags ("latest", "safe", ...)"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.startswith("0x"):
+        return int(value, 16)
+    return None
+
+
+class RPCResponseCache():
+    """Class to store JSON-RPC results on disk, keyed by method + params"""
+
+    def __init__(self, path=RPC_CACHE_DIR, max_bytes=RPC_CACHE_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "not_cached": 0, "evicted": 0}
+        self._lock = threading.Lock()
+        self._bytes = sum(size for _, size, _ in self._entries())
+
+    @staticmethod
+    def key(method, params):
+        text = json.dumps([method, params], sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _file(self, key):
+        return self.path / key[:2] / key[2:]
+
+    def _entries(self):
+        """(path, size, mtime) of every entry"""
+        for shard in os.scandir(self.path):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    st = entry.stat()
+                    yield entry.path, st.st_size, st.st_mtime
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def get(self, key):
+        """Cached result, None on a miss"""
+        file = self._file(key)
+        try:
+            data = file.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(file)      # LRU order for eviction
+        except OSError:
+            pass
+        return json.loads(zlib.decompress(data))
+
+    def put(self, key, result):
+        file = self._file(key)
+        data = zlib.compress(json.dumps(result, separators=(",", ":")).encode())
+        file.parent.mkdir(exist_ok=True)
+        tmp = file.with_name(f"{file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, file)       # readers never see a partial entry
+        with self._lock:
+            self.stats["stored"] += 1
+            self._bytes += len(data)
+            full = self._bytes > self.max_bytes
+        if full:
+            self.evict()
+
+    def evict(self, target=0.9):
+        """Function to delete least recently used entries down to target * max_bytes"""
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda e: e[2])
+            total = sum(size for _, size, _ in entries)
+            for path, size, _ in entries:
+                if total <= self.max_bytes * target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                self.stats["evicted"] += 1
+            self._bytes = total
+        logger.info("[RPC CACHE] evicted down to %s bytes", total)
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def shared_response_cache():
+    """The process-wide RPCResponseCache (one size scan, one set of counters for every client)"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = RPCResponseCache()
+        return _shared_cache
+
+
+class _CachePolicy():
+    """Mixin with the cache policy shared by the sync and async caching providers"""
+
+    def _init_cache(self, cache, offline, finality_depth):
+        self.cache = cache or shared_response_cache()
+        self.offline = offline
+        self.finality_depth = finality_depth
+        self._head = None
+        self._head_at = 0.0
+
+    def _head_stale(self):
+        return self._head is None or time.time() - self._head_at > RPC_CACHE_HEAD_TTL
+
+    def _set_head(self, response):
+        self._head, self._head_at = int(response["result"], 16), time.time()
+
+    def _needs_head(self, method, params):
+        """False when the request is decided without knowing the head"""
+        if method in _STATIC:
+            return False
+        if method == "eth_call":
+            return len(params or []) > 1 and params[1] != "latest"
+        return True
+
+    def _cacheable(self, method, params, final_head):
+        """True / False when the request alone tells, None when the result has to be checked"""
+        params = list(params or [])
+
+        def final(block_number):
+            return block_number is not None and block_number <= final_head
+
+        if method in _STATIC:
+            return True
+        if method in _BLOCK_PARAM:
+            return bool(params) and final(_block_number(params[0]))
+        if method in _BLOCK_IN_RESULT:
+            return None
+        if method == "eth_getLogs":
+            query = params[0] if params else {}
+            return _block_number(query.get("fromBlock")) is not None and final(_block_number(query.get("toBlock")))
+        if method == "eth_call":
+            block = params[1] if len(params) > 1 else "latest"
+            if block == "latest":
+                return RPC_CACHE_LATEST_CALLS and bool(params) and _metadata_call(params[0])
+            return final(_block_number(block))
+        return False
+
+    def _store(self, key, method, params, response, final_head):
+        result = response.get("result") if isinstance(response, dict) else None
+        cacheable = self._cacheable(method, params, final_head)
+        if cacheable is None and result is not None:
+            cacheable = isinstance(result, dict) and _block_number(result.get("blockNumber")) is not None \
+                and _block_number(result.get("blockNumber")) <= final_head
+        if cacheable and result is not None and "error" not in response:
+            self.cache.put(key, result)
+        else:
+            self.cache.count("not_cached")
+
+    def _lookup(self, method, params):
+        """(key, cached result or None)"""
+        key = RPCResponseCache.key(method, params)
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.count("hits")
+        elif self.offline:
+            raise RPCCacheMiss(f"{method} {params} not in the RPC cache (offline mode)")
+        else:
+            self.cache.count("misses")
+        return key, result
+
+    def _batch_lookup(self, batch_requests):
+        """(responses with None for misses, [(index, key)] of the misses)"""
+        responses, misses = [], []
+        for i, (method, params) in enumerate(batch_requests):
+            key, result = self._lookup(method, params)
+            responses.append({"jsonrpc": "2.0", "id": i, "result": result} if result is not None else None)
+            if result is None:
+                misses.append((i, key))
+        return responses, misses
+
+    def _batch_merge(self, batch_requests, responses, misses, fetched, final_head):
+        if not isinstance(fetched, list):
+            return fetched      # single error response for the whole batch
+        for (i, key), response in zip(misses, fetched):
+            method, params = batch_requests[i]
+            self._store(key, method, params, response, final_head)
+            responses[i] = dict(response, id=i)
+        return responses
+
+
+class CachingHTTPProvider(_CachePolicy, RateLimitedHTTPProvider):
+    """HTTPProvider answering immutable requests from an RPCResponseCache (misses go through the limiter)"""
+
+    def __init__(self, endpoint_uri=None, cache=None, offline=False, finality_depth=RPC_CACHE_FINALITY_DEPTH,
+                 limiter=None, **kwargs):
+        super().__init__(endpoint_uri, limiter=limiter, **kwargs)
+        self._init_cache(cache, offline, finality_depth)
+        self._head_lock = threading.Lock()
+
+    def _final_head(self):
+        """Highest block number considered final (cached eth_blockNumber, refreshed every RPC_CACHE_HEAD_TTL)"""
+        with self._head_lock:
+            if self._head_stale():
+                self._set_head(RateLimitedHTTPProvider.make_request(self, "eth_blockNumber", []))
+            return self._head - self.finality_depth
+
+    def _final_head_for(self, requests):
+        return self._final_head() if any(self._needs_head(m, p) for m, p in requests) else -1
+
+    def make_request(self, method, params):
+        key, result = self._lookup(method, params)
+        if result is not None:
+            return {"jsonrpc": "2.0", "id": 0, "result": result}
+        response = super().make_request(method, params)
+        self._store(key, method, params, response, self._final_head_for([(method, params)]))
+        return response
+
+    def make_batch_request(self, batch_requests):
+        responses, misses = self._batch_lookup(batch_requests)
+        if not misses:
+            return responses
+        requests = [batch_requests[i] for i, _ in misses]
+        fetched = super().make_batch_request(requests)
+        return self._batch_merge(batch_requests, responses, misses, fetched, self._final_head_for(requests))
+
+
+class CachingAsyncHTTPProvider(_CachePolicy, RateLimitedAsyncHTTPProvider):
+    """AsyncHTTPProvider counterpart of CachingHTTPProvider (same cache directory and policy)"""
+
+    def __init__(self, endpoint_uri=None, cache=None, offline=False, finality_depth=RPC_CACHE_FINALITY_DEPTH,
+                 limiter=None, **kwargs):
+        super().__init__(endpoint_uri, limiter=limiter, **kwargs)
+        self._init_cache(cache, offline, finality_depth)
+
+    async def _final_head(self):
+        if self._head_stale():
+            self._set_head(await RateLimitedAsyncHTTPProvider.make_request(self, "eth_blockNumber", []))
+        return self._head - self.finality_depth
+
+    async def _final_head_for(self, requests):
+        return await self._final_head() if any(self._needs_head(m, p) for m, p in requests) else -1
+
+    async def make_request(self, method, params):
+        key, result = self._lookup(method, params)
+        if result is not None:
+            return {"jsonrpc": "2.0", "id": 0, "result": result}
+        response = await super().make_request(method, params)
+        self._store(key, method, params, response, await self._final_head_for([(method, params)]))
+        return response
+
+    async def make_batch_request(self, batch_requests):
+        responses, misses = self._batch_lookup(batch_requests)
+        if not misses:
+            return responses
+        requests = [batch_requests[i] for i, _ in misses]
+        fetched = await super().make_batch_request(requests)
+        return self._batch_merge(batch_requests, responses, misses, fetched, await self._final_head_for(requests))
+
+
+def cache_stats(w3):
+    """Hit / miss counters of a connect_to_rpc / connect_to_rpc_async client, None without the cache"""
+    provider = w3.provider
+    return dict(provider.cache.stats) if isinstance(provider, _CachePolicy) else None
@@ -0,0 +1,360 @@
+# utils/rpc_pool.py
+import asyncio
+import bisect
+import os
+import random
+import threading
+import time
+from collections import deque
+import requests
+from aiohttp import ClientConnectionError, ClientPayloadError, ClientTimeout
+from web3 import HTTPProvider, AsyncHTTPProvider
+from web3._utils.http import DEFAULT_HTTP_TIMEOUT
+from web3._utils.batching import sort_batch_response_by_response_ids
+from utils.logger import logger
+from utils.http_session import shared_session, shared_async_session, close_async_session
+
+"""
+Pool of JSON-RPC endpoints behind one web3 provider.
+
+RPC_URLS (comma separated, ALCHEMY_RPC_URL when empty) lists the
+endpoints. Every request goes to an endpoint picked at random, weighted by
+(1 - error rate)^2 / mean latency over the last RPC_POOL_WINDOW requests,
+so a slow or failing endpoint gets less traffic but still enough to notice
+it recovered. A failed request (connection error, timeout, HTTP error) is
+sent again on another endpoint. When all of them failed on a transient
+error (connection error, timeout, HTTP 5xx) they are tried again after a
+jittered backoff, up to RPC_POOL_RETRIES rounds, then the last error is
+raised.
+
+With a CU limiter on the provider (utils/rate_limit.py, `self.limiter`)
+every physical send is paid for: failover resends and hedges are charged
+to the bucket (limiter.charge), and an HTTP 429 is not failed over but
+raised to the limiter, which backs off (AIMD) and retries; a 429 lost in
+a hedge race is still reported (limiter.on_throttle). The limiter also
+retries transient errors, so the pool makes a single round then.
+
+An endpoint failing RPC_EJECT_FAILURES times in a row, or more than
+RPC_EJECT_ERROR_RATE of its last requests, is ejected for
+RPC_EJECT_COOLDOWN seconds. If every endpoint is ejected the one coming
+back first is used.
+
+With hedge=True (the real-time listener) the async provider sends the
+same request to a second endpoint when the first has not answered after
+the p95 latency of that endpoint, and takes whichever answers first.
+
+shared_pool() keeps one pool (and its health stats) per URL list for the
+whole process; pool.stats() reports per-endpoint counters. Requests go
+through the process-wide keep-alive sessions of utils/http_session.py.
+"""
+
+RPC_URLS = os.getenv("RPC_URLS", "")
+RPC_POOL_WINDOW = 100               # requests per endpoint kept for latency / error rate
+RPC_EJECT_FAILURES = 3              # consecutive failures -> ejected
+RPC_EJECT_ERROR_RATE = 0.5          # error rate over the window -> ejected
+RPC_EJECT_MIN_SAMPLES = 10
+RPC_EJECT_COOLDOWN = float(os.getenv("RPC_EJECT_COOLDOWN", 30))
+RPC_DEFAULT_LATENCY = 0.2           # seconds, endpoints without samples yet
+RPC_MIN_HEALTH = 0.02               # weight factor floor of an endpoint failing every request
+RPC_HEDGE_MIN_DELAY = 0.05
+RPC_HEDGE_DEFAULT_DELAY = 0.5
+RPC_POOL_RETRIES = int(os.getenv("RPC_POOL_RETRIES", 5))   # extra rounds over the endpoints, without a limiter
+RPC_POOL_BACKOFF = 0.125
+RPC_POOL_BACKOFF_MAX = 10.0
+
+
+def http_status(exc):
+    """HTTP status of a requests / aiohttp error, None for other exceptions"""
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None) or getattr(exc, "status", None)
+
+
+def is_transient(exc):
+    """True for an error worth sending again: connection error, timeout, HTTP 5xx"""
+    if isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                        ClientConnectionError, ClientPayloadError, asyncio.TimeoutError)):
+        return True
+    status = http_status(exc)
+    return isinstance(status, int) and status >= 500
+
+
+def _retry_round(provider, error, attempt):
+    """Seconds to wait before trying every endpoint again after error, None to raise it"""
+    if provider.limiter is not None or attempt >= RPC_POOL_RETRIES or not is_transient(error):
+        return None
+    return random.uniform(0, min(RPC_POOL_BACKOFF_MAX, RPC_POOL_BACKOFF * 2 ** attempt))
+
+
+def rpc_urls():
+    """Endpoint URLs from RPC_URLS, or [ALCHEMY_RPC_URL]"""
+    urls = [u.strip() for u in RPC_URLS.split(",") if u.strip()]
+    if not urls and os.getenv("ALCHEMY_RPC_URL"):
+        urls = [os.getenv("ALCHEMY_RPC_URL")]
+    return urls
+
+
+class Endpoint():
+    """Class to keep the rolling health of one endpoint"""
+
+    def __init__(self, url, window=RPC_POOL_WINDOW):
+        self.url = url
+        self.latencies = deque(maxlen=window)    # seconds of successful requests
+        self.outcomes = deque(maxlen=window)     # True = ok
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.counters = {"requests": 0, "errors": 0, "ejections": 0, "hedges": 0, "hedges_won": 0}
+
+    def latency(self):
+        return sum(self.latencies) / len(self.latencies) if self.latencies else RPC_DEFAULT_LATENCY
+
+    def error_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def p95(self):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def weight(self):
+        # never 0: a failing endpoint keeps a trickle of traffic until it is ejected
+        return max(RPC_MIN_HEALTH, (1.0 - self.error_rate()) ** 2) / max(self.latency(), 1e-3)
+
+    def is_ejected(self, now):
+        return self.ejected_until > now
+
+
+class RPCPool():
+    """Class to pick endpoints by health and keep their stats"""
+
+    def __init__(self, urls):
+        if not urls:
+            raise ValueError("RPC_URLS / ALCHEMY_RPC_URL missing in environment")
+        self.endpoints = [Endpoint(url) for url in urls]
+        self._lock = threading.Lock()
+
+    def pick(self, exclude=()):
+        """Function to choose an endpoint for the next request"""
+        with self._lock:
+            now = time.time()
+            candidates = [e for e in self.endpoints if e not in exclude]
+            if not candidates:
+                return None
+            healthy = [e for e in candidates if not e.is_ejected(now)]
+            if not healthy:
+                return min(candidates, key=lambda e: e.ejected_until)
+            if len(healthy) == 1:
+                return healthy[0]
+            cumulative, total = [], 0.0
+            for e in healthy:
+                total += e.weight()
+                cumulative.append(total)
+            if total <= 0:
+                return random.choice(healthy)
+            return healthy[min(bisect.bisect(cumulative, random.uniform(0, total)), len(healthy) - 1)]
+
+    def record(self, endpoint, latency, ok):
+        """Function to record the outcome of a request, ejects failing endpoints"""
+        with self._lock:
+            endpoint.counters["requests"] += 1
+            endpoint.outcomes.append(ok)
+            if ok:
+                endpoint.latencies.append(latency)
+                endpoint.consecutive_failures = 0
+                return
+            endpoint.counters["errors"] += 1
+            endpoint.consecutive_failures += 1
+            failing = (endpoint.consecutive_failures >= RPC_EJECT_FAILURES
+                       or (len(endpoint.outcomes) >= RPC_EJECT_MIN_SAMPLES
+                           and endpoint.error_rate() > RPC_EJECT_ERROR_RATE))
+            if failing and len(self.endpoints) > 1:
+                endpoint.ejected_until = time.time() + RPC_EJECT_COOLDOWN
+                endpoint.counters["ejections"] += 1
+                # back on probation after the cooldown
+                endpoint.outcomes.clear()
+                endpoint.consecutive_failures = 0
+                logger.warning("[RPC POOL] %s ejected for %ss", endpoint.url, RPC_EJECT_COOLDOWN)
+
+    def count(self, endpoint, name):
+        with self._lock:
+            endpoint.counters[name] += 1
+
+    def hedge_delay(self, endpoint):
+        p95 = endpoint.p95()
+        return RPC_HEDGE_DEFAULT_DELAY if p95 is None else max(RPC_HEDGE_MIN_DELAY, p95)
+
+    def stats(self):
+        """Per-endpoint counters, rolling latency / error rate and ejection state"""
+        with self._lock:
+            now = time.time()
+            return {
+                e.url: dict(e.counters, latency_ms=round(e.latency() * 1000, 1),
+                            p95_ms=round((e.p95() or 0) * 1000, 1), error_rate=round(e.error_rate(), 3),
+                            ejected=e.is_ejected(now))
+                for e in self.endpoints
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def shared_pool(urls=None):
+    """The process-wide pool of an endpoint list (rpc_urls() by default)"""
+    if isinstance(urls, str):
+        urls = [urls]
+    key = tuple(urls or rpc_urls())
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = RPCPool(list(key))
+        return _pools[key]
+
+
+def _decode_batch(provider, raw):
+    response = provider.decode_rpc_response(raw)
+    if not isinstance(response, list):
+        return response     # one error for the whole batch
+    return sort_batch_response_by_response_ids(response)
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """HTTPProvider spreading requests over an RPCPool with failover"""
+
+    def __init__(self, endpoint_uri=None, pool=None, **kwargs):
+        self.pool = pool or shared_pool(endpoint_uri)
+        kwargs.setdefault("session", shared_session())
+        super().__init__(self.pool.endpoints[0].url, **kwargs)
+        self._post_kwargs = self.get_request_kwargs()      # headers built once, not per request
+
+    limiter = None      # ComputeUnitLimiter of the rate limited subclass
+
+    def _post(self, request_data, cost=0):
+        """POST to a healthy endpoint, failing over; `cost` CU is charged per resend"""
+        tried, error, attempt = [], None, 0
+        while True:
+            endpoint = self.pool.pick(exclude=tried)
+            if endpoint is None:
+                delay = _retry_round(self, error, attempt)
+                if delay is None:
+                    raise error
+                time.sleep(delay)
+                tried, attempt = [], attempt + 1
+                continue
+            if tried and self.limiter is not None:
+                self.limiter.charge(cost)
+            t0 = time.monotonic()
+            try:
+                raw = self._request_session_manager.make_post_request(
+                    endpoint.url, request_data, **self._post_kwargs)
+            except Exception as e:
+                self.pool.record(endpoint, time.monotonic() - t0, ok=False)
+                if self.limiter is not None and http_status(e) == 429:
+                    raise       # the limiter backs off and retries
+                tried.append(endpoint)
+                error = e
+                continue
+            self.pool.record(endpoint, time.monotonic() - t0, ok=True)
+            return raw
+
+    def make_request(self, method, params, cost=0):
+        return self.decode_rpc_response(self._post(self.encode_rpc_request(method, params), cost))
+
+    def make_batch_request(self, batch_requests, cost=0):
+        return _decode_batch(self, self._post(self.encode_batch_rpc_request(batch_requests), cost))
+
+
+class PooledAsyncHTTPProvider(AsyncHTTPProvider):
+    """AsyncHTTPProvider spreading requests over an RPCPool, with failover and optional hedging"""
+
+    def __init__(self, endpoint_uri=None, pool=None, hedge=False, **kwargs):
+        self.pool = pool or shared_pool(endpoint_uri)
+        self.hedge = hedge
+        super().__init__(self.pool.endpoints[0].url, **kwargs)
+        self._post_kwargs = dict(self.get_request_kwargs())
+        self._post_kwargs.setdefault("timeout", ClientTimeout(DEFAULT_HTTP_TIMEOUT))
+
+    async def _post_to(self, endpoint, request_data):
+        t0 = time.monotonic()
+        try:
+            # the loop's shared keep-alive session, not web3's force_close one
+            session = await shared_async_session()
+            async with session.post(endpoint.url, data=request_data, **self._post_kwargs) as response:
+                response.raise_for_status()
+                raw = await response.read()
+        except asyncio.CancelledError:
+            # lost a hedge race: at least this slow
+            self.pool.record(endpoint, time.monotonic() - t0, ok=True)
+            raise
+        except Exception:
+            self.pool.record(endpoint, time.monotonic() - t0, ok=False)
+            raise
+        self.pool.record(endpoint, time.monotonic() - t0, ok=True)
+        return raw
+
+    limiter = None      # ComputeUnitLimiter of the rate limited subclass
+
+    async def _post(self, request_data, cost=0):
+        """POST to a healthy endpoint, failing over (and hedging); `cost` CU is charged per extra send"""
+        tried, error, attempt = [], None, 0
+        while True:
+            endpoint = self.pool.pick(exclude=tried)
+            if endpoint is None:
+                delay = _retry_round(self, error, attempt)
+                if delay is None:
+                    raise error
+                await asyncio.sleep(delay)
+                tried, attempt = [], attempt + 1
+                continue
+            if tried and self.limiter is not None:
+                self.limiter.charge(cost)
+            tried.append(endpoint)
+            try:
+                if self.hedge:
+                    return await self._post_hedged(endpoint, request_data, tried, cost)
+                return await self._post_to(endpoint, request_data)
+            except Exception as e:
+                if self.limiter is not None and http_status(e) == 429:
+                    raise       # the limiter backs off and retries
+                error = e
+
+    async def _post_hedged(self, primary, request_data, tried, cost=0):
+        """Send to primary, and to a second endpoint when primary is slower than its p95"""
+        first = asyncio.ensure_future(self._post_to(primary, request_data))
+        done, _ = await asyncio.wait({first}, timeout=self.pool.hedge_delay(primary))
+        backup = None if done else self.pool.pick(exclude=tried)
+        if backup is None:
+            return await first
+
+        tried.append(backup)
+        self.pool.count(primary, "hedges")
+        if self.limiter is not None:
+            self.limiter.charge(cost)
+        second = asyncio.ensure_future(self._post_to(backup, request_data))
+        pending, error, throttled = {first, second}, None, None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.pool.count(backup, "hedges_won")
+                        if throttled is not None and self.limiter is not None:
+                            self.limiter.on_throttle()     # the other send was throttled
+                        return task.result()
+                    error = task.exception()
+                    if http_status(error) == 429:
+                        throttled = error
+            raise throttled or error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def make_request(self, method, params, cost=0):
+        return self.decode_rpc_response(await self._post(self.encode_rpc_request(method, params), cost))
+
+    async def disconnect(self):
+        await super().disconnect()
+        await close_async_session()
+
+    async def make_batch_request(self, batch_requests, cost=0):
+        return _decode_batch(self, await self._post(self.encode_batch_rpc_request(batch_requests), cost))
@@ -0,0 +1,277 @@
+# utils/wallet_index.py
+import csv
+import json
+import os
+import threading
+import time
+from array import array
+from itertools import accumulate
+from pathlib import Path
+from utils.logger import logger
+
+"""
+Compact tracked-wallet index (exchange / whale labels).
+
+Addresses are stored as canonical 20 byte keys in one sorted bytes blob,
+with a 2-byte prefix bucket table in front of the binary search, so a
+lookup never needs a checksum (keccak) and 1M labelled wallets take
+~20 MB of keys + the label blob instead of a dict of Python strings.
+
+Source file formats (WHALE_WALLETS_PATH):
+- JSON object  {"label": "0xaddr", ...}  or  {"label": {"address": ..., "category": ...}}
+- JSON list    [{"address": ..., "label": ..., "category": ...}, ...]
+- CSV          address,label,category   (header row)
+
+WalletIndexWatcher swaps in a freshly built index when the file changes,
+so a running listener picks up new labels without a restart.
+"""
+
+WHALE_WALLETS_PATH = os.getenv(
+    "WHALE_WALLETS_PATH",
+    str(Path(__file__).resolve().parent / "whale_wallets.json"),
+)
+WALLET_RELOAD_INTERVAL = float(os.getenv("WALLET_RELOAD_INTERVAL", 10))   # seconds between mtime checks
+DEFAULT_CATEGORY = "whale"
+
+KEY_SIZE = 20
+
+
+def address_key(address):
+    """Function to turn a hex string / bytes address into its 20 byte key (None if invalid)"""
+    if address is None:
+        return None
+    if isinstance(address, (bytes, bytearray)):
+        key = bytes(address)
+    else:
+        hexstr = str(address)
+        if hexstr[:2] in ("0x", "0X"):
+            hexstr = hexstr[2:]
+        try:
+            key = bytes.fromhex(hexstr)
+        except ValueError:
+            return None
+    return key if len(key) == KEY_SIZE else None
+
+
+class WalletIndex():
+    """Class for a sorted, bytes packed address -> (label, category) index"""
+
+    def __init__(self, records=()):
+        entries = {}
+        for address, label, category in records:
+            key = address_key(address)
+            if key is None:
+                logger.warning("Skipping invalid wallet address %r (%s)", address, label)
+                continue
+            entries[key] = (label or "", category or DEFAULT_CATEGORY)
+
+        keys = sorted(entries)
+        self._keys = b"".join(keys)
+        values = [entries[key] for key in keys]
+        category_ids = {}
+        for _, category in values:
+            category_ids.setdefault(category, len(category_ids))
+        self._categories = list(category_ids)
+        self._category_of = array("H", [category_ids[category] for _, category in values])
+        labels = [label.encode("utf-8") for label, _ in values]
+        self._label_offsets = array("I", [0])
+        self._label_offsets.extend(accumulate(map(len, labels)))
+        self._labels = b"".join(labels)
+
+        # bucket b covers keys whose first two bytes == b
+        self._buckets = array("I", bytes(4 * 65537))
+        counts = array("I", bytes(4 * 65536))
+        for key in keys:
+            counts[(key[0] << 8) | key[1]] += 1
+        total = 0
+        for b in range(65536):
+            self._buckets[b] = total
+            total += counts[b]
+        self._buckets[65536] = total
+
+    # ------------------------------------------------------------------
+    def _find(self, key):
+        """Function to return the slot of a 20 byte key, -1 if absent"""
+        b = (key[0] << 8) | key[1]
+        lo, hi = self._buckets[b], self._buckets[b + 1]
+        keys = self._keys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            k = keys[mid * KEY_SIZE:(mid + 1) * KEY_SIZE]
+            if k < key:
+                lo = mid + 1
+            elif k > key:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def _entry(self, slot):
+        label = self._labels[self._label_offsets[slot]:self._label_offsets[slot + 1]].decode("utf-8")
+        return label, self._categories[self._category_of[slot]]
+
+    def lookup(self, address):
+        """Function to return (label, category) of a tracked address, None otherwise"""
+        key = address_key(address)
+        if key is None:
+            return None
+        slot = self._find(key)
+        return self._entry(slot) if slot >= 0 else None
+
+    def __contains__(self, address):
+        key = address_key(address)
+        return key is not None and self._find(key) >= 0
+
+    def __len__(self):
+        return len(self._keys) // KEY_SIZE
+
+    def __iter__(self):
+        """Yield tracked addresses as lowercase 0x strings"""
+        keys = self._keys
+        for i in range(len(self)):
+            yield "0x" + keys[i * KEY_SIZE:(i + 1) * KEY_SIZE].hex()
+
+    @property
+    def nbytes(self):
+        """Approximate memory used by the packed tables"""
+        return (len(self._keys) + len(self._labels) + self._label_offsets.itemsize * len(self._label_offsets)
+                + self._category_of.itemsize * len(self._category_of) + self._buckets.itemsize * len(self._buckets))
+
+    def match_block(self, transactions):
+        """
+        Match all transactions of a block in one call.
+        Returns [(tx, direction, wallet_address, label, category)],
+        direction "outflow" when the wallet sends, "inflow" when it receives,
+        wallet_address is lowercase.
+        """
+        out = []
+        for tx in transactions:
+            for field, direction in (("from", "outflow"), ("to", "inflow")):
+                address = tx.get(field)
+                key = address_key(address)
+                if key is None:
+                    continue
+                slot = self._find(key)
+                if slot >= 0:
+                    label, category = self._entry(slot)
+                    out.append((tx, direction, "0x" + key.hex(), label, category))
+        return out
+
+
+def _records_from_file(path):
+    """Function to read (address, label, category) records of a wallet file"""
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                yield row["address"], row.get("label"), row.get("category")
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        for label, value in data.items():
+            if isinstance(value, dict):
+                yield value.get("address"), value.get("label", label), value.get("category")
+            else:
+                yield value, label, None
+    else:
+        for item in data:
+            yield item.get("address"), item.get("label"), item.get("category")
+
+
+def load_wallet_index(path=WHALE_WALLETS_PATH):
+    """Function to build a WalletIndex from a wallet file"""
+    t0 = time.time()
+    index = WalletIndex(_records_from_file(path))
+    logger.info("Loaded %s tracked wallets from %s (%.1f MB) in %.2fs",
+                len(index), path, index.nbytes / 1e6, time.time() - t0)
+    return index
+
+
+class WalletIndexWatcher():
+    """
+    Class exposing the WalletIndex API over the current index of a file,
+    rebuilt and swapped in atomically when the file changes
+    """
+
+    def __init__(self, path=WHALE_WALLETS_PATH, check_interval=WALLET_RELOAD_INTERVAL):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stamp = self._file_stamp()
+        self._index = load_wallet_index(self.path)
+        self._checked = time.monotonic()
+        self._rebuild = None        # background rebuild thread, while one runs
+        self._rebuild_lock = threading.Lock()   # never held during a rebuild, unlike _lock
+        self.reloads = 0
+
+    def _file_stamp(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def reload_if_changed(self, force=False):
+        """Function to rebuild the index when the file changed, returns True if reloaded"""
+        try:
+            stamp = self._file_stamp()
+        except OSError as e:
+            logger.error("Unable to stat wallet file %s -> %s", self.path, e)
+            return False
+        if not force and stamp == self._stamp:
+            return False
+        with self._lock:
+            if not force and stamp == self._stamp:
+                return False
+            try:
+                index = load_wallet_index(self.path)
+            except Exception as e:
+                # keep serving the previous index on a half written / broken file
+                logger.error("Wallet file %s reload failed, keeping old index -> %s", self.path, e)
+                return False
+            self._index = index
+            self._stamp = stamp
+            self.reloads += 1
+            return True
+
+    def _reload_in_background(self):
+        """Function to start a rebuild thread unless one is already running"""
+        with self._rebuild_lock:
+            if self._rebuild is not None and self._rebuild.is_alive():
+                return
+            self._rebuild = threading.Thread(target=self.reload_if_changed, name="wallet-index-reload",
+                                             daemon=True)
+            self._rebuild.start()
+
+    @property
+    def index(self):
+        """
+        Current index (checks the file at most every check_interval seconds).
+        A changed file is rebuilt on a background thread, the previous index
+        keeps serving until the new one is swapped in.
+        """
+        now = time.monotonic()
+        if now - self._checked >= self.check_interval:
+            self._checked = now
+            try:
+                changed = self._file_stamp() != self._stamp
+            except OSError as e:
+                logger.error("Unable to stat wallet file %s -> %s", self.path, e)
+                changed = False
+            if changed:
+                self._reload_in_background()
+        return self._index
+
+    def lookup(self, address):
+        return self.index.lookup(address)
+
+    def match_block(self, transactions):
+        return self.index.match_block(transactions)
+
+    def __contains__(self, address):
+        return address in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(self.index)